@@ -17,20 +17,14 @@ Key Features:
 
 Dependencies:
     - Flask: Web framework for the application
-    - PyTorch Lightning: For deep learning model training
-    - TensorBoard: For training visualization
     - PyYAML: For configuration management
+
+The control plane never imports torch or pytorch_lightning: those are only
+needed by the engine.py processes it launches, and importing them here would
+cost every server worker seconds of startup and hundreds of MB of memory.
 """
 
 import os
-import importlib
-import yaml
-import time
-import logging
-import pytorch_lightning as pl
-from torch.utils.data import DataLoader
-from pytorch_lightning.loggers import TensorBoardLogger
-from pytorch_lightning.strategies import DDPStrategy
 from flask import Flask, session, render_template, request, redirect, url_for, send_from_directory
 from auth import auth, login_required
 from project import project
@@ -0,0 +1,305 @@
+"""
+Module: benchmarks/control_plane.py
+Description:
+Benchmark harness for the Flask control plane. It generates a synthetic
+workspace (users x projects x runs/models/datasets, with deep run
+directories and large logs), drives the real blueprints through the Flask
+test client, and reports latency percentiles and memory per endpoint.
+
+Endpoints measured:
+- POST /runs/list
+- GET  /runs/logs
+- GET  /project/json
+- POST /models/get_model_structure
+- GET  /deploy/list_run_files
+- POST /runs/create
+
+Usage:
+    python benchmarks/control_plane.py --users 2 --projects 2 --runs 200 --log-lines 50000 \
+        --output bench_results.json
+
+/runs/create normally queues a background memory estimate (a child
+interpreter importing torch); it is replaced by a no-op here, so the
+benchmark measures only the control plane and leaves no estimator behind
+when the temporary workspace is removed.
+
+The results file is machine-readable JSON so runs of different versions can
+be compared to spot regressions; `--compare previous.json` prints the change
+per endpoint and exits with status 1 if any p50 grew beyond `--tolerance`.
+
+Dependencies:
+- Flask: The application under test, driven through its test client.
+- tracemalloc, resource: For per-request allocation peaks and process RSS.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import tempfile
+import platform
+import resource
+import subprocess
+import tracemalloc
+from unittest import mock
+
+# Repository root, where app.py and the templates live
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# -------------------- SYNTHETIC WORKSPACE --------------------
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+def build_deep_tree(base_dir, depth, fanout, files_per_dir):
+    """Creates a directory tree `depth` levels deep with `fanout` subdirectories per level."""
+    for i in range(files_per_dir):
+        write_file(os.path.join(base_dir, f'file_{i}.txt'), 'x' * 128)
+    if depth > 0:
+        for i in range(fanout):
+            build_deep_tree(os.path.join(base_dir, f'dir_{i}'), depth - 1, fanout, files_per_dir)
+
+def generate_workspace(root, args):
+    """
+    Generates the synthetic workspace under root/workspace.
+
+    Returns:
+        list: (user, project) pairs that were created.
+    """
+    log_line = "2025-01-01 00:00:00,000 - INFO - [Epoch 1] Progress: 10.0% | Loss: 1.2345 | ETA: 1.00 min\n"
+    pairs = []
+    for u in range(args.users):
+        user = f'bench_user_{u}'
+        for p in range(args.projects):
+            project_name = f'project_{p}'
+            project_dir = os.path.join(root, 'workspace', user, project_name)
+            project_data = {
+                "project_name": project_name,
+                "user_name": user,
+                "datasets": [],
+                "models": [],
+                "runs": [],
+                "optimizations": []
+            }
+
+            for m in range(args.models):
+                model_dir = os.path.join(project_dir, 'models', f'model_{m}')
+                write_file(os.path.join(model_dir, 'model.py'), 'import torch\n' * 50)
+                write_file(os.path.join(model_dir, 'config.yaml'), 'num_classes: 100\n')
+                build_deep_tree(os.path.join(model_dir, 'weights'), args.depth // 2, args.fanout, args.files_per_dir)
+                project_data["models"].append({"model_name": f'model_{m}', "task_type": "train"})
+
+            for d in range(args.datasets):
+                dataset_dir = os.path.join(project_dir, 'datasets', f'dataset_{d}')
+                write_file(os.path.join(dataset_dir, 'datasets.py'), 'import torch\n' * 20)
+                write_file(os.path.join(dataset_dir, 'config.yaml'), 'img_size: 32\n')
+                project_data["datasets"].append({"dataset_name": f'dataset_{d}', "task_type": "classification"})
+
+            os.makedirs(os.path.join(project_dir, 'optimizations'), exist_ok=True)
+
+            for r in range(args.runs):
+                run_name = f'run_{r}'
+                run_dir = os.path.join(project_dir, 'runs', run_name)
+                write_file(os.path.join(run_dir, 'engine.py'), '# engine\n' * 100)
+                write_file(os.path.join(run_dir, 'config.yaml'), 'training:\n  epochs: 10\n')
+                # Only the first run of each project carries the large log and deep tree
+                if r == 0:
+                    write_file(os.path.join(run_dir, 'logs', 'run.log'), log_line * args.log_lines)
+                    build_deep_tree(os.path.join(run_dir, 'logs', 'lightning_logs'),
+                                    args.depth, args.fanout, args.files_per_dir)
+                else:
+                    write_file(os.path.join(run_dir, 'logs', 'run.log'), log_line * 10)
+                project_data["runs"].append({
+                    "run_name": run_name,
+                    "created_date": "2025-01-01T00:00:00Z",
+                    "model_name": "model_0",
+                    "dataset_name": "dataset_0",
+                    "optimization_name": "",
+                    "status": "Not Running",
+                    "gpu_ids": [],
+                    "pid": None,
+                    "num_gpus": 1
+                })
+
+            write_file(os.path.join(project_dir, 'project.json'), json.dumps(project_data, indent=4))
+            pairs.append((user, project_name))
+    return pairs
+
+# -------------------- MEASUREMENT --------------------
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def endpoint_requests(user, project_name, counter):
+    """
+    Returns {endpoint name: callable(client) -> response} for one user/project.
+    `counter` gives unique run names to /runs/create.
+    """
+    def create_run(client):
+        counter[0] += 1
+        return client.post('/runs/create', json={
+            "project_name": project_name,
+            "run_name": f'bench_created_{counter[0]}',
+            "model_name": "model_0",
+            "dataset_name": "dataset_0",
+            "engine_py": "# engine\n" * 100,
+            "config_yaml": "training:\n  epochs: 10\n",
+        })
+
+    return {
+        "/runs/list": lambda client: client.post('/runs/list', json={"project_name": project_name}),
+        "/runs/logs": lambda client: client.get('/runs/logs', query_string={
+            "project_name": project_name, "run_name": "run_0"}),
+        "/project/json": lambda client: client.get('/project/json'),
+        "/models/get_model_structure": lambda client: client.post('/models/get_model_structure', json={
+            "project_name": project_name, "model_name": "model_0"}),
+        "/deploy/list_run_files": lambda client: client.get('/deploy/list_run_files', query_string={
+            "project_name": project_name, "run_name": "run_0"}),
+        "/runs/create": create_run,
+    }
+
+def benchmark_endpoint(client, request_fn, iterations, warmup):
+    """Times `iterations` calls of request_fn, then measures one call's allocation peak."""
+    for _ in range(warmup):
+        request_fn(client)
+
+    latencies = []
+    statuses = {}
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = request_fn(client)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        response_bytes = len(response.data)
+
+    # Allocation peak is measured separately so tracing does not skew latencies
+    tracemalloc.start()
+    request_fn(client)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies),
+        "max_ms": max(latencies),
+        "peak_alloc_mb": peak / (1024.0 * 1024.0),
+        "response_bytes": response_bytes,
+        "status_codes": statuses,
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the control-plane endpoints on a synthetic workspace.")
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--projects', type=int, default=2, help="Projects per user.")
+    parser.add_argument('--runs', type=int, default=100, help="Runs per project.")
+    parser.add_argument('--models', type=int, default=20, help="Models per project.")
+    parser.add_argument('--datasets', type=int, default=5, help="Datasets per project.")
+    parser.add_argument('--depth', type=int, default=4, help="Depth of the synthetic run directory tree.")
+    parser.add_argument('--fanout', type=int, default=3, help="Subdirectories per level of the tree.")
+    parser.add_argument('--files-per-dir', type=int, default=5)
+    parser.add_argument('--log-lines', type=int, default=20000, help="Lines in the large run.log.")
+    parser.add_argument('--iterations', type=int, default=50, help="Timed requests per endpoint.")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--workdir', help="Directory for the synthetic workspace (default: a temp dir).")
+    parser.add_argument('--keep', action='store_true', help="Keep the synthetic workspace afterwards.")
+    parser.add_argument('--output', default='bench_results.json', help="JSON file receiving the results.")
+    parser.add_argument('--compare', help="Results file of a previous version to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed relative p50 increase before --compare reports a regression.")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    root = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='evf_bench_')
+    os.makedirs(root, exist_ok=True)
+
+    start = time.perf_counter()
+    pairs = generate_workspace(root, args)
+    generate_seconds = time.perf_counter() - start
+
+    # The blueprints resolve 'workspace/...' relative to the working directory
+    sys.path.insert(0, REPO_DIR)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        from app import app
+        app.config['TESTING'] = True
+        client = app.test_client()
+
+        user, project_name = pairs[0]
+        with client.session_transaction() as sess:
+            sess['user'] = user
+            sess['project'] = project_name
+
+        counter = [0]
+        results = {}
+        for name, request_fn in endpoint_requests(user, project_name, counter).items():
+            # Endpoints print debug output; keep it off the benchmark report
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                    mock.patch('runs.estimate_in_background'):
+                results[name] = benchmark_endpoint(client, request_fn, args.iterations, args.warmup)
+            print(f"{name:32s} p50 {results[name]['p50_ms']:9.2f} ms   p99 {results[name]['p99_ms']:9.2f} ms   "
+                  f"peak alloc {results[name]['peak_alloc_mb']:8.2f} MB")
+    finally:
+        os.chdir(cwd)
+        if not args.keep and not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "created_date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {k: v for k, v in vars(args).items()
+                       if k not in ('output', 'workdir', 'keep', 'compare', 'tolerance')},
+        "generate_seconds": generate_seconds,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "endpoints": results,
+    }
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {output_path}")
+
+    if args.compare:
+        return compare_reports(args.compare, report, args.tolerance)
+    return 0
+
+def compare_reports(baseline_path, report, tolerance):
+    """Prints the p50 change per endpoint; returns 1 if any endpoint regressed beyond tolerance."""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    regressed = []
+    for name, result in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous or not previous.get("p50_ms"):
+            continue
+        change = result["p50_ms"] / previous["p50_ms"] - 1.0
+        print(f"{name:32s} p50 {previous['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms ({change:+.1%})")
+        if change > tolerance:
+            regressed.append(name)
+
+    if regressed:
+        print(f"REGRESSION (> {tolerance:.0%} p50 increase): {', '.join(regressed)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Module: benchmarks/startup.py
+Description:
+Startup budget check for the control plane. It imports `app` in a fresh
+interpreter, measures the import time and peak memory, and fails when
+startup regresses: when the import takes longer than the budget or pulls in
+a heavy ML library that only the engine.py processes should load.
+
+Usage:
+    python benchmarks/startup.py [--budget 2.0] [--repeat 3] [--output startup.json]
+
+Exit status is 1 when the budget is exceeded or a forbidden module is imported.
+
+Dependencies:
+- subprocess, json, argparse: For running and reporting the measurement.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Repository root, where app.py lives
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the web server must never import at startup
+FORBIDDEN_MODULES = ['torch', 'torchvision', 'pytorch_lightning', 'lightning', 'tensorboard']
+
+# Code run in the child interpreter; prints one JSON line with the measurements
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+forbidden = %r
+print(json.dumps({
+    "import_seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    "forbidden_imported": sorted(m for m in forbidden if m in sys.modules),
+}))
+""" % (FORBIDDEN_MODULES,)
+
+def measure_once():
+    """Imports app in a fresh interpreter and returns its measurements."""
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the control-plane import time against a budget.")
+    parser.add_argument('--budget', type=float, default=2.0, help="Maximum import time of app in seconds.")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of fresh interpreters to measure.")
+    parser.add_argument('--output', help="Optional path of a JSON file receiving the results.")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(max(1, args.repeat))]
+    report = {
+        "budget_seconds": args.budget,
+        "import_seconds": min(run["import_seconds"] for run in runs),
+        "max_rss_mb": max(run["max_rss_mb"] for run in runs),
+        "forbidden_imported": sorted({m for run in runs for m in run["forbidden_imported"]}),
+        "runs": runs,
+    }
+    report["passed"] = report["import_seconds"] <= args.budget and not report["forbidden_imported"]
+
+    print(f"import app: {report['import_seconds']:.3f}s (budget {args.budget:.3f}s), "
+          f"peak RSS {report['max_rss_mb']:.1f} MB")
+    if report["forbidden_imported"]:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(report['forbidden_imported'])}")
+    elif not report["passed"]:
+        print("FAIL: startup exceeded the import-time budget")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    return 0 if report["passed"] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
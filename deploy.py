@@ -8,28 +8,195 @@ within a Flask-based application.
 Features:
 - Render a deployment page.
 - List directory trees for project runs.
-- Download files directly from the server.
-- Transfer files to remote servers using SCP or FTP.
+- Download files directly from the server, with HTTP Range support for resuming.
+- Stream a run directory as a zip or tar archive built on the fly.
+- Transfer files and whole directories to remote servers using SCP or FTP as
+  background jobs with progress reporting, parallel pooled connections and
+  retry with resume. A "local" method writes into a local directory for testing
+  (only when the server runs with EVF_ALLOW_LOCAL_DEPLOY=1).
+- Delta deploy: remember what was pushed to each target path and send only changed blocks.
+- Registry of named deploy targets per project, with warm pooled connections,
+  periodic health/latency probes and fan-out deploy to many targets at once.
 
 Dependencies:
 - Flask: For route handling and request/response management.
 - Paramiko: For SCP/SFTP file transfers.
+- hashlib: For the block hashes recorded in delta deploy manifests.
+- threading, queue, concurrent.futures: For the background deploy job queue.
 - ftplib: For FTP file transfers.
+- zipfile, tarfile, zlib: For streaming archives without temporary files.
 - os, json: For file system operations and JSON parsing.
 
 Author: Junyong Park
 """
 
 import os
+import re
 import json
+import hashlib
+import posixpath
+import queue
+import socket
+import tarfile
+import tempfile
+import time
+import uuid
+import zipfile
+import zlib
 import paramiko  # pip install paramiko
-from ftplib import FTP
-from flask import Blueprint, request, session, send_file, jsonify, abort, render_template
+from concurrent.futures import ThreadPoolExecutor
+from ftplib import FTP, error_perm
+from threading import Lock, Thread
+from flask import Blueprint, Response, request, session, send_file, jsonify, abort, render_template, stream_with_context
 from auth import session_required  # Import your session management decorator
 
 # Initialize Blueprint for deployment-related routes
 deploy_bp = Blueprint('deploy', __name__)
 
+# Size of the chunks read from disk while streaming archives
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+# Size of the chunks sent to deploy targets
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+# Deploy jobs processed concurrently, files in flight per job and retries per file
+DEPLOY_JOB_WORKERS = 2
+DEPLOY_FILE_PARALLELISM = 4
+DEPLOY_MAX_RETRIES = 3
+
+# Finished deploy jobs are kept for this many seconds, and at most this many per user
+DEPLOY_JOB_TTL = 24 * 3600
+DEPLOY_JOBS_KEPT_PER_USER = 100
+
+# Block size used for delta deploy manifests
+DELTA_BLOCK_SIZE = 256 * 1024
+
+# Per-project manifest of what was last pushed to each target path
+DEPLOY_MANIFEST_FILE = 'deploy_manifest.json'
+
+# Per-project registry of named deploy targets
+DEPLOY_TARGETS_FILE = 'targets.json'
+
+# Seconds between background health probes of registered targets
+TARGET_HEALTH_INTERVAL = 30
+
+# Seconds allowed to open a connection to a deploy target
+DEPLOY_CONNECT_TIMEOUT = 10
+
+# Targets deployed to at once by a fan-out deploy, unless the request says otherwise
+FANOUT_MAX_CONCURRENCY = 4
+FANOUT_CONCURRENCY_RANGE = (1, 32)
+
+# Valid deploy target names (alphanumeric, underscore, hyphen or dot)
+VALID_TARGET_NAME_PATTERN = r"^[A-Za-z0-9_.-]+$"
+
+# Root directory of the "local" stand-in deploy target. The method writes to the
+# server's own disk, so it is disabled unless the admin sets EVF_ALLOW_LOCAL_DEPLOY=1.
+LOCAL_DEPLOY_ROOT = os.environ.get('EVF_LOCAL_DEPLOY_ROOT', os.path.join(tempfile.gettempdir(), 'evf_local_deploy'))
+ALLOW_LOCAL_DEPLOY = os.environ.get('EVF_ALLOW_LOCAL_DEPLOY') == '1'
+
+# Default port per deploy method
+DEFAULT_PORTS = {"scp": 22, "ftp": 21, "local": 0}
+
+# Accepted range of files in flight per job and of retries per file
+DEPLOY_PARALLELISM_RANGE = (1, 16)
+DEPLOY_RETRIES_RANGE = (0, 10)
+
+# Archive formats supported by /deploy/archive: format -> (extension, mimetype)
+ARCHIVE_FORMATS = {
+    "zip": (".zip", "application/zip"),
+    "tar": (".tar", "application/x-tar"),
+    "tar.gz": (".tar.gz", "application/gzip"),
+}
+
+def resolve_user_path(user, path):
+    """
+    Resolve a path from the deploy tree and ensure it stays inside the user's workspace.
+
+    Args:
+        user (str): The username from the session.
+        path (str): Path as returned by /deploy/list_run_files.
+
+    Returns:
+        str: The absolute path, or None if it points outside the workspace.
+    """
+    base_dir = os.path.abspath(os.path.join('workspace', user))
+    full_path = os.path.abspath(path)
+    if full_path != base_dir and not full_path.startswith(base_dir + os.sep):
+        return None
+    return full_path
+
+def is_target_registry_file(path):
+    """
+    True for a project's targets.json (or its temporary file). It holds the
+    deploy passwords, so it is never downloaded, archived or deployed.
+    """
+    path = os.path.abspath(path)
+    user_dir = os.path.dirname(os.path.dirname(path))
+    return (os.path.basename(path) in (DEPLOY_TARGETS_FILE, DEPLOY_TARGETS_FILE + '.tmp')
+            and os.path.dirname(user_dir) == os.path.abspath('workspace'))
+
+def local_target_root(host):
+    """
+    Directory of a "local" deploy target: LOCAL_DEPLOY_ROOT/<host>.
+
+    Raises:
+        ValueError: If the method is disabled or host is not one plain path component.
+    """
+    if not ALLOW_LOCAL_DEPLOY:
+        raise ValueError("The 'local' deploy method is disabled on this server (set EVF_ALLOW_LOCAL_DEPLOY=1).")
+    if (not isinstance(host, str) or not host or host in ('.', '..') or os.path.isabs(host)
+            or '/' in host or os.sep in host or (os.altsep and os.altsep in host)):
+        raise ValueError(f"Invalid host for a local target: {host!r}")
+    root = os.path.abspath(LOCAL_DEPLOY_ROOT)
+    path = os.path.abspath(os.path.join(root, host))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError(f"Invalid host for a local target: {host!r}")
+    return path
+
+def bounded_int(data, field, default, low, high):
+    """
+    Reads an integer field of a request, clamped to [low, high].
+
+    Raises:
+        ValueError: If the field is present but not an integer.
+    """
+    value = data.get(field)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{field}' must be an integer.")
+    return min(max(value, low), high)
+
+def connection_settings(data, method, password=""):
+    """
+    Validated connection settings of a deploy request or target, in the form used
+    by the connection pool. An empty password falls back to the given one.
+
+    Raises:
+        ValueError: With a message for the client if a setting is invalid.
+    """
+    host = data.get("host") or "localhost"
+    if not isinstance(host, str):
+        raise ValueError("'host' must be a string.")
+    if method == "local":
+        local_target_root(host)
+    try:
+        port = int(data.get("port") or DEFAULT_PORTS[method])
+    except (TypeError, ValueError):
+        raise ValueError("'port' must be an integer.")
+    if method != "local" and not 1 <= port <= 65535:
+        raise ValueError("'port' must be between 1 and 65535.")
+    return {
+        "method": method,
+        "host": host,
+        "port": port,
+        "username": data.get("username") or "",
+        "password": data.get("password") or password,
+    }
+
 @deploy_bp.route('/', methods=['GET'])
 def show_deploy():
     """
@@ -87,16 +254,17 @@ def deploy_transfer():
     """
     Handles file transfers via download (GET) or SCP/FTP upload (POST).
     GET /deploy/transfer?method=download&file=...
-    POST /deploy/transfer:
+    POST /deploy/transfer queues a background deploy job and returns its id (202):
     {
-        "method": "scp" or "ftp",
-        "file": "/abs/path/to/file",
+        "method": "scp", "ftp" or "local",
+        "file": "path/to/file/or/directory",
         "host": "...",
         "port": 22 or 21,
         "username": "...",
         "password": "...",
         "remote_path": "..."
     }
+    Progress is available from GET /deploy/jobs/<job_id>.
     """
     if 'user' not in session:
         return abort(401, description="Unauthorized")
@@ -106,91 +274,1337 @@ def deploy_transfer():
         file_path = request.args.get("file")
         if method != "download":
             return abort(400, description="GET only supports method=download")
-        if not file_path or not os.path.exists(file_path):
+        if not file_path:
+            return abort(404, description="File not found for download.")
+        file_path = resolve_user_path(session['user'], file_path)
+        if not file_path or not os.path.isfile(file_path) or is_target_registry_file(file_path):
             return abort(404, description="File not found for download.")
-        return send_file(file_path, as_attachment=True)
+        # conditional=True answers Range / If-Range requests with 206 partial
+        # content, so interrupted checkpoint downloads can be resumed.
+        return send_file(file_path, as_attachment=True, conditional=True, etag=True, max_age=0)
 
     elif request.method == 'POST':
         data = request.get_json() or {}
         method = data.get("method")
         file_path = data.get("file")
 
+        if data.get("target"):
+            method = "target"
         if not method or not file_path:
             return jsonify({"error": "Missing 'method' or 'file' in request."}), 400
-        if not os.path.exists(file_path):
-            return jsonify({"error": f"File not found: {file_path}"}), 404
+        if method not in ("scp", "ftp", "local", "target"):
+            return jsonify({"error": f"Unsupported method: {method}"}), 400
+
+        return submit_transfer_job(session['user'], data)
+
+@deploy_bp.route('/archive', methods=['GET'])
+def deploy_archive():
+    """
+    Streams a directory from the deploy tree as an archive built on the fly.
+    GET /deploy/archive?path=...&format=zip|tar|tar.gz
+
+    Nothing is staged on disk and only one chunk of one file is held in
+    memory at a time, so exporting a large run costs constant memory.
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+
+    dir_path = request.args.get("path")
+    archive_format = request.args.get("format", "zip")
+    if archive_format not in ARCHIVE_FORMATS:
+        return jsonify({"error": f"Unsupported archive format: {archive_format}"}), 400
+    if not dir_path:
+        return jsonify({"error": "Missing 'path' in request."}), 400
+
+    dir_path = resolve_user_path(session['user'], dir_path)
+    if not dir_path or not os.path.isdir(dir_path):
+        return jsonify({"error": "Directory not found."}), 404
+
+    if archive_format == "zip":
+        chunks = stream_zip(dir_path)
+    else:
+        chunks = stream_tar(dir_path, compress=(archive_format == "tar.gz"))
+
+    extension, mimetype = ARCHIVE_FORMATS[archive_format]
+    archive_name = os.path.basename(dir_path.rstrip(os.sep)) + extension
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}"'}
+    )
+
+def iter_archive_members(dir_path):
+    """
+    Yields (absolute path, archive name) for every regular file under dir_path.
+    Archive names are prefixed with the directory's own name.
+    """
+    root_name = os.path.basename(dir_path.rstrip(os.sep))
+    for current_dir, dirnames, filenames in os.walk(dir_path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            full_path = os.path.join(current_dir, filename)
+            if not os.path.isfile(full_path) or os.path.islink(full_path) or is_target_registry_file(full_path):
+                continue
+            rel_path = os.path.relpath(full_path, dir_path)
+            yield full_path, os.path.join(root_name, rel_path).replace(os.sep, '/')
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained by the streaming generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        if data:
+            self.chunks.append(bytes(data))
+            self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_zip(dir_path):
+    """
+    Generates a zip archive of dir_path chunk by chunk.
+    The output is not seekable, so zipfile writes data descriptors after each member.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for full_path, arcname in iter_archive_members(dir_path):
+            info = zipfile.ZipInfo.from_file(full_path, arcname)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(full_path, 'rb') as src, zf.open(info, mode='w', force_zip64=True) as dest:
+                while True:
+                    chunk = src.read(ARCHIVE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    data = buffer.drain()
+    if data:
+        yield data
+
+def stream_tar(dir_path, compress=False):
+    """
+    Generates a (optionally gzip-compressed) tar archive of dir_path chunk by chunk.
+    Headers come from tarfile; file bodies are copied directly so no member is
+    ever buffered whole.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(data):
+        return compressor.compress(data) if compressor else data
+
+    for full_path, arcname in iter_archive_members(dir_path):
+        info = tarfile.TarInfo(arcname)
+        stat = os.stat(full_path)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = stat.st_mode & 0o777
+        yield emit(info.tobuf(format=tarfile.PAX_FORMAT))
+
+        remaining = info.size
+        with open(full_path, 'rb') as src:
+            while remaining > 0:
+                chunk = src.read(min(ARCHIVE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    # File shrank while streaming; pad to the size already announced,
+                    # one chunk at a time so memory stays bounded
+                    chunk = b"\0" * min(ARCHIVE_CHUNK_SIZE, remaining)
+                remaining -= len(chunk)
+                yield emit(chunk)
+
+        padding = (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE) % tarfile.BLOCKSIZE
+        if padding:
+            yield emit(b"\0" * padding)
+
+    yield emit(b"\0" * (tarfile.BLOCKSIZE * 2))
+    if compressor:
+        yield compressor.flush()
+
+# -------------------- BACKGROUND DEPLOY JOBS --------------------
 
+class DeployCancelled(Exception):
+    """Raised from the progress callback to abort a transfer of a cancelled job."""
+
+class SFTPTarget:
+    """Remote file operations over one SFTP channel of a pooled SSH transport."""
+
+    def __init__(self, sftp, transport=None):
+        self.sftp = sftp
+        self.transport = transport
+
+    def remote_size(self, remote_path):
+        try:
+            return self.sftp.stat(remote_path).st_size
+        except IOError:
+            return None
+
+    def makedirs(self, remote_dir):
+        current = '/' if remote_dir.startswith('/') else ''
+        for part in [p for p in remote_dir.split('/') if p]:
+            current = posixpath.join(current, part)
+            try:
+                self.sftp.stat(current)
+            except IOError:
+                self.sftp.mkdir(current)
+
+    def upload(self, local_path, remote_path, offset, callback):
+        mode = 'r+b' if offset else 'wb'
+        with open(local_path, 'rb') as src, self.sftp.open(remote_path, mode) as dst:
+            dst.set_pipelined(True)
+            if offset:
+                src.seek(offset)
+                dst.seek(offset)
+            copy_chunks(src, dst, callback)
+
+    def plan_patch(self, ranges, remote_size, size):
+        return ranges
+
+    def patch(self, local_path, remote_path, ranges, size, callback):
+        with open(local_path, 'rb') as src, self.sftp.open(remote_path, 'r+b') as dst:
+            dst.set_pipelined(True)
+            for offset, length in ranges:
+                src.seek(offset)
+                dst.seek(offset)
+                copy_chunks(src, dst, callback, length)
+        self.sftp.truncate(remote_path, size)
+
+    def rename(self, src_path, dst_path):
+        try:
+            self.sftp.posix_rename(src_path, dst_path)
+        except IOError:
+            # Servers without the posix-rename extension refuse to overwrite
+            if self.remote_size(dst_path) is not None:
+                self.sftp.remove(dst_path)
+            self.sftp.rename(src_path, dst_path)
+
+    def ping(self):
+        self.sftp.stat('.')
+
+    def close(self):
+        self.sftp.close()
+
+class FTPTarget:
+    """Remote file operations over one FTP session."""
+
+    def __init__(self, ftp, generation=0):
+        self.ftp = ftp
+        self.generation = generation
+
+    def remote_size(self, remote_path):
+        try:
+            self.ftp.voidcmd('TYPE I')
+            return self.ftp.size(remote_path)
+        except error_perm:
+            return None
+
+    def makedirs(self, remote_dir):
+        current = '/' if remote_dir.startswith('/') else ''
+        for part in [p for p in remote_dir.split('/') if p]:
+            current = posixpath.join(current, part)
+            try:
+                self.ftp.mkd(current)
+            except error_perm:
+                pass  # Already exists
+
+    def upload(self, local_path, remote_path, offset, callback):
+        with open(local_path, 'rb') as src:
+            src.seek(offset)
+            self.ftp.storbinary(f"STOR {remote_path}", src, blocksize=TRANSFER_CHUNK_SIZE,
+                                callback=lambda chunk: callback(len(chunk)), rest=offset or None)
+
+    def plan_patch(self, ranges, remote_size, size):
+        # FTP can only restart a STOR at an offset and cannot truncate, so
+        # resend everything from the first changed block unless the file shrank.
+        if size < remote_size:
+            return None
+        start = ranges[0][0] if ranges else size
+        return [(start, size - start)] if start < size else []
+
+    def patch(self, local_path, remote_path, ranges, size, callback):
+        for offset, length in ranges:
+            with open(local_path, 'rb') as src:
+                src.seek(offset)
+                self.ftp.storbinary(f"STOR {remote_path}", src, blocksize=TRANSFER_CHUNK_SIZE,
+                                    callback=lambda chunk: callback(len(chunk)), rest=offset)
+
+    def rename(self, src_path, dst_path):
+        if self.remote_size(dst_path) is not None:
+            self.ftp.delete(dst_path)
+        self.ftp.rename(src_path, dst_path)
+
+    def ping(self):
+        self.ftp.voidcmd('NOOP')
+
+    def close(self):
+        try:
+            self.ftp.quit()
+        except Exception:
+            self.ftp.close()
+
+class LocalTarget:
+    """
+    Stand-in target that writes into a local directory instead of a device.
+    Remote paths are placed under LOCAL_DEPLOY_ROOT/<host>, which makes it
+    possible to exercise deploy jobs without an SSH or FTP server.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _local(self, remote_path):
+        full_path = os.path.abspath(os.path.join(self.root, remote_path.lstrip('/')))
+        # The root itself is the remote "/" (e.g. the parent of a top-level file)
+        if os.path.commonpath([self.root, full_path]) != self.root:
+            raise ValueError(f"Invalid remote path: {remote_path}")
+        return full_path
+
+    def remote_size(self, remote_path):
+        full_path = self._local(remote_path)
+        return os.path.getsize(full_path) if os.path.isfile(full_path) else None
+
+    def makedirs(self, remote_dir):
+        os.makedirs(self._local(remote_dir), exist_ok=True)
+
+    def upload(self, local_path, remote_path, offset, callback):
+        mode = 'r+b' if offset else 'wb'
+        with open(local_path, 'rb') as src, open(self._local(remote_path), mode) as dst:
+            if offset:
+                src.seek(offset)
+                dst.seek(offset)
+            copy_chunks(src, dst, callback)
+            dst.truncate()
+
+    def plan_patch(self, ranges, remote_size, size):
+        return ranges
+
+    def patch(self, local_path, remote_path, ranges, size, callback):
+        with open(local_path, 'rb') as src, open(self._local(remote_path), 'r+b') as dst:
+            for offset, length in ranges:
+                src.seek(offset)
+                dst.seek(offset)
+                copy_chunks(src, dst, callback, length)
+            dst.truncate(size)
+
+    def rename(self, src_path, dst_path):
+        os.replace(self._local(src_path), self._local(dst_path))
+
+    def ping(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def close(self):
+        pass
+
+def copy_chunks(src, dst, callback, length=None):
+    """
+    Copies src to dst in TRANSFER_CHUNK_SIZE chunks, reporting progress to callback.
+    If length is given, at most that many bytes are copied.
+    """
+    while length is None or length > 0:
+        chunk = src.read(TRANSFER_CHUNK_SIZE if length is None else min(TRANSFER_CHUNK_SIZE, length))
+        if not chunk:
+            break
+        dst.write(chunk)
+        callback(len(chunk))
+        if length is not None:
+            length -= len(chunk)
+
+# -------------------- DELTA DEPLOY --------------------
+
+def compute_file_signature(path, block_size=DELTA_BLOCK_SIZE):
+    """
+    Computes the whole-file hash and per-block hashes of a local file.
+
+    Returns:
+        dict: size, block_size, sha256 and the list of block hashes.
+    """
+    file_hash = hashlib.sha256()
+    blocks = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(block_size)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+            blocks.append(hashlib.blake2b(chunk, digest_size=16).hexdigest())
+    return {
+        "size": os.path.getsize(path),
+        "block_size": block_size,
+        "sha256": file_hash.hexdigest(),
+        "blocks": blocks,
+    }
+
+def changed_ranges(previous, signature):
+    """
+    Compares two signatures block by block and returns the byte ranges of the
+    new file that differ from what the target already holds, as a list of
+    (offset, length) with adjacent blocks coalesced.
+    """
+    block_size = signature["block_size"]
+    ranges = []
+    for index, block_hash in enumerate(signature["blocks"]):
+        if index < len(previous["blocks"]) and previous["blocks"][index] == block_hash:
+            continue
+        offset = index * block_size
+        length = min(block_size, signature["size"] - offset)
+        if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+        else:
+            ranges.append((offset, length))
+    return ranges
+
+def manifest_key(settings, remote_path):
+    """Identifies one remote file on one target inside a deploy manifest."""
+    return f"{settings['method']}://{settings.get('host', '')}:{settings.get('port', '')}/{remote_path.lstrip('/')}"
+
+class DeployManifestStore:
+    """
+    A thread-safe, file-backed record of the signature of every file last
+    pushed to each (target, remote path) of a project.
+    """
+
+    def __init__(self, path):
+        self.lock = Lock()
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def update(self, key, signature):
+        with self.lock:
+            self.entries[key] = dict(signature, pushed_date=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+            self._save()
+
+    def discard(self, key):
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        # Write-then-rename so a crash never leaves a truncated manifest
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+manifest_stores = {}
+manifest_stores_lock = Lock()
+
+def get_manifest_store(path):
+    """Returns the shared DeployManifestStore for a manifest file."""
+    with manifest_stores_lock:
+        if path not in manifest_stores:
+            manifest_stores[path] = DeployManifestStore(path)
+        return manifest_stores[path]
+
+class TransferConnectionPool:
+    """
+    A thread-safe pool of connections to deploy targets.
+
+    SSH targets share one authenticated paramiko.Transport (kept alive with
+    keepalive packets); every concurrent transfer opens its own SFTP channel
+    over it. FTP cannot multiplex, so idle FTP sessions are parked and reused.
+    Connections of a retired target (edited or deleted) are no longer handed
+    out, but transfers already using them finish first.
+    """
+
+    def __init__(self, keepalive=30, max_idle_ftp=DEPLOY_FILE_PARALLELISM):
+        self.lock = Lock()
+        self.keepalive = keepalive
+        self.max_idle_ftp = max_idle_ftp
+        self.transports = {}
+        self.connect_locks = {}
+        self.idle_ftp = {}
+        self.in_use = {}  # SSH transport -> SFTP channels handed out over it
+        self.retired = set()  # Transports to close once their last channel is released
+        self.generations = {}  # Bumped per key on retire so older FTP sessions are not parked
+
+    @staticmethod
+    def key(settings):
+        # Connections are never shared across users or across credentials of the same login
+        secret = hashlib.sha256(str(settings.get("password", "")).encode()).hexdigest()
+        return (settings.get("owner", ""), settings["method"], settings.get("host", ""),
+                int(settings.get("port", 0)), settings.get("username", ""), secret)
+
+    def acquire(self, settings):
+        method = settings["method"]
         if method == "scp":
-            return scp_file(data)
-        elif method == "ftp":
-            return ftp_file(data)
+            transport = self._transport(settings)
+            try:
+                return SFTPTarget(paramiko.SFTPClient.from_transport(transport), transport)
+            except Exception:
+                self._release_transport(transport)
+                raise
+        if method == "ftp":
+            with self.lock:
+                generation = self.generations.get(self.key(settings), 0)
+            return FTPTarget(self._ftp(settings), generation)
+        if method == "local":
+            return LocalTarget(local_target_root(settings.get("host") or "localhost"))
+        raise ValueError(f"Unsupported method: {method}")
+
+    def release(self, settings, target, broken=False):
+        if isinstance(target, FTPTarget) and not broken:
+            with self.lock:
+                key = self.key(settings)
+                idle = self.idle_ftp.setdefault(key, [])
+                if len(idle) < self.max_idle_ftp and target.generation == self.generations.get(key, 0):
+                    idle.append(target.ftp)
+                    return
+        try:
+            target.close()
+        except Exception:
+            pass
+        if isinstance(target, SFTPTarget) and target.transport is not None:
+            self._release_transport(target.transport)
+        if broken and settings["method"] == "scp":
+            # Keep the transport if only this transfer failed; other
+            # transfers may still be using it.
+            self.discard(settings, only_if_dead=True)
+
+    def discard(self, settings, only_if_dead=False):
+        """Drops and closes the cached connection(s) for a target."""
+        key = self.key(settings)
+        with self.lock:
+            transport = self.transports.get(key)
+            if transport is not None and only_if_dead and transport.is_active():
+                transport = None
+            else:
+                self.transports.pop(key, None)
+            idle = self.idle_ftp.pop(key, [])
+        if transport is not None:
+            transport.close()
+        for ftp in idle:
+            ftp.close()
+
+    def retire(self, settings):
+        """
+        Stops handing out the cached connection(s) for a target, e.g. after its settings
+        changed. Idle FTP sessions are closed now; an SSH transport that still carries
+        transfers is closed when the last of them is released.
+        """
+        key = self.key(settings)
+        with self.lock:
+            transport = self.transports.pop(key, None)
+            idle = self.idle_ftp.pop(key, [])
+            self.generations[key] = self.generations.get(key, 0) + 1
+            if transport is not None and self.in_use.get(transport):
+                self.retired.add(transport)
+                transport = None
+        if transport is not None:
+            transport.close()
+        for ftp in idle:
+            ftp.close()
+
+    def _release_transport(self, transport):
+        with self.lock:
+            count = self.in_use.get(transport, 0) - 1
+            if count > 0:
+                self.in_use[transport] = count
+                return
+            self.in_use.pop(transport, None)
+            if transport not in self.retired:
+                return
+            self.retired.discard(transport)
+        transport.close()
+
+    def _transport(self, settings):
+        """Returns the target's live transport, counted as in use until _release_transport."""
+        key = self.key(settings)
+        with self.lock:
+            connect_lock = self.connect_locks.setdefault(key, Lock())
+        # Connect outside the pool lock so a slow target does not block others
+        with connect_lock:
+            with self.lock:
+                transport = self.transports.get(key)
+                if transport is not None and transport.is_active():
+                    self.in_use[transport] = self.in_use.get(transport, 0) + 1
+                    return transport
+            sock = socket.create_connection((settings["host"], int(settings["port"])), timeout=DEPLOY_CONNECT_TIMEOUT)
+            transport = paramiko.Transport(sock)
+            transport.banner_timeout = DEPLOY_CONNECT_TIMEOUT
+            transport.auth_timeout = DEPLOY_CONNECT_TIMEOUT
+            try:
+                transport.set_keepalive(self.keepalive)
+                transport.connect(username=settings.get("username", ""), password=settings.get("password", ""))
+            except Exception:
+                transport.close()
+                raise
+            with self.lock:
+                self.transports[key] = transport
+                self.in_use[transport] = self.in_use.get(transport, 0) + 1
+            return transport
+
+    def _ftp(self, settings):
+        key = self.key(settings)
+        while True:
+            with self.lock:
+                idle = self.idle_ftp.get(key)
+                ftp = idle.pop() if idle else None
+            if ftp is None:
+                break
+            try:
+                ftp.voidcmd('NOOP')
+                return ftp
+            except Exception:
+                ftp.close()
+        ftp = FTP()
+        ftp.connect(host=settings["host"], port=int(settings["port"]), timeout=DEPLOY_CONNECT_TIMEOUT)
+        ftp.login(user=settings.get("username", ""), passwd=settings.get("password", ""))
+        return ftp
+
+class DeployJobManager:
+    """
+    A thread-safe background queue of deploy jobs. Finished jobs are forgotten after
+    DEPLOY_JOB_TTL seconds, or sooner once a user has more than DEPLOY_JOBS_KEPT_PER_USER.
+
+    Each job uploads one or more files to a target. Jobs are processed by a
+    small set of worker threads; within a job, files are transferred in
+    parallel over connections from the shared TransferConnectionPool. Files are
+    written to '<remote_path>.part' and renamed when complete, so a failed
+    attempt is retried by resuming from the size of the partial file.
+    """
+
+    def __init__(self, pool, num_workers=DEPLOY_JOB_WORKERS):
+        self.lock = Lock()
+        self.pool = pool
+        self.num_workers = num_workers
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.workers = []
+
+    def submit(self, user, settings, files, parallel=DEPLOY_FILE_PARALLELISM, retries=DEPLOY_MAX_RETRIES,
+               manifests=None, block_size=DELTA_BLOCK_SIZE, target_name=None, group_id=None, enqueue=True):
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "job_id": job_id,
+            "user": user,
+            "method": settings["method"],
+            "host": settings.get("host", ""),
+            "target": target_name,
+            "group_id": group_id,
+            "status": "Queued",
+            "error": None,
+            "created_date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "started_date": None,
+            "finished_date": None,
+            "bytes_total": sum(os.path.getsize(local) for local, _ in files),
+            "bytes_done": 0,
+            "bytes_skipped": 0,
+            "delta": manifests is not None,
+            "files_total": len(files),
+            "files_done": 0,
+            "files": [
+                {"file": local, "remote_path": remote, "size": os.path.getsize(local),
+                 "bytes_done": 0, "bytes_skipped": 0, "transfer": None,
+                 "status": "Queued", "attempts": 0, "error": None}
+                for local, remote in files
+            ],
+            "_settings": settings,
+            "_parallel": min(max(int(parallel), DEPLOY_PARALLELISM_RANGE[0]), DEPLOY_PARALLELISM_RANGE[1]),
+            "_retries": min(max(int(retries), DEPLOY_RETRIES_RANGE[0]), DEPLOY_RETRIES_RANGE[1]),
+            "_cancelled": False,
+            "_manifests": manifests,
+            "_block_size": int(block_size),
+            "_finished_at": None,
+        }
+        with self.lock:
+            self._prune()
+            self.jobs[job_id] = job
+            if enqueue:
+                self._ensure_workers()
+        if enqueue:
+            self.queue.put(job_id)
+        return self.snapshot(job)
+
+    def run_group(self, job_ids, max_concurrency):
+        """
+        Runs already submitted (not enqueued) jobs in a background thread,
+        at most max_concurrency at a time. Used for fan-out deploys.
+        """
+        def run_all():
+            with ThreadPoolExecutor(max_workers=max(1, int(max_concurrency))) as executor:
+                list(executor.map(self._execute, job_ids))
+
+        Thread(target=run_all, name="deploy-fanout", daemon=True).start()
+
+    def get(self, user, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["user"] != user:
+                return None
+            return self.snapshot(job)
+
+    def list(self, user):
+        with self.lock:
+            self._prune()
+            return [self.snapshot(job) for job in self.jobs.values() if job["user"] == user]
+
+    def cancel(self, user, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["user"] != user:
+                return None
+            job["_cancelled"] = True
+            if job["status"] == "Queued":
+                job["status"] = "Cancelled"
+                job["finished_date"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                job["_finished_at"] = time.time()
+            return self.snapshot(job)
+
+    @staticmethod
+    def snapshot(job):
+        snap = {k: v for k, v in job.items() if not k.startswith('_')}
+        snap["files"] = [dict(entry) for entry in job["files"]]
+        snap["progress"] = (100.0 * job["bytes_done"] / job["bytes_total"]) if job["bytes_total"] else 100.0
+        return snap
+
+    def _prune(self):
+        # Called with self.lock held; running and queued jobs are always kept
+        now = time.time()
+        finished = {}
+        for job_id, job in list(self.jobs.items()):
+            if job["_finished_at"] is None:
+                continue
+            if now - job["_finished_at"] > DEPLOY_JOB_TTL:
+                del self.jobs[job_id]
+            else:
+                finished.setdefault(job["user"], []).append(job)
+        for jobs in finished.values():
+            jobs.sort(key=lambda job: job["_finished_at"])
+            for job in jobs[:-DEPLOY_JOBS_KEPT_PER_USER]:
+                del self.jobs[job["job_id"]]
+
+    def _ensure_workers(self):
+        # Called with self.lock held; workers start lazily on the first job
+        self.workers = [w for w in self.workers if w.is_alive()]
+        while len(self.workers) < self.num_workers:
+            worker = Thread(target=self._worker, name="deploy-worker", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _worker(self):
+        while True:
+            job_id = self.queue.get()
+            try:
+                self._execute(job_id)
+            finally:
+                self.queue.task_done()
+
+    def _execute(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["_cancelled"]:
+                return
+            job["status"] = "Running"
+            job["started_date"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self._run(job)
+
+    def _run(self, job):
+        with ThreadPoolExecutor(max_workers=job["_parallel"]) as executor:
+            list(executor.map(lambda entry: self._transfer_file(job, entry), job["files"]))
+
+        with self.lock:
+            failed = [entry for entry in job["files"] if entry["status"] == "Failed"]
+            if job["_cancelled"]:
+                job["status"] = "Cancelled"
+            elif failed:
+                job["status"] = "Failed"
+                job["error"] = f"{len(failed)} file(s) failed: {failed[0]['error']}"
+            else:
+                job["status"] = "Completed"
+            job["finished_date"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            job["_finished_at"] = time.time()
+
+    def _add_progress(self, job, entry, nbytes):
+        with self.lock:
+            entry["bytes_done"] += nbytes
+            job["bytes_done"] += nbytes
+            if job["_cancelled"]:
+                raise DeployCancelled()
+
+    def _set_progress(self, job, entry, nbytes, skipped=0):
+        with self.lock:
+            job["bytes_done"] += nbytes - entry["bytes_done"]
+            job["bytes_skipped"] += skipped - entry["bytes_skipped"]
+            entry["bytes_done"] = nbytes
+            entry["bytes_skipped"] = skipped
+
+    def _send_full(self, target, job, entry):
+        remote_path = entry["remote_path"]
+        part_path = remote_path + ".part"
+
+        # Resume from whatever a previous attempt left in the .part file
+        offset = target.remote_size(part_path) or 0
+        if offset > entry["size"]:
+            offset = 0
+        self._set_progress(job, entry, offset)
+
+        target.upload(entry["file"], part_path, offset,
+                      lambda nbytes: self._add_progress(job, entry, nbytes))
+        target.rename(part_path, remote_path)
+        entry["transfer"] = "full"
+
+    def _send_delta(self, target, job, entry):
+        """
+        Sends only what changed since the push recorded in the project manifest.
+        The remote file is patched in place, so its manifest entry is dropped
+        first: if the patch is interrupted the next deploy falls back to a full upload.
+        """
+        manifests = job["_manifests"]
+        key = manifest_key(job["_settings"], entry["remote_path"])
+        signature = compute_file_signature(entry["file"], job["_block_size"])
+        previous = manifests.get(key)
+        self._set_progress(job, entry, 0)
+
+        ranges = None
+        if previous and previous["block_size"] == signature["block_size"]:
+            remote_size = target.remote_size(entry["remote_path"])
+            if remote_size == previous["size"]:
+                ranges = target.plan_patch(changed_ranges(previous, signature), remote_size, signature["size"])
+
+        if ranges is None:
+            manifests.discard(key)
+            self._send_full(target, job, entry)
         else:
-            return jsonify({"error": f"Unsupported method: {method}"}), 400
+            skipped = signature["size"] - sum(length for _, length in ranges)
+            self._set_progress(job, entry, skipped, skipped)
+            if ranges or previous["sha256"] != signature["sha256"]:
+                manifests.discard(key)
+                target.patch(entry["file"], entry["remote_path"], ranges, signature["size"],
+                             lambda nbytes: self._add_progress(job, entry, nbytes))
+            entry["transfer"] = "delta" if ranges else "unchanged"
+        manifests.update(key, signature)
+
+    def _transfer_file(self, job, entry):
+        settings = job["_settings"]
+        remote_path = entry["remote_path"]
+
+        for attempt in range(job["_retries"] + 1):
+            with self.lock:
+                if job["_cancelled"]:
+                    entry["status"] = "Cancelled"
+                    return
+                entry["status"] = "Running"
+                entry["attempts"] = attempt + 1
+
+            target = None
+            try:
+                target = self.pool.acquire(settings)
+                remote_dir = posixpath.dirname(remote_path)
+                if remote_dir:
+                    target.makedirs(remote_dir)
+
+                if job["_manifests"] is not None:
+                    self._send_delta(target, job, entry)
+                else:
+                    self._send_full(target, job, entry)
+                self.pool.release(settings, target)
+
+                with self.lock:
+                    entry["status"] = "Completed"
+                    entry["error"] = None
+                    job["files_done"] += 1
+                return
+            except DeployCancelled:
+                if target is not None:
+                    self.pool.release(settings, target, broken=True)
+                with self.lock:
+                    entry["status"] = "Cancelled"
+                return
+            except Exception as e:
+                if target is not None:
+                    self.pool.release(settings, target, broken=True)
+                with self.lock:
+                    entry["error"] = str(e)
+                if attempt < job["_retries"]:
+                    time.sleep(min(2 ** attempt, 10))
+
+        with self.lock:
+            entry["status"] = "Failed"
+
+def collect_transfer_files(local_path, remote_path):
+    """
+    Expands a file or directory into a list of (local file, remote file) pairs.
+    For a directory, remote_path is the remote directory receiving its contents.
+    """
+    if os.path.isfile(local_path):
+        return [(local_path, remote_path)]
+
+    files = []
+    for current_dir, dirnames, filenames in os.walk(local_path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            full_path = os.path.join(current_dir, filename)
+            if not os.path.isfile(full_path) or os.path.islink(full_path) or is_target_registry_file(full_path):
+                continue
+            rel_path = os.path.relpath(full_path, local_path).replace(os.sep, '/')
+            files.append((full_path, posixpath.join(remote_path, rel_path)))
+    return files
+
+class TargetRegistry:
+    """
+    A thread-safe, file-backed registry of the named deploy targets of one
+    project. Each target stores the connection settings a deploy needs
+    (method, host, port, username, password), so requests can refer to it by name.
+    """
+
+    def __init__(self, path, owner):
+        self.lock = Lock()
+        self.path = path
+        self.owner = owner
+        self.targets = {}
+        if os.path.exists(path):
+            os.chmod(path, 0o600)
+            with open(path, 'r') as f:
+                self.targets = json.load(f)
+
+    def all(self):
+        with self.lock:
+            return {name: dict(target) for name, target in self.targets.items()}
+
+    def get(self, name):
+        with self.lock:
+            target = self.targets.get(name)
+            return dict(target) if target else None
+
+    def save(self, name, target):
+        with self.lock:
+            self.targets[name] = target
+            self._save()
+
+    def delete(self, name):
+        with self.lock:
+            removed = self.targets.pop(name, None)
+            if removed is not None:
+                self._save()
+            return removed
+
+    def _save(self):
+        # Passwords are stored here, so the file is readable by the server's user only
+        tmp_path = self.path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(tmp_path, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.targets, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+target_registries = {}
+target_registries_lock = Lock()
+
+def get_target_registry(user, project_name):
+    """Returns the shared TargetRegistry of a project, or None if the project does not exist."""
+    project_dir = os.path.join('workspace', user, project_name)
+    if not os.path.isdir(project_dir):
+        return None
+    path = os.path.abspath(os.path.join(project_dir, DEPLOY_TARGETS_FILE))
+    with target_registries_lock:
+        if path not in target_registries:
+            target_registries[path] = TargetRegistry(path, user)
+        registry = target_registries[path]
+    target_health.start()
+    return registry
+
+def target_settings(target, owner):
+    """Connection settings of a registry entry, in the form used by the connection pool."""
+    settings = {key: target.get(key, "") for key in ("method", "host", "port", "username", "password")}
+    settings["owner"] = owner
+    return settings
+
+def public_target(name, target, owner):
+    """A registry entry without its password, merged with its latest health probe."""
+    info = {key: value for key, value in target.items() if key != "password"}
+    info["name"] = name
+    info["has_password"] = bool(target.get("password"))
+    info["health"] = target_health.status(target_settings(target, owner))
+    return info
+
+class TargetHealthMonitor:
+    """
+    Periodically probes every registered deploy target.
+
+    A probe goes through the shared TransferConnectionPool, so it also keeps
+    the SSH transport (or an idle FTP session) of each target warm for the
+    next deploy. Results hold status, round-trip latency and the probe time.
+    Probes requested from a route run in the background (probe_async), so a
+    slow or unreachable target never holds up a request.
+    """
+
+    def __init__(self, pool, interval=TARGET_HEALTH_INTERVAL):
+        self.lock = Lock()
+        self.pool = pool
+        self.interval = interval
+        self.results = {}
+        self.pending = set()
+        self.executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_CONCURRENCY, thread_name_prefix="deploy-probe")
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self._loop, name="deploy-health", daemon=True)
+                self.thread.start()
+
+    def status(self, settings):
+        key = self.pool.key(settings)
+        with self.lock:
+            result = self.results.get(key)
+            if key in self.pending:
+                result = dict(result or {"status": "checking", "latency_ms": None, "error": None}, pending=True)
+            return result
+
+    def probe_async(self, settings):
+        """Queues a probe of one target unless one is already pending."""
+        key = self.pool.key(settings)
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+        self.executor.submit(self._probe_pending, key, settings)
 
-def scp_file(payload):
+    def _probe_pending(self, key, settings):
+        try:
+            self.probe(settings)
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def probe(self, settings):
+        result = {"status": "offline", "latency_ms": None, "error": None,
+                  "checked_date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        target = None
+        try:
+            target = self.pool.acquire(settings)
+            start = time.perf_counter()
+            target.ping()
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            result["status"] = "online"
+            self.pool.release(settings, target)
+        except Exception as e:
+            result["error"] = str(e)
+            if target is not None:
+                self.pool.release(settings, target, broken=True)
+            else:
+                # A live transport may still carry deploy transfers; only drop dead ones
+                self.pool.discard(settings, only_if_dead=True)
+        with self.lock:
+            self.results[self.pool.key(settings)] = result
+        return result
+
+    def _loop(self):
+        while True:
+            with target_registries_lock:
+                registries = list(target_registries.values())
+            settings_by_key = {}
+            for registry in registries:
+                for target in registry.all().values():
+                    settings = target_settings(target, registry.owner)
+                    settings_by_key[self.pool.key(settings)] = settings
+            if settings_by_key:
+                with ThreadPoolExecutor(max_workers=FANOUT_MAX_CONCURRENCY) as executor:
+                    list(executor.map(self.probe, settings_by_key.values()))
+            time.sleep(self.interval)
+
+transfer_pool = TransferConnectionPool()
+deploy_jobs = DeployJobManager(transfer_pool)
+target_health = TargetHealthMonitor(transfer_pool)
+
+def default_remote_path(method, local_path):
+    """Remote path used when a deploy request does not name one."""
+    if os.path.isdir(local_path):
+        return posixpath.join('/tmp' if method == "scp" else '', os.path.basename(local_path))
+    return "/tmp/deployed_model.pth" if method == "scp" else os.path.basename(local_path)
+
+def project_manifests(user, local_path):
+    """The delta deploy manifest of the project a local path belongs to."""
+    user_dir = os.path.abspath(os.path.join('workspace', user))
+    project_name = os.path.relpath(local_path, user_dir).split(os.sep)[0]
+    return get_manifest_store(os.path.join(user_dir, project_name, DEPLOY_MANIFEST_FILE))
+
+def submit_transfer_job(user, payload):
     """
-    Transfers a file via SCP using Paramiko.
+    Validates a transfer payload and queues it as a background deploy job.
     Payload:
     {
-      "file": "/local/path",
+      "method": "scp", "ftp" or "local",
+      "file": "path of a file or directory from the deploy tree",
       "host": "...",
-      "port": 22,
+      "port": 22 or 21,
       "username": "...",
       "password": "...",
-      "remote_path": "/remote/path/filename"
+      "remote_path": "/remote/path/filename or /remote/dir",
+      "parallel": 4,
+      "retries": 3,
+      "delta": false,
+      "block_size": 262144
     }
+    Instead of connection settings, "project_name" and "target" may name a
+    target from the project's registry.
+    With "delta", files whose content matches the project's deploy manifest are
+    skipped and changed files only have their changed blocks rewritten.
     """
-    file_path = payload["file"]
-    host = payload.get("host", "localhost")
-    port = int(payload.get("port", 22))
-    username = payload.get("username", "")
-    password = payload.get("password", "")
-    remote_path = payload.get("remote_path", "/tmp/deployed_model.pth")
+    local_path = resolve_user_path(user, payload["file"])
+    if not local_path or not os.path.exists(local_path):
+        return jsonify({"error": f"File not found: {payload['file']}"}), 404
 
-    transport = paramiko.Transport((host, port))
+    target_name = payload.get("target")
+    if target_name:
+        registry = get_target_registry(user, payload.get("project_name", ""))
+        target = registry.get(target_name) if registry else None
+        if target is None:
+            return jsonify({"error": f"Deploy target not found: {target_name}"}), 404
+        settings = target_settings(target, user)
+        default_remote = target.get("remote_path")
+    else:
+        default_remote = None
+        try:
+            settings = connection_settings(payload, payload["method"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    settings["owner"] = user
     try:
-        transport.connect(username=username, password=password)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-        sftp.put(file_path, remote_path)
-    finally:
-        transport.close()
+        parallel = bounded_int(payload, "parallel", DEPLOY_FILE_PARALLELISM, *DEPLOY_PARALLELISM_RANGE)
+        retries = bounded_int(payload, "retries", DEPLOY_MAX_RETRIES, *DEPLOY_RETRIES_RANGE)
+        block_size = bounded_int(payload, "block_size", DELTA_BLOCK_SIZE, 4096, 64 * 1024 * 1024)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    remote_path = (payload.get("remote_path") or default_remote
+                   or default_remote_path(settings["method"], local_path))
+    files = collect_transfer_files(local_path, remote_path)
+    if not files:
+        return jsonify({"error": "Nothing to transfer: directory is empty."}), 400
 
-    return jsonify({"message": f"SCP to {host}:{remote_path} succeeded."})
+    job = deploy_jobs.submit(
+        user, settings, files,
+        parallel=parallel,
+        retries=retries,
+        manifests=project_manifests(user, local_path) if payload.get("delta") else None,
+        block_size=block_size,
+        target_name=target_name
+    )
+    return jsonify({
+        "message": f"Deploy job {job['job_id']} queued: {len(files)} file(s) to {settings['host']}:{remote_path}.",
+        "job_id": job["job_id"],
+        "job": job
+    }), 202
 
-def ftp_file(payload):
+@deploy_bp.route('/jobs', methods=['GET'])
+def list_deploy_jobs():
     """
-    Transfers a file via FTP.
-    Payload:
+    Lists the current user's deploy jobs.
+    Endpoint: GET /deploy/jobs
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+    return jsonify({"jobs": deploy_jobs.list(session['user'])}), 200
+
+@deploy_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_deploy_job(job_id):
+    """
+    Returns status and progress of one deploy job.
+    Endpoint: GET /deploy/jobs/<job_id>
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+    job = deploy_jobs.get(session['user'], job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify({"job": job}), 200
+
+@deploy_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_deploy_job(job_id):
+    """
+    Cancels a queued or running deploy job.
+    Endpoint: POST /deploy/jobs/<job_id>/cancel
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+    job = deploy_jobs.cancel(session['user'], job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    return jsonify({"message": f"Job {job_id} cancelled.", "job": job}), 200
+
+# -------------------- DEPLOY TARGETS --------------------
+
+@deploy_bp.route('/targets', methods=['GET'])
+def list_deploy_targets():
+    """
+    Lists the named deploy targets of a project with their latest health probe.
+    Endpoint: GET /deploy/targets?project_name=...
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+
+    registry = get_target_registry(session['user'], request.args.get("project_name", ""))
+    if registry is None:
+        return jsonify({"error": "Project not found."}), 404
+
+    targets = [public_target(name, target, session['user']) for name, target in sorted(registry.all().items())]
+    return jsonify({"targets": targets}), 200
+
+@deploy_bp.route('/targets/save', methods=['POST'])
+def save_deploy_target():
+    """
+    Adds or updates a named deploy target. An empty password keeps the stored one.
+    The target is probed in the background; passwords are never returned.
+    POST /deploy/targets/save:
     {
-      "file": "/local/path",
-      "host": "...",
-      "port": 21,
-      "username": "...",
-      "password": "...",
-      "remote_path": "filename or subdir/filename"
+        "project_name": "...",
+        "name": "jetson-01",
+        "method": "scp", "ftp" or "local",
+        "host": "...",
+        "port": 22,
+        "username": "...",
+        "password": "...",
+        "remote_path": "/default/remote/dir (optional)"
     }
     """
-    file_path = payload["file"]
-    host = payload.get("host", "localhost")
-    port = int(payload.get("port", 21))
-    username = payload.get("username", "")
-    password = payload.get("password", "")
-    remote_path = payload.get("remote_path", None)
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
 
-    ftp_filename = os.path.basename(remote_path) if remote_path else os.path.basename(file_path)
-    ftp_subdir = os.path.dirname(remote_path) if remote_path else ""
+    data = request.get_json() or {}
+    name = data.get("name", "")
+    method = data.get("method")
+    if not re.match(VALID_TARGET_NAME_PATTERN, name):
+        return jsonify({"error": "Invalid target name. Use only letters, numbers, dots, hyphens, and underscores."}), 400
+    if method not in ("scp", "ftp", "local"):
+        return jsonify({"error": f"Unsupported method: {method}"}), 400
 
-    with FTP() as ftp:
-        ftp.connect(host=host, port=port, timeout=30)
-        ftp.login(user=username, passwd=password)
-        if ftp_subdir:
-            try:
-                ftp.cwd(ftp_subdir)
-            except:
-                ftp.mkd(ftp_subdir)
-                ftp.cwd(ftp_subdir)
+    registry = get_target_registry(session['user'], data.get("project_name", ""))
+    if registry is None:
+        return jsonify({"error": "Project not found."}), 404
+
+    existing = registry.get(name) or {}
+    try:
+        target = connection_settings(data, method, password=existing.get("password", ""))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    target["remote_path"] = data.get("remote_path", "")
+    registry.save(name, target)
+    # Stop reusing connections made with the old settings; transfers still on them finish first
+    transfer_pool.retire(target_settings(existing or target, session['user']))
+    target_health.probe_async(target_settings(target, session['user']))
+    return jsonify({"message": f"Target '{name}' saved.", "target": public_target(name, target, session['user'])}), 200
+
+@deploy_bp.route('/targets/delete', methods=['POST'])
+def delete_deploy_target():
+    """
+    Removes a named deploy target and retires its pooled connections (closed once idle).
+    POST /deploy/targets/delete: {"project_name": "...", "name": "..."}
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+
+    data = request.get_json() or {}
+    registry = get_target_registry(session['user'], data.get("project_name", ""))
+    if registry is None:
+        return jsonify({"error": "Project not found."}), 404
+
+    removed = registry.delete(data.get("name", ""))
+    if removed is None:
+        return jsonify({"error": f"Deploy target not found: {data.get('name')}"}), 404
+    transfer_pool.retire(target_settings(removed, session['user']))
+    return jsonify({"message": f"Target '{data.get('name')}' deleted."}), 200
+
+@deploy_bp.route('/targets/probe', methods=['POST'])
+def probe_deploy_targets():
+    """
+    Queues an immediate probe of targets instead of waiting for the periodic health check.
+    POST /deploy/targets/probe: {"project_name": "...", "names": [...] (optional, default all)}
+    Returns 202; results appear in GET /deploy/targets once the probes finish.
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+
+    data = request.get_json() or {}
+    registry = get_target_registry(session['user'], data.get("project_name", ""))
+    if registry is None:
+        return jsonify({"error": "Project not found."}), 404
+
+    targets = registry.all()
+    names = [name for name in (data.get("names") or targets.keys()) if name in targets]
+    for name in names:
+        target_health.probe_async(target_settings(targets[name], session['user']))
+    return jsonify({"targets": [public_target(name, targets[name], session['user']) for name in names]}), 202
+
+@deploy_bp.route('/fanout', methods=['POST'])
+def fanout_deploy():
+    """
+    Deploys one file or directory to many registered targets at once.
+    POST /deploy/fanout:
+    {
+        "project_name": "...",
+        "file": "path of a file or directory from the deploy tree",
+        "targets": ["jetson-01", "jetson-02", ...],
+        "remote_path": "... (optional, defaults to each target's remote_path)",
+        "max_concurrency": 4,
+        "delta": false
+    }
+    One deploy job is created per target; at most max_concurrency of them
+    transfer at the same time.
+    """
+    if 'user' not in session:
+        return abort(401, description="Unauthorized")
+
+    user = session['user']
+    data = request.get_json() or {}
+    names = data.get("targets") or []
+    if not data.get("file") or not names:
+        return jsonify({"error": "Missing 'file' or 'targets' in request."}), 400
+    try:
+        max_concurrency = bounded_int(data, "max_concurrency", FANOUT_MAX_CONCURRENCY, *FANOUT_CONCURRENCY_RANGE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    registry = get_target_registry(user, data.get("project_name", ""))
+    if registry is None:
+        return jsonify({"error": "Project not found."}), 404
+    missing = [name for name in names if registry.get(name) is None]
+    if missing:
+        return jsonify({"error": f"Deploy target(s) not found: {', '.join(missing)}"}), 404
+
+    local_path = resolve_user_path(user, data["file"])
+    if not local_path or not os.path.exists(local_path):
+        return jsonify({"error": f"File not found: {data['file']}"}), 404
 
-        with open(file_path, 'rb') as f:
-            ftp.storbinary(f"STOR {ftp_filename}", f)
+    manifests = project_manifests(user, local_path) if data.get("delta") else None
+    group_id = uuid.uuid4().hex[:12]
+    jobs = []
+    for name in names:
+        target = registry.get(name)
+        settings = target_settings(target, user)
+        remote_path = (data.get("remote_path") or target.get("remote_path")
+                       or default_remote_path(settings["method"], local_path))
+        files = collect_transfer_files(local_path, remote_path)
+        if not files:
+            return jsonify({"error": "Nothing to transfer: directory is empty."}), 400
+        jobs.append(deploy_jobs.submit(user, settings, files, manifests=manifests,
+                                       target_name=name, group_id=group_id, enqueue=False))
 
-    return jsonify({"message": f"FTP to {host}:{remote_path or ftp_filename} succeeded."})
+    deploy_jobs.run_group([job["job_id"] for job in jobs], max_concurrency)
+    return jsonify({
+        "message": f"Fan-out deploy queued to {len(jobs)} target(s).",
+        "group_id": group_id,
+        "job_ids": [job["job_id"] for job in jobs]
+    }), 202
@@ -9,10 +9,25 @@ import torchvision.transforms as T
 from torchvision.datasets import CIFAR100
 from tqdm import tqdm
 import urllib.request
+import numpy as np
+
+IMAGE_SIZE = 224
+
+# Augmentation and normalization settings from the config.yaml next to this file
+def load_dataset_config():
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+# uint8 HWC array -> uint8 CHW tensor, leaving conversion and augmentation to the engine
+def to_uint8_tensor(image):
+    return torch.from_numpy(np.ascontiguousarray(image)).permute(2, 0, 1)
 
 class Dataset(TorchDataset):
     def __init__(self, root: str = "/Data1/CIFAR100/", train: bool = True, download: bool = True, 
-                 transform=None, target_transform=None):
+                 transform=None, target_transform=None, device_augmentation: bool = False):
         """
         A simple wrapper around the torchvision CIFAR100 dataset.
 
@@ -24,14 +39,33 @@ class Dataset(TorchDataset):
                                             and returns a transformed version.
             target_transform (callable, optional): A function/transform that takes in the target
                                                    and transforms it.
+            device_augmentation (bool): If True, samples are returned as uint8 tensors and the
+                                        engine applies the config.yaml augmentation and
+                                        normalization to whole batches on the device.
         """
-        # Default transforms if none provided
+        # Default transforms if none provided. They are split into a deterministic part
+        # (decode + resize, cacheable as uint8 by the engine) and a per-sample part.
+        self.cacheable = transform is None
         if transform is None:
-            transform = T.Compose([
-                T.Resize((224, 224)),
-                T.ToTensor(),
-                T.Normalize((0.5071, 0.4865, 0.4409), (0.2673, 0.2564, 0.2762))
-            ])
+            config = load_dataset_config()
+            augmentation = (config.get('augmentation') or {}) if train else {}
+            normalize = config.get('normalize') or {}
+
+            self.base_transform = T.Resize((IMAGE_SIZE, IMAGE_SIZE))
+            if device_augmentation:
+                self.sample_transform = to_uint8_tensor
+            else:
+                sample_transforms = [T.ToTensor()]
+                if augmentation.get('random_crop'):
+                    sample_transforms.append(T.RandomCrop(IMAGE_SIZE, padding=augmentation.get('crop_padding', 28)))
+                if augmentation.get('horizontal_flip'):
+                    sample_transforms.append(T.RandomHorizontalFlip())
+                sample_transforms.append(T.Normalize(normalize.get('mean', (0.5071, 0.4865, 0.4409)),
+                                                     normalize.get('std', (0.2673, 0.2564, 0.2762))))
+                self.sample_transform = T.Compose(sample_transforms)
+        else:
+            self.base_transform = None
+            self.sample_transform = transform
 
         # Override default download progress with custom one
         def custom_progress_hook(t):
@@ -57,14 +91,27 @@ class Dataset(TorchDataset):
             self.dataset = CIFAR100(root=root,
                                   train=train, 
                                   download=download,
-                                  transform=transform, 
+                                  transform=self.base_transform,
                                   target_transform=target_transform)
         finally:
             # Restore original urlretrieve
             urllib.request.urlretrieve = original_urlretrieve
 
+    def load_raw(self, index: int):
+        """Returns the deterministic part of a sample: the resized image as a uint8 HWC array and its target."""
+        image, target = self.dataset[index]
+        return np.asarray(image, dtype=np.uint8), target
+
+    def apply_sample_transform(self, image):
+        """Applies the per-sample transforms to an image returned by load_raw."""
+        return self.sample_transform(image)
+
     def __getitem__(self, index: int):
-        return self.dataset[index]
+        if not self.cacheable:
+            image, target = self.dataset[index]
+            return self.sample_transform(image), target
+        image, target = self.load_raw(index)
+        return self.apply_sample_transform(image), target
 
     def __len__(self):
         return len(self.dataset)
\ No newline at end of file
@@ -0,0 +1,1376 @@
+"""
+Module: engine_utils.py
+Description:
+Machinery of the generated engine.py. POST /runs/create copies this module next to engine.py in
+every run directory, so engine.py itself stays a short training script to read and edit: the
+Engine LightningModule and main(). Everything here is configured from the run's config.yaml.
+
+Features:
+- Run facts in run_meta.json (smoke_meta.json for smoke tests).
+- Precision, devices and DDP strategy selection.
+- Dataset splits, the shared uint8 dataset cache, sharded streaming datasets and
+  on-device augmentation.
+- DataLoader settings with auto-tuned workers, and micro-batch probing / gradient accumulation.
+- torch.compile with a shared compile cache, activation checkpointing, optimizer offload.
+- Asynchronous checkpoint writes, checkpoint and early-stopping callbacks, the max_time budget.
+- Per-step phase timing, throughput reports, on-demand profiler captures and smoke tests.
+
+The project's Model and Dataset classes are imported by engine.py; helpers that need them take
+the class as an argument.
+
+Dependencies:
+- torch, pytorch_lightning: Training.
+- numpy: For the dataset cache files.
+- yaml: For the dataset's config.yaml.
+"""
+
+import os
+import sys
+import yaml
+import time
+import logging
+import json
+import math
+import hashlib
+import importlib
+import inspect
+import pickle
+import random
+import itertools
+import datetime
+import numpy as np
+import torch
+import torch.utils.checkpoint
+from concurrent.futures import ThreadPoolExecutor
+from torch.utils.data import DataLoader, Dataset as TorchDataset, IterableDataset, Subset, get_worker_info, random_split
+from pytorch_lightning.callbacks import EarlyStopping, ModelCheckpoint, Timer
+from pytorch_lightning.plugins import MixedPrecision
+from pytorch_lightning.plugins.io import TorchCheckpointIO
+from pytorch_lightning.strategies import DDPStrategy
+from pytorch_lightning.utilities import rank_zero_only
+
+# Set by POST /runs/start with "mode": "smoke"; see apply_smoke_overrides
+SMOKE_TEST = os.environ.get('EVF_SMOKE') == '1'
+
+# A smoke test records its facts apart from those of the real run
+RUN_META_FILE = 'smoke_meta.json' if SMOKE_TEST else 'run_meta.json'
+
+# Record run facts (precision, ...) in run_meta.json next to engine.py
+@rank_zero_only
+def update_run_meta(**fields):
+    meta = {}
+    if os.path.exists(RUN_META_FILE):
+        with open(RUN_META_FILE, 'r') as f:
+            meta = json.load(f)
+    meta.update(fields)
+    with open(RUN_META_FILE + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=4)
+    os.replace(RUN_META_FILE + '.tmp', RUN_META_FILE)
+
+# training.precision values and the Lightning precision they select
+PRECISION_ALIASES = {
+    "fp32": "32-true", "32": "32-true", "32-true": "32-true",
+    "fp16-mixed": "16-mixed", "fp16": "16-mixed", "16-mixed": "16-mixed",
+    "bf16-mixed": "bf16-mixed", "bf16": "bf16-mixed",
+}
+
+# Pick the Lightning precision for training.precision on the available hardware
+def resolve_precision(config, use_gpu):
+    requested = str(config['training'].get('precision', 'fp32')).lower()
+    if requested not in PRECISION_ALIASES:
+        raise ValueError(f"Unsupported training.precision '{requested}'. "
+                         f"Use one of: fp32, fp16-mixed, bf16-mixed")
+    precision = PRECISION_ALIASES[requested]
+
+    if not use_gpu and precision == "16-mixed":
+        # CPU autocast only supports bfloat16
+        logging.warning("fp16-mixed needs a GPU; using bf16-mixed on CPU instead")
+        precision = "bf16-mixed"
+    elif use_gpu and precision == "bf16-mixed" and not torch.cuda.is_bf16_supported():
+        logging.warning("This GPU does not support bfloat16; using fp16-mixed instead")
+        precision = "16-mixed"
+    return precision
+
+# fp16 needs a gradient scaler; training.grad_scaler tunes it (init_scale, growth_interval, ...)
+def build_precision_plugins(config, precision, use_gpu):
+    scaler_params = config['training'].get('grad_scaler') or {}
+    if precision != "16-mixed" or not scaler_params:
+        return []
+    scaler = torch.amp.GradScaler("cuda", **scaler_params)
+    return [MixedPrecision(precision="16-mixed", device="cuda" if use_gpu else "cpu", scaler=scaler)]
+
+# Instantiate one split of the project dataset through its `train` flag
+def load_dataset_split(dataset_class, train, **dataset_kwargs):
+    try:
+        return dataset_class(train=train, **dataset_kwargs)
+    except TypeError:
+        # Datasets without a train flag only provide a single split
+        return None
+
+# Bump when the on-disk layout of the dataset cache changes
+DATASET_CACHE_VERSION = 1
+
+def dataset_cache_root(config):
+    cache_dir = (config.get('dataset_cache') or {}).get('dir')
+    cache_dir = cache_dir or os.environ.get('EVF_DATASET_CACHE_DIR') or '~/.cache/evf/datasets'
+    return os.path.abspath(os.path.expanduser(cache_dir))
+
+# Runs with the same dataset code (datasets.py + config.yaml) and split share one cache entry
+def dataset_cache_key(dataset, split):
+    digest = hashlib.sha256(
+        f"v{DATASET_CACHE_VERSION}|{type(dataset).__qualname__}|{split}|{len(dataset)}".encode())
+    source_dir = os.path.dirname(os.path.abspath(inspect.getfile(type(dataset))))
+    for name in ('datasets.py', 'config.yaml'):
+        path = os.path.join(source_dir, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+class RawSamples(TorchDataset):
+    """Exposes a dataset's load_raw so the cache can be filled by DataLoader workers."""
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, index):
+        return self.dataset.load_raw(index)
+
+    def __len__(self):
+        return len(self.dataset)
+
+def collate_raw(batch):
+    return batch
+
+class CachedDataset(TorchDataset):
+    """Serves the deterministic part of a dataset from the memory-mapped uint8 cache; only the
+    per-sample (random) transforms of the wrapped dataset run on access."""
+    def __init__(self, dataset, cache_dir):
+        self.dataset = dataset
+        self.cache_dir = cache_dir
+        self.targets = np.load(os.path.join(cache_dir, 'targets.npy'))
+        self.images = None
+
+    def __getitem__(self, index):
+        if self.images is None:
+            # Mapped lazily so every DataLoader worker opens its own read-only view
+            self.images = np.load(os.path.join(self.cache_dir, 'images.npy'), mmap_mode='r')
+        image = np.array(self.images[index])
+        return self.dataset.apply_sample_transform(image), self.targets[index].item()
+
+    def __len__(self):
+        return len(self.targets)
+
+# Materialize load_raw for every sample into images.npy/targets.npy, then publish atomically
+def build_dataset_cache(dataset, cache_dir, num_workers):
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    first_image, _ = dataset.load_raw(0)
+    images = np.lib.format.open_memmap(os.path.join(tmp_dir, 'images.npy'), mode='w+',
+                                       dtype=np.uint8, shape=(len(dataset),) + first_image.shape)
+    targets = []
+    loader = DataLoader(RawSamples(dataset), batch_size=256, num_workers=num_workers, collate_fn=collate_raw)
+    index = 0
+    for batch in loader:
+        for image, target in batch:
+            images[index] = image
+            targets.append(target)
+            index += 1
+    images.flush()
+    del images
+    np.save(os.path.join(tmp_dir, 'targets.npy'), np.asarray(targets))
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump({"samples": index, "image_shape": list(first_image.shape),
+                   "dataset": type(dataset).__qualname__, "created": time.time()}, f, indent=4)
+    os.rename(tmp_dir, cache_dir)
+
+# Exclusive lock on an open file until it is closed: flock on POSIX, msvcrt on Windows
+def lock_exclusive(lock_file):
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        lock_file.seek(0)
+        while True:
+            try:
+                # LK_LOCK gives up after 10 one-second attempts; a cache build can take much longer
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+# Wrap a dataset split with the shared cache when dataset_cache.enabled is set
+def open_dataset_cache(dataset, config, split):
+    cache_config = config.get('dataset_cache') or {}
+    if not cache_config.get('enabled') or dataset is None:
+        return dataset
+    if not getattr(dataset, 'cacheable', False) or not hasattr(dataset, 'load_raw'):
+        logging.warning("Dataset does not expose a cacheable load_raw/apply_sample_transform split; "
+                        "dataset_cache is ignored")
+        return dataset
+
+    root = dataset_cache_root(config)
+    os.makedirs(root, exist_ok=True)
+    cache_dir = os.path.join(root, dataset_cache_key(dataset, split))
+    with open(f"{cache_dir}.lock", 'w') as lock_file:
+        # A concurrent run building the same entry holds the lock until it is published
+        lock_exclusive(lock_file)
+        if not os.path.isdir(cache_dir):
+            start = time.time()
+            logging.info(f"Building {split} dataset cache in {cache_dir}")
+            build_dataset_cache(dataset, cache_dir, int(cache_config.get('build_workers', 8)))
+            logging.info(f"Dataset cache built in {time.time() - start:.1f}s")
+        else:
+            logging.info(f"Using {split} dataset cache {cache_dir}")
+    update_run_meta(**{f"dataset_cache_{split}": cache_dir})
+    return CachedDataset(dataset, cache_dir)
+
+# Must match SHARD_FORMAT_VERSION of tools/pack_dataset.py
+SHARD_FORMAT_VERSION = 1
+
+class ShardedDataset(IterableDataset):
+    """Streams the (sample, target) records written by tools/pack_dataset.py. Shards are shuffled
+    per epoch and split across DDP ranks and DataLoader workers, each shard is read front to back
+    with large buffered reads, and records are shuffled through a bounded buffer. Every rank
+    yields the same number of samples so DDP steps stay in lockstep."""
+    def __init__(self, split_dir, shuffle, shuffle_buffer=4096, read_size=8 * 1024 * 1024, seed=42):
+        with open(os.path.join(split_dir, 'index.json'), 'r') as f:
+            index = json.load(f)
+        if index.get('version') != SHARD_FORMAT_VERSION:
+            raise ValueError(f"Unsupported shard format version {index.get('version')} in {split_dir}")
+        self.split_dir = split_dir
+        self.shards = index['shards']
+        self.encoding = index['encoding']
+        self.samples = index['samples']
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.read_size = read_size
+        self.seed = seed
+        self.rank = 0
+        self.world_size = 1
+        self.epoch = 0
+        # Counts passes made by this copy, so persistent workers still reshuffle every epoch
+        self.passes = 0
+
+    def set_distributed(self, rank, world_size):
+        self.rank, self.world_size = rank, world_size
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.samples // self.world_size
+
+    def __iter__(self):
+        worker = get_worker_info()
+        num_workers, worker_id = (worker.num_workers, worker.id) if worker else (1, 0)
+        seed = self.seed + self.epoch + self.passes
+        self.passes += 1
+
+        # Same shard order on every rank and worker, so the partition below is consistent
+        order = list(range(len(self.shards)))
+        if self.shuffle:
+            random.Random(seed).shuffle(order)
+        total_workers = self.world_size * num_workers
+        global_id = self.rank * num_workers + worker_id
+        if len(order) >= total_workers:
+            shard_ids, step, offset = order[global_id::total_workers], 1, 0
+        else:
+            # Fewer shards than readers: everyone reads all shards and keeps every n-th record
+            shard_ids, step, offset = order, total_workers, global_id
+
+        quota = len(self) // num_workers + (1 if worker_id < len(self) % num_workers else 0)
+        records = self.stream(shard_ids, step, offset, random.Random(seed * 1000003 + global_id))
+        for record in itertools.islice(records, quota):
+            yield self.decode(record)
+
+    def stream(self, shard_ids, step, offset, rng):
+        # Wraps around when this reader's shards hold fewer records than its quota
+        while True:
+            produced = False
+            records = self.read_shards(shard_ids, step, offset)
+            if self.shuffle:
+                records = self.shuffled(records, rng)
+            for record in records:
+                produced = True
+                yield record
+            if not produced:
+                return
+            shard_ids = list(shard_ids)
+            if self.shuffle:
+                rng.shuffle(shard_ids)
+
+    def read_shards(self, shard_ids, step, offset):
+        # Records are numbered across all shards read, so every n-th record goes to one reader
+        position = 0
+        for shard_id in shard_ids:
+            shard = self.shards[shard_id]
+            offsets = np.load(os.path.join(self.split_dir, shard['index']))
+            with open(os.path.join(self.split_dir, shard['file']), 'rb', buffering=self.read_size) as f:
+                for i in range(len(offsets) - 1):
+                    length = int(offsets[i + 1] - offsets[i])
+                    if position % step == offset:
+                        yield f.read(length)
+                    else:
+                        f.seek(length, os.SEEK_CUR)
+                    position += 1
+
+    def shuffled(self, records, rng):
+        buffer = []
+        for record in records:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(record)
+                continue
+            index = rng.randrange(len(buffer))
+            yield buffer[index]
+            buffer[index] = record
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def decode(self, record):
+        sample, target = pickle.loads(record)
+        if isinstance(sample, np.ndarray):
+            # Arrays unpickled from the read buffer are read-only
+            sample = torch.from_numpy(np.require(sample, requirements='W'))
+            if self.encoding == "raw" and sample.dim() == 3:
+                # uint8 HWC image -> CHW; the engine converts and augments it on the device
+                sample = sample.permute(2, 0, 1)
+        return sample, target
+
+# Train/eval splits from the dataset_shards directory written by tools/pack_dataset.py
+def build_sharded_splits(config, shard_config):
+    if not shard_config.get('dir'):
+        raise ValueError("dataset_shards.dir must point to the output of tools/pack_dataset.py")
+    if float((config.get('validation') or {}).get('holdout_fraction', 0.0) or 0.0) > 0:
+        logging.warning("validation.holdout_fraction is not supported with dataset_shards; "
+                        "validating on the packed eval split")
+    kwargs = {
+        "shuffle_buffer": int(shard_config.get('shuffle_buffer', 4096)),
+        "read_size": int(float(shard_config.get('read_size_mb', 8)) * 1024 * 1024),
+        "seed": config.get('misc', {}).get('seed', 42),
+    }
+    root = os.path.abspath(os.path.expanduser(shard_config['dir']))
+    train_dataset = ShardedDataset(os.path.join(root, 'train'), shuffle=True, **kwargs)
+    eval_dataset = None
+    if os.path.exists(os.path.join(root, 'eval', 'index.json')):
+        eval_dataset = ShardedDataset(os.path.join(root, 'eval'), shuffle=False, **kwargs)
+    logging.info(f"Streaming {train_dataset.samples} training samples from {len(train_dataset.shards)} shards")
+    return train_dataset, eval_dataset, eval_dataset
+
+# Build the train/val/test datasets described by the validation section of config.yaml.
+# With holdout_fraction > 0 the validation set is a seeded slice of the training split;
+# otherwise it is the dataset's evaluation split (train=False), which also serves as test set.
+def build_dataset_splits(config, dataset_class, dataset_kwargs):
+    shard_config = config.get('dataset_shards') or {}
+    if shard_config.get('enabled'):
+        return build_sharded_splits(config, shard_config)
+
+    val_config = config.get('validation') or {}
+    holdout_fraction = float(val_config.get('holdout_fraction', 0.0) or 0.0)
+
+    train_dataset = load_dataset_split(dataset_class, train=True, **dataset_kwargs)
+    if train_dataset is None:
+        train_dataset = open_dataset_cache(dataset_class(**dataset_kwargs), config, 'default')
+        eval_dataset = None
+        if holdout_fraction <= 0:
+            holdout_fraction = 0.1
+            logging.warning("Dataset has no train flag; holding out 10% of it for validation")
+    else:
+        train_dataset = open_dataset_cache(train_dataset, config, 'train')
+        eval_dataset = open_dataset_cache(load_dataset_split(dataset_class, train=False, **dataset_kwargs), config, 'eval')
+
+    if holdout_fraction > 0:
+        if not 0 < holdout_fraction < 1:
+            raise ValueError("validation.holdout_fraction must be between 0 and 1")
+        val_size = max(1, int(round(len(train_dataset) * holdout_fraction)))
+        generator = torch.Generator().manual_seed(config.get('misc', {}).get('seed', 42))
+        train_dataset, val_dataset = random_split(
+            train_dataset, [len(train_dataset) - val_size, val_size], generator=generator)
+    else:
+        val_dataset = eval_dataset
+
+    return train_dataset, val_dataset, eval_dataset
+
+# config.yaml saved next to the dataset's datasets.py (augmentation, normalize, ...)
+def load_dataset_config(dataset_class):
+    config_path = os.path.join(os.path.dirname(os.path.abspath(inspect.getfile(dataset_class))), 'config.yaml')
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+class DeviceAugmentation(torch.nn.Module):
+    """Batched random_crop, horizontal_flip and normalize from the dataset config.yaml, applied
+    on the device to uint8 NCHW batches after the host-to-device copy."""
+    def __init__(self, dataset_config):
+        super().__init__()
+        augmentation = dataset_config.get('augmentation') or {}
+        normalize = dataset_config.get('normalize') or {}
+        self.random_crop = bool(augmentation.get('random_crop'))
+        self.crop_padding = int(augmentation.get('crop_padding', 28))
+        self.horizontal_flip = bool(augmentation.get('horizontal_flip'))
+        mean = normalize.get('mean', (0.5071, 0.4865, 0.4409))
+        std = normalize.get('std', (0.2673, 0.2564, 0.2762))
+        self.register_buffer('mean', torch.tensor(mean).view(1, -1, 1, 1), persistent=False)
+        self.register_buffer('std', torch.tensor(std).view(1, -1, 1, 1), persistent=False)
+
+    def forward(self, images, train):
+        images = images.float().div_(255)
+        if train and self.random_crop and self.crop_padding > 0:
+            images = self.crop(images)
+        if train and self.horizontal_flip:
+            flip = torch.rand(images.shape[0], device=images.device) < 0.5
+            images = torch.where(flip.view(-1, 1, 1, 1), images.flip(3), images)
+        return (images - self.mean) / self.std
+
+    def crop(self, images):
+        # Zero-pad, then gather one random window per sample, like RandomCrop(padding=...)
+        n, _, height, width = images.shape
+        padded = torch.nn.functional.pad(images, [self.crop_padding] * 4)
+        top = torch.randint(0, 2 * self.crop_padding + 1, (n, 1), device=images.device)
+        left = torch.randint(0, 2 * self.crop_padding + 1, (n, 1), device=images.device)
+        rows = (top + torch.arange(height, device=images.device)).view(n, 1, height, 1)
+        cols = (left + torch.arange(width, device=images.device)).view(n, 1, 1, width)
+        batch = torch.arange(n, device=images.device).view(n, 1, 1, 1)
+        channels = torch.arange(images.shape[1], device=images.device).view(1, -1, 1, 1)
+        return padded[batch, channels, rows, cols]
+
+# dataloader.device_augmentation moves the dataset's augmentation onto the device, if the dataset supports it
+def build_device_augmentation(config, dataset_class):
+    if (config.get('dataset_shards') or {}).get('enabled'):
+        # Packed raw records are uint8 images; converting them is always left to the device
+        return DeviceAugmentation(load_dataset_config(dataset_class))
+    if not (config.get('dataloader') or {}).get('device_augmentation'):
+        return None
+    if 'device_augmentation' not in inspect.signature(dataset_class).parameters:
+        logging.warning("Dataset has no device_augmentation option; augmenting on the CPU workers instead")
+        return None
+    logging.info("Augmentation and normalization run batched on the device")
+    return DeviceAugmentation(load_dataset_config(dataset_class))
+
+# Load custom_collate_fn from the collate_fn.py saved next to the dataset's datasets.py
+def load_collate_fn(dataset_class):
+    package = dataset_class.__module__.rpartition('.')[0]
+    module_name = f"{package}.collate_fn" if package else "collate_fn"
+    try:
+        module = importlib.import_module(module_name)
+    except ModuleNotFoundError as e:
+        if e.name != module_name:
+            raise
+        return None
+    return getattr(module, 'custom_collate_fn', None)
+
+# dataloader section defaults; num_workers and prefetch_factor also accept "auto"
+DATALOADER_DEFAULTS = {
+    "num_workers": 4,
+    "pin_memory": "auto",
+    "persistent_workers": True,
+    "prefetch_factor": 2,
+    "auto_cpu_budget": 0.75,  # Fraction of the node's CPUs the loaders of all devices may use
+    "auto_seconds": 1.0,  # Measurement time per candidate setting
+}
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+# Samples per second a loader delivers, not counting worker start-up (persistent workers pay it once)
+def measure_loader_throughput(dataset, batch_size, collate_fn, pin_memory, num_workers, prefetch_factor, seconds):
+    kwargs = {"num_workers": num_workers, "pin_memory": pin_memory, "collate_fn": collate_fn}
+    if num_workers > 0:
+        kwargs["prefetch_factor"] = prefetch_factor
+    shuffle = not isinstance(dataset, IterableDataset)
+    iterator = iter(DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, **kwargs))
+    try:
+        next(iterator)
+    except StopIteration:
+        return 0.0
+    samples = 0
+    start = time.perf_counter()
+    for _ in iterator:
+        samples += batch_size
+        if time.perf_counter() - start >= seconds:
+            break
+    elapsed = time.perf_counter() - start
+    del iterator
+    return samples / elapsed if elapsed > 0 else 0.0
+
+# Try worker/prefetch candidates within this process's share of the CPU budget; return the fastest
+def tune_loader_settings(dataset, batch_size, collate_fn, pin_memory, settings, devices):
+    max_workers = max(1, int(available_cpus() * float(settings['auto_cpu_budget']) / max(1, devices)))
+    if settings['num_workers'] == "auto":
+        worker_counts = sorted({n for n in (0, 1, 2, 4, 8, 16, 32, 64) if n <= max_workers} | {max_workers})
+    else:
+        worker_counts = [int(settings['num_workers'])]
+    prefetch_factors = [2, 4] if settings['prefetch_factor'] == "auto" else [int(settings['prefetch_factor'])]
+
+    results = []
+    for num_workers in worker_counts:
+        for prefetch_factor in (prefetch_factors if num_workers > 0 else prefetch_factors[:1]):
+            throughput = measure_loader_throughput(dataset, batch_size, collate_fn, pin_memory,
+                                                   num_workers, prefetch_factor, float(settings['auto_seconds']))
+            logging.info(f"DataLoader candidate: num_workers={num_workers} prefetch_factor={prefetch_factor} "
+                         f"-> {throughput:.1f} samples/s")
+            results.append({"num_workers": num_workers, "prefetch_factor": prefetch_factor,
+                            "samples_per_sec": round(throughput, 1)})
+    best = max(results, key=lambda result: result["samples_per_sec"])
+    return best["num_workers"], best["prefetch_factor"], results
+
+# Resolve the dataloader section of config.yaml into DataLoader keyword arguments
+def resolve_loader_settings(config, dataset, batch_size, collate_fn, use_gpu, devices):
+    settings = dict(DATALOADER_DEFAULTS)
+    settings.update(config.get('dataloader') or {})
+    pin_memory = use_gpu if settings['pin_memory'] == "auto" else bool(settings['pin_memory'])
+
+    tuning = None
+    if "auto" in (settings['num_workers'], settings['prefetch_factor']):
+        num_workers, prefetch_factor, tuning = tune_loader_settings(
+            dataset, batch_size, collate_fn, pin_memory, settings, devices)
+    else:
+        num_workers, prefetch_factor = int(settings['num_workers']), int(settings['prefetch_factor'])
+
+    kwargs = {"num_workers": num_workers, "pin_memory": pin_memory, "collate_fn": collate_fn}
+    if num_workers > 0:
+        kwargs["prefetch_factor"] = prefetch_factor
+        kwargs["persistent_workers"] = bool(settings['persistent_workers'])
+
+    logging.info(f"DataLoader settings: num_workers={num_workers} prefetch_factor={kwargs.get('prefetch_factor')} "
+                 f"pin_memory={pin_memory} persistent_workers={kwargs.get('persistent_workers', False)}")
+    update_run_meta(dataloader={
+        "num_workers": num_workers,
+        "prefetch_factor": kwargs.get("prefetch_factor"),
+        "pin_memory": pin_memory,
+        "persistent_workers": kwargs.get("persistent_workers", False),
+        "custom_collate_fn": collate_fn is not None,
+        "tuning": tuning,
+    })
+    return kwargs
+
+# Repeat one collated sample along the batch dimension, directly on the device
+def repeat_batch(value, batch_size):
+    if isinstance(value, torch.Tensor):
+        return value.expand(batch_size, *value.shape[1:]).contiguous()
+    if isinstance(value, (list, tuple)):
+        return type(value)(repeat_batch(item, batch_size) for item in value)
+    return value
+
+# Largest micro-batch for which forward, backward and an optimizer step fit on the device.
+# Doubles until OOM, then bisects; the model and its buffers are restored afterwards.
+def probe_max_batch_size(engine, device, limit):
+    sample = engine.dataset[0] if not isinstance(engine.dataset, IterableDataset) else next(iter(engine.dataset))
+    collate = engine.collate_fn or torch.utils.data.default_collate
+    one = engine.trainer.strategy.batch_to_device(collate([sample]), device)
+
+    state = {key: value.detach().clone() for key, value in engine.model.state_dict().items()}
+    engine.to(device)
+    optimizer = engine.configure_optimizers()
+    if isinstance(optimizer, (list, tuple)):
+        optimizer = optimizer[0][0]
+
+    def fits(batch_size):
+        outputs = loss = batch = None
+        try:
+            batch = engine.on_after_batch_transfer(repeat_batch(one, batch_size), 0)
+            inputs, targets = batch
+            with engine.trainer.precision_plugin.train_step_context():
+                outputs = engine(*inputs) if isinstance(inputs, (list, tuple)) else engine(inputs)
+                loss = engine.criterion(outputs, targets)
+            loss.backward()
+            optimizer.step()
+            torch.cuda.synchronize(device)
+            return True
+        except torch.cuda.OutOfMemoryError:
+            return False
+        finally:
+            outputs = loss = batch = None
+            optimizer.zero_grad(set_to_none=True)
+            torch.cuda.empty_cache()
+
+    low, high = 0, None
+    batch_size = 1
+    while batch_size <= limit:
+        if not fits(batch_size):
+            high = batch_size
+            break
+        low = batch_size
+        batch_size *= 2
+    if high is None:
+        high = min(batch_size, limit + 1)
+    while high - low > max(1, low // 32):
+        middle = (low + high) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle
+
+    optimizer.state.clear()
+    engine.model.load_state_dict(state)
+    torch.cuda.empty_cache()
+    return low
+
+# Resolve training.batch_size ("auto" probes the device) into the engine's micro-batch, and
+# training.effective_batch_size into gradient accumulation steps. Called from Engine.setup().
+def configure_batch_size(engine):
+    training = engine.config['training']
+    finder = training.get('batch_size_finder') or {}
+    trainer = engine.trainer
+    device = trainer.strategy.root_device
+    meta = {}
+
+    if training['batch_size'] == "auto":
+        if device.type != "cuda":
+            logging.warning("training.batch_size: auto needs a GPU; using a micro-batch of 32")
+            batch_size = 32
+        else:
+            max_batch_size = probe_max_batch_size(engine, device, int(finder.get('max_batch_size', 4096)))
+            if torch.distributed.is_available() and torch.distributed.is_initialized():
+                # Every rank must run the same micro-batch; the smallest device decides
+                limit = torch.tensor(max_batch_size, device=device)
+                torch.distributed.all_reduce(limit, op=torch.distributed.ReduceOp.MIN)
+                max_batch_size = int(limit.item())
+            if max_batch_size < 1:
+                raise RuntimeError("Not even a batch of one sample fits on the device")
+            margin = float(finder.get('safety_margin', 0.9))
+            batch_size = max(1, int(max_batch_size * margin))
+            logging.info(f"Largest batch that fits: {max_batch_size}; "
+                         f"using {batch_size} with a {margin:.0%} safety margin")
+            meta.update(max_batch_size=max_batch_size, batch_size_safety_margin=margin)
+    else:
+        batch_size = int(training['batch_size'])
+
+    # The effective (global) batch is reached by accumulating micro-batches of every device
+    accumulation = 1
+    world_size = trainer.world_size
+    if training.get('effective_batch_size'):
+        effective = int(training['effective_batch_size'])
+        accumulation = max(1, math.ceil(effective / (batch_size * world_size)))
+        # Prefer a slightly smaller micro-batch that reaches the effective batch exactly
+        for steps in range(accumulation, 2 * accumulation + 1):
+            if effective % (world_size * steps) == 0:
+                accumulation, batch_size = steps, effective // (world_size * steps)
+                break
+        else:
+            logging.warning(f"effective_batch_size {effective} is not reachable exactly; "
+                            f"using {batch_size * world_size * accumulation}")
+    engine.batch_size = batch_size
+    trainer.accumulate_grad_batches = accumulation
+
+    logging.info(f"Micro-batch {batch_size} x {world_size} device(s) x {accumulation} accumulation step(s)")
+    update_run_meta(micro_batch_size=batch_size, accumulate_grad_batches=accumulation,
+                    effective_batch_size=batch_size * world_size * accumulation, **meta)
+
+# Accelerator and device count for training.num_gpus. CPU-only nodes can run several DDP
+# processes (training.cpu_processes), each with its share of the cores.
+def resolve_devices(config):
+    use_gpu = config['training']['num_gpus'] > 0 and torch.cuda.is_available()
+    if use_gpu:
+        return use_gpu, "gpu", config['training']['num_gpus']
+    devices = max(1, int(config['training'].get('cpu_processes', 1)))
+    if devices > 1:
+        torch.set_num_threads(max(1, available_cpus() // devices))
+    return use_gpu, "cpu", devices
+
+# NCCL all-reduces gradients GPU to GPU; gloo is the CPU backend. A single device needs no DDP.
+def build_strategy(config, use_gpu, devices):
+    if devices == 1:
+        return "auto", None
+    backend = str(config['training'].get('distributed_backend', 'auto')).lower()
+    if backend == "auto":
+        backend = "nccl" if use_gpu else "gloo"
+    if backend == "nccl" and not torch.distributed.is_nccl_available():
+        logging.warning("NCCL is not available in this PyTorch build; using gloo")
+        backend = "gloo"
+    return DDPStrategy(process_group_backend=backend), backend
+
+# training.memory_format values; channels_last (NHWC) lets cuDNN pick tensor-core kernels for convolutions
+MEMORY_FORMATS = {"contiguous": None, "channels_last": torch.channels_last}
+
+def resolve_memory_format(config):
+    requested = str(config['training'].get('memory_format', 'contiguous')).lower()
+    if requested not in MEMORY_FORMATS:
+        raise ValueError(f"Unsupported training.memory_format '{requested}'. Use one of: contiguous, channels_last")
+    return MEMORY_FORMATS[requested]
+
+# training.compile: false, true (the default mode) or one of these torch.compile modes
+COMPILE_MODES = ("default", "reduce-overhead", "max-autotune", "max-autotune-no-cudagraphs")
+
+def resolve_compile_mode(config):
+    requested = config['training'].get('compile', False)
+    if requested is None or requested is False or str(requested).lower() in ("false", "off", "none"):
+        return None
+    if requested is True or str(requested).lower() in ("true", "on"):
+        return "default"
+    if str(requested).lower() not in COMPILE_MODES:
+        raise ValueError(f"Unsupported training.compile '{requested}'. "
+                         f"Use false, true or one of: {', '.join(COMPILE_MODES)}")
+    return str(requested).lower()
+
+def compile_cache_root(config):
+    cache_dir = config['training'].get('compile_cache_dir')
+    cache_dir = cache_dir or os.environ.get('EVF_COMPILE_CACHE_DIR') or '~/.cache/evf/compile'
+    return os.path.abspath(os.path.expanduser(cache_dir))
+
+# Runs of the same model code on the same torch build share one compile cache entry
+def compile_cache_key(compile_mode, model_class):
+    digest = hashlib.sha256(f"{torch.__version__}|{compile_mode}".encode())
+    source_dir = os.path.dirname(os.path.abspath(inspect.getfile(model_class)))
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(name.encode())
+                    digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+# Point Inductor's FX graph cache and Triton's kernel cache at the shared entry of this model,
+# so later runs (and DDP ranks, which inherit the environment) skip most of the compilation
+def configure_compile_cache(config, compile_mode, model_class):
+    cache_dir = os.path.join(compile_cache_root(config), compile_cache_key(compile_mode, model_class))
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = cache_dir
+    os.environ["TRITON_CACHE_DIR"] = os.path.join(cache_dir, "triton")
+    os.environ["TORCHINDUCTOR_FX_GRAPH_CACHE"] = "1"
+    return cache_dir
+
+class CompileTimer:
+    """Times the first batch of each pass (training, evaluation) of a compiled model. That batch
+    triggers the compilation, so its time is reported apart from training."""
+    def __init__(self, compile_mode):
+        self.compile_mode = compile_mode
+        self.times = {}
+        self.started = None
+
+    def start(self, compile_pass):
+        if compile_pass not in self.times:
+            self.started = time.time()
+
+    def stop(self, compile_pass, device, log=True):
+        if self.started is None:
+            return
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        self.times[compile_pass] = time.time() - self.started
+        self.started = None
+        if log:
+            logging.info(f"torch.compile ({self.compile_mode}) of the {compile_pass} pass: "
+                         f"{self.times[compile_pass]:.1f}s (first batch included)")
+        update_run_meta(compile_seconds=round(sum(self.times.values()), 2),
+                        compile_seconds_by_pass={name: round(seconds, 2) for name, seconds in self.times.items()})
+
+# Recompute the activations of every submodule whose class name is listed (memory_saving.activation_checkpointing)
+# in backward instead of keeping them. The forward is patched per instance, so checkpoint keys do not change.
+def apply_activation_checkpointing(model, module_types):
+    names = set(module_types or [])
+    wrapped = []
+    for name, module in model.named_modules():
+        if type(module).__name__ not in names:
+            continue
+        if any(name.startswith(prefix + '.') for prefix in wrapped):
+            continue  # Already recomputed as part of an enclosing checkpointed module
+        module.forward = checkpointed_forward(module.forward)
+        wrapped.append(name)
+    return wrapped
+
+def checkpointed_forward(forward):
+    def run(*args, **kwargs):
+        if torch.is_grad_enabled():
+            return torch.utils.checkpoint.checkpoint(forward, *args, use_reentrant=False, **kwargs)
+        return forward(*args, **kwargs)
+    return run
+
+# memory_saving.optimizer_impl: fused (one kernel for all parameters), foreach (batched tensor ops),
+# for-loop (one parameter at a time) or auto (the torch default for the device)
+OPTIMIZER_IMPLS = ("auto", "fused", "foreach", "for-loop")
+
+def create_optimizer(optimizer_class, parameters, params, impl):
+    if impl not in OPTIMIZER_IMPLS:
+        raise ValueError(f"Unsupported memory_saving.optimizer_impl '{impl}'. Use one of: {', '.join(OPTIMIZER_IMPLS)}")
+    parameters = list(parameters)
+    accepted = inspect.signature(optimizer_class).parameters
+    if impl == "fused":
+        if "fused" in accepted:
+            try:
+                return optimizer_class(parameters, fused=True, **params)
+            except (RuntimeError, ValueError) as e:
+                logging.warning(f"Fused {optimizer_class.__name__} is not available here ({e}); using foreach")
+        else:
+            logging.warning(f"{optimizer_class.__name__} has no fused implementation; using foreach")
+        impl = "foreach"
+    if impl in ("foreach", "for-loop") and "foreach" in accepted:
+        params = dict(params, foreach=impl == "foreach")
+    return optimizer_class(parameters, **params)
+
+class OffloadedOptimizer(torch.optim.Optimizer):
+    """Keeps the optimizer state and an fp32 master copy of the trainable parameters in pinned host
+    memory. After backward the gradients are copied to the host, the wrapped optimizer steps on the
+    CPU and the updated weights are copied back: device memory for the state is traded for PCIe
+    traffic and CPU time in every optimizer step."""
+    def __init__(self, parameters, build_optimizer):
+        self.device_params = [p for p in parameters if p.requires_grad]
+        pin = any(p.is_cuda for p in self.device_params)
+        self.host_params = []
+        for param in self.device_params:
+            host_param = torch.empty(param.shape, dtype=torch.float32, pin_memory=pin)
+            host_param.copy_(param.detach())
+            self.host_params.append(host_param.requires_grad_())
+        self.optimizer = build_optimizer(self.host_params)
+        super().__init__(self.host_params, self.optimizer.defaults)
+        # Share the wrapped optimizer's groups and state, so LR schedulers and checkpoints see them
+        self.param_groups = self.optimizer.param_groups
+        self.state = self.optimizer.state
+        self.state_on_host = True
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+        if not self.state_on_host:
+            # Restoring a checkpoint moves optimizer state to the training device; bring it back
+            for param, state in self.state.items():
+                self.state[param] = {key: value.cpu() if isinstance(value, torch.Tensor) else value
+                                     for key, value in state.items()}
+            self.state_on_host = True
+
+        for device_param, host_param in zip(self.device_params, self.host_params):
+            if device_param.grad is None:
+                host_param.grad = None
+                continue
+            if host_param.grad is None:
+                host_param.grad = torch.empty_like(host_param, pin_memory=host_param.is_pinned())
+            host_param.grad.copy_(device_param.grad, non_blocking=True)
+        if any(p.is_cuda for p in self.device_params[:1]):
+            torch.cuda.synchronize()
+        self.optimizer.step()
+        for device_param, host_param in zip(self.device_params, self.host_params):
+            device_param.copy_(host_param, non_blocking=True)
+        return loss
+
+    def zero_grad(self, set_to_none=True):
+        for param in self.device_params:
+            if param.grad is None:
+                continue
+            if set_to_none:
+                param.grad = None
+            else:
+                param.grad.zero_()
+
+    def state_dict(self):
+        return self.optimizer.state_dict()
+
+    def load_state_dict(self, state_dict):
+        self.optimizer.load_state_dict(state_dict)
+        self.param_groups = self.optimizer.param_groups
+        self.state = self.optimizer.state
+        self.state_on_host = False
+
+    def state_memory_mb(self):
+        """Optimizer state held in host memory instead of on the device."""
+        return sum(value.numel() * value.element_size() for state in self.state.values()
+                   for value in state.values() if isinstance(value, torch.Tensor)) / (1024.0 * 1024.0)
+
+# Record which memory-saving modes are in effect next to the throughput summary, so runs with
+# and without a mode can be compared
+def report_memory_saving(engine):
+    memory_saving = engine.memory_saving
+    optimizer = engine.trainer.optimizers[0] if engine.trainer.optimizers else None
+    report = {
+        "activation_checkpointing": len(engine.checkpointed_modules),
+        "activation_checkpointing_types": list(memory_saving.get('activation_checkpointing') or []),
+        "optimizer_offload": isinstance(optimizer, OffloadedOptimizer),
+        "optimizer_impl": ("fused" if optimizer is not None and optimizer.defaults.get('fused') else
+                           "foreach" if optimizer is not None and optimizer.defaults.get('foreach') else
+                           str(memory_saving.get('optimizer_impl', 'auto')).lower()),
+    }
+    if isinstance(optimizer, OffloadedOptimizer):
+        report["optimizer_state_offloaded_mb"] = round(optimizer.state_memory_mb(), 1)
+    if engine.global_rank == 0:
+        logging.info(f"Memory saving: {len(engine.checkpointed_modules)} checkpointed module(s) | "
+                     f"optimizer offload: {report['optimizer_offload']}"
+                     + (f" ({report['optimizer_state_offloaded_mb']:.0f} MB of state on the host)"
+                        if report['optimizer_offload'] else "")
+                     + f" | optimizer implementation: {report['optimizer_impl']}")
+    update_run_meta(memory_saving=report)
+
+# Copy every tensor of a checkpoint to host memory, so saving never reads weights training is updating
+def snapshot_to_cpu(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().to('cpu', copy=True)
+    if isinstance(value, dict):
+        return type(value)((key, snapshot_to_cpu(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+        return type(value)(snapshot_to_cpu(item) for item in value)
+    return value
+
+class AsyncCheckpointWriter(TorchCheckpointIO):
+    """Writes checkpoints from a CPU snapshot in a background thread. Every file is written under a
+    temporary name and renamed, so a killed run never leaves a truncated checkpoint behind."""
+    def __init__(self, asynchronous=True):
+        super().__init__()
+        # One writer thread: saves and deletions of the top-k bookkeeping happen in submission order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint") if asynchronous else None
+        self.error = None
+
+    def save_checkpoint(self, checkpoint, path, storage_options=None):
+        self.raise_error()
+        snapshot = snapshot_to_cpu(checkpoint)
+        if self.executor is None:
+            self.write(snapshot, path)
+        else:
+            self.executor.submit(self.run, self.write, snapshot, path)
+
+    def remove_checkpoint(self, path):
+        if self.executor is None:
+            super().remove_checkpoint(path)
+        else:
+            self.executor.submit(self.run, super().remove_checkpoint, path)
+
+    def write(self, checkpoint, path):
+        path = str(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        start = time.time()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            torch.save(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        logging.info(f"Checkpoint saved: {path} ({time.time() - start:.1f}s)")
+
+    def run(self, function, *args):
+        try:
+            function(*args)
+        except BaseException as e:
+            self.error = e
+
+    def raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def wait(self):
+        """Blocks until every queued save and deletion is on disk."""
+        if self.executor is not None:
+            self.executor.submit(lambda: None).result()
+        self.raise_error()
+
+    def teardown(self):
+        # Called when fit() ends; the final checkpoint after it still goes through this writer
+        self.wait()
+
+# Checkpoints into misc.checkpoint_dir: the top-k by the monitored metric plus last.ckpt.
+# Top-k is ranked right after each validation, when the metric is fresh. A step or time trigger
+# gets its own callback that only refreshes last.ckpt, so it never ranks on a stale metric.
+def build_checkpoint_callbacks(config, validates):
+    checkpointing = config.get('checkpointing') or {}
+    if not checkpointing.get('enabled', True):
+        return []
+    every_n_train_steps = checkpointing.get('every_n_train_steps')
+    every_n_minutes = checkpointing.get('every_n_minutes')
+    if every_n_train_steps and every_n_minutes:
+        raise ValueError("Set only one of checkpointing.every_n_train_steps and checkpointing.every_n_minutes")
+    periodic = bool(every_n_train_steps or every_n_minutes)
+
+    callbacks = []
+    if periodic:
+        callbacks.append(ModelCheckpoint(
+            dirpath=config['misc']['checkpoint_dir'],
+            filename="{epoch}-{step}",
+            save_top_k=0,
+            save_last=True,
+            every_n_train_steps=int(every_n_train_steps) if every_n_train_steps else None,
+            train_time_interval=datetime.timedelta(minutes=float(every_n_minutes)) if every_n_minutes else None,
+        ))
+
+    # Without validation there is no metric to rank by; only last.ckpt is kept
+    monitor = checkpointing.get('monitor', 'validation_loss') if validates else None
+    if monitor or not periodic:
+        callbacks.append(ModelCheckpoint(
+            dirpath=config['misc']['checkpoint_dir'],
+            filename="{epoch}-{step}" + (f"-{{{monitor}:.4f}}" if monitor else ""),
+            monitor=monitor,
+            mode=checkpointing.get('mode', 'min'),
+            save_top_k=int(checkpointing.get('save_top_k', 3)) if monitor else 0,
+            save_last=checkpointing.get('save_last', True) and not periodic,
+            save_on_train_epoch_end=False if monitor else None,
+        ))
+    return callbacks
+
+# Stop when the monitored metric stops improving; it is checked whenever Lightning logs it
+# (after each validation for validation_loss, at the end of each epoch for epoch_avg_loss)
+def build_early_stopping(config, validates):
+    early_stopping = config.get('early_stopping') or {}
+    if not early_stopping.get('enabled'):
+        return None
+    monitor = early_stopping.get('monitor', 'validation_loss')
+    if monitor.startswith('validation') and not validates:
+        raise ValueError(f"early_stopping.monitor '{monitor}' needs validation, which is disabled")
+    return EarlyStopping(
+        monitor=monitor,
+        patience=int(early_stopping.get('patience', 5)),
+        min_delta=float(early_stopping.get('min_delta', 0.0)),
+        mode=early_stopping.get('mode', 'min'),
+    )
+
+# training.max_time: "DD:HH:MM:SS", "HH:MM:SS" or {days, hours, minutes, seconds}
+def parse_max_time(value):
+    if not value:
+        return None
+    try:
+        if isinstance(value, dict):
+            budget = datetime.timedelta(**{unit: float(amount) for unit, amount in value.items()})
+        else:
+            parts = [float(part) for part in str(value).split(':')]
+            if len(parts) not in (3, 4):
+                raise ValueError
+            days, hours, minutes, seconds = [0.0] * (4 - len(parts)) + parts
+            budget = datetime.timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+    except (TypeError, ValueError):
+        raise ValueError(f"training.max_time {value!r} must be \"DD:HH:MM:SS\", \"HH:MM:SS\" "
+                         f"or a mapping of days, hours, minutes and seconds")
+    return budget if budget.total_seconds() > 0 else None
+
+# Seconds left of training.max_time (None without a budget); time before a resume counts too
+def time_budget_remaining(trainer):
+    timer = next((callback for callback in trainer.callbacks if isinstance(callback, Timer)), None)
+    return timer.time_remaining() if timer is not None else None
+
+# Why trainer.fit returned; the max_time Timer and EarlyStopping both only set trainer.should_stop
+def training_stop_reason(trainer, early_stopping):
+    if trainer.interrupted:
+        return "interrupted"
+    remaining = time_budget_remaining(trainer)
+    if remaining is not None and remaining <= 0:
+        return "max_time"
+    if early_stopping is not None and trainer.should_stop:
+        return "early_stopping"
+    return "max_epochs"
+
+# Phases of a training step and the marks they are timed between
+STEP_PHASES = {
+    "h2d": ("transfer_start", "transfer_end"),
+    "preprocess": ("transfer_end", "forward_start"),
+    "forward": ("forward_start", "backward_start"),
+    "backward": ("backward_start", "backward_end"),
+    "optimizer": ("optimizer_start", "step_end"),
+}
+
+# A run spending more of its step time than this waiting for batches is input-bound
+INPUT_BOUND_FRACTION = 0.2
+
+class StepTimer:
+    """Times the phases of every training step and aggregates them per logging window. On GPU the
+    phases are CUDA events that are only read back once per window, so timing adds no per-step sync.
+    The data wait is the host time between the end of one step and the arrival of the next batch."""
+    def __init__(self, device, samples_per_step):
+        self.device = device
+        self.cuda = device.type == "cuda"
+        self.samples_per_step = samples_per_step
+        self.marks = {}
+        self.steps = []
+        self.last_step_end = None
+        self.window_start = None
+        self.totals = None
+        self.windows = 0
+        self.paused_at = None
+
+    def mark(self, name):
+        if self.cuda:
+            event = torch.cuda.Event(enable_timing=True)
+            event.record()
+            self.marks[name] = event
+        else:
+            self.marks[name] = time.perf_counter()
+
+    def start_step(self):
+        now = time.perf_counter()
+        if self.window_start is None:
+            self.window_start = now
+        self.data_wait = now - self.last_step_end if self.last_step_end is not None else 0.0
+        self.marks = {}
+        self.mark("transfer_start")
+
+    def end_step(self):
+        if "transfer_start" not in self.marks:
+            return
+        self.mark("step_end")
+        self.steps.append((self.marks, self.data_wait))
+        self.marks = {}
+        self.last_step_end = time.perf_counter()
+
+    # Validation and epoch boundaries are not part of any step; their time is left out of the window
+    def pause(self):
+        self.paused_at = time.perf_counter()
+
+    def resume(self):
+        if self.paused_at is None:
+            return
+        paused = time.perf_counter() - self.paused_at
+        self.paused_at = None
+        if self.window_start is not None:
+            self.window_start += paused
+        if self.last_step_end is not None:
+            self.last_step_end += paused
+
+    def elapsed_ms(self, start, end):
+        if self.cuda:
+            return start.elapsed_time(end)
+        return (end - start) * 1000.0
+
+    def flush(self):
+        """Returns the window's mean phase times (ms), samples/sec and memory high-water, and starts a new window."""
+        if not self.steps:
+            return None
+        if self.cuda:
+            self.steps[-1][0]["step_end"].synchronize()
+        wall = time.perf_counter() - self.window_start
+
+        phases = dict.fromkeys(STEP_PHASES, 0.0)
+        data_wait = 0.0
+        for marks, wait in self.steps:
+            data_wait += wait * 1000.0
+            for phase, (start, end) in STEP_PHASES.items():
+                if start in marks and end in marks:
+                    phases[phase] += self.elapsed_ms(marks[start], marks[end])
+
+        count = len(self.steps)
+        window = {
+            "steps": count,
+            "samples_per_sec": count * self.samples_per_step / wall if wall > 0 else 0.0,
+            "step_ms": wall * 1000.0 / count,
+            "data_wait_ms": data_wait / count,
+        }
+        window.update({f"{phase}_ms": total / count for phase, total in phases.items()})
+        if self.cuda:
+            window["peak_memory_mb"] = torch.cuda.max_memory_allocated(self.device) / (1024.0 * 1024.0)
+            torch.cuda.reset_peak_memory_stats(self.device)
+
+        # The first window carries warm-up (and compilation); the run summary leaves it out
+        self.windows += 1
+        if self.windows == 2 or self.totals is None:
+            self.totals = {"steps": 0, "seconds": 0.0, "peak_memory_mb": 0.0}
+            self.totals.update({key: 0.0 for key in window if key.endswith("_ms") and key != "step_ms"})
+        self.totals["steps"] += count
+        self.totals["seconds"] += wall
+        for key, value in window.items():
+            if key == "peak_memory_mb":
+                self.totals[key] = max(self.totals[key], value)
+            elif key in self.totals and key.endswith("_ms"):
+                self.totals[key] += value * count
+
+        self.steps = []
+        self.window_start = time.perf_counter()
+        return window
+
+    def summary(self):
+        """Compact run-level figures for run_meta.json."""
+        totals = self.totals
+        if not totals or not totals["steps"]:
+            return None
+        steps = totals["steps"]
+        step_ms = totals["seconds"] * 1000.0 / steps
+        summary = {
+            "samples_per_sec": round(steps * self.samples_per_step / totals["seconds"], 1),
+            "step_ms": round(step_ms, 2),
+        }
+        summary.update({key: round(value / steps, 2) for key, value in totals.items() if key.endswith("_ms")})
+        summary["data_wait_fraction"] = round(summary["data_wait_ms"] / step_ms, 3) if step_ms else 0.0
+        summary["input_bound"] = summary["data_wait_fraction"] > INPUT_BOUND_FRACTION
+        if self.cuda:
+            summary["peak_memory_mb"] = round(totals["peak_memory_mb"], 1)
+        summary["steps_measured"] = steps
+        return summary
+
+# Log the engine's step-timer window (rank 0) and refresh the run's throughput summary
+def log_throughput_window(engine):
+    # Timings are this rank's; samples/sec assumes every rank runs the same micro-batch
+    window = engine.step_timer.flush()
+    if window is None or engine.global_rank != 0:
+        return
+    if engine.logger is not None:
+        engine.logger.log_metrics({f"throughput/{key}": value for key, value in window.items() if key != "steps"},
+                                  step=engine.global_step)
+    memory = f" | Peak memory: {window['peak_memory_mb']:.0f} MB" if "peak_memory_mb" in window else ""
+    logging.info(
+        f"Throughput: {window['samples_per_sec']:.1f} samples/s | Step: {window['step_ms']:.1f} ms "
+        f"(data wait {window['data_wait_ms']:.1f}, h2d {window['h2d_ms']:.1f}, "
+        f"preprocess {window['preprocess_ms']:.1f}, forward {window['forward_ms']:.1f}, "
+        f"backward {window['backward_ms']:.1f}, optimizer {window['optimizer_ms']:.1f}){memory}"
+    )
+    update_run_meta(throughput=engine.step_timer.summary())
+
+SMOKE_DEFAULTS = {
+    "train_batches": 5,
+    "val_batches": 2,
+    "gpu_memory_fraction": 0.25,  # Share of the GPU a smoke test may allocate when run on one
+}
+
+# Shrink the run to a smoke test: one epoch of a few batches on one device, with nothing slow
+# (compilation, loader tuning, cache builds) and nothing persistent (checkpoints, TensorBoard)
+def apply_smoke_overrides(config):
+    smoke = dict(SMOKE_DEFAULTS)
+    smoke.update(config.get('smoke') or {})
+    smoke.update(train_batches=max(1, int(smoke['train_batches'])), val_batches=max(1, int(smoke['val_batches'])))
+    config['smoke'] = smoke
+
+    training = config['training']
+    # The control plane hides every GPU unless the test runs on a GPU slice
+    training.update(epochs=1, num_gpus=1, cpu_processes=1, log_every_n_steps=1, compile=False)
+    training.pop('resume_from', None)
+    training.pop('max_time', None)
+    config['dataset_cache'] = dict(config.get('dataset_cache') or {}, enabled=False)
+    config['checkpointing'] = dict(config.get('checkpointing') or {}, enabled=False)
+
+    dataloader = dict(config.get('dataloader') or {})
+    for key in ('num_workers', 'prefetch_factor'):
+        if dataloader.get(key) == "auto":
+            dataloader[key] = DATALOADER_DEFAULTS[key]
+    config['dataloader'] = dataloader
+
+    validation = dict(config.get('validation') or {})
+    validates = validation.get('limit_val_batches', 1.0) != 0
+    validation.update(check_val_every_n_epoch=1, val_check_interval=1.0,
+                      limit_val_batches=smoke['val_batches'] if validates else 0,
+                      limit_test_batches=smoke['val_batches'])
+    config['validation'] = validation
+    return smoke
+
+# The first samples of a map-style split; streaming splits are bounded by the batch limits alone
+def smoke_subset(dataset, samples):
+    if dataset is None or isinstance(dataset, IterableDataset) or len(dataset) <= samples:
+        return dataset
+    return Subset(dataset, range(samples))
+
+# Host memory high-water of this process in MB
+def peak_host_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        import psutil  # Windows has no resource module; peak_wset is the peak working set
+        return psutil.Process().memory_info().peak_wset / (1024.0 * 1024.0)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+def report_smoke_test(trainer, model, started):
+    smoke = {"seconds": round(time.time() - started, 1), "device": model.device.type,
+             "train_batches": trainer.num_training_batches, "micro_batch_size": model.batch_size}
+    throughput = model.step_timer.summary() if model.step_timer is not None else None
+    if throughput:
+        smoke.update(step_ms=throughput["step_ms"], samples_per_sec=throughput["samples_per_sec"],
+                     data_wait_fraction=throughput["data_wait_fraction"])
+    if model.device.type == "cuda":
+        smoke["peak_memory_mb"] = round(max(throughput.get("peak_memory_mb", 0.0) if throughput else 0.0,
+                                            torch.cuda.max_memory_allocated(model.device) / (1024.0 * 1024.0)), 1)
+    smoke["peak_host_memory_mb"] = round(peak_host_memory_mb(), 1)
+
+    loss = trainer.callback_metrics.get("epoch_avg_loss")
+    if not trainer.num_training_batches or model.global_step == 0:
+        smoke.update(passed=False, error="No training step ran; the training split is empty")
+    elif loss is None or not torch.isfinite(loss):
+        smoke.update(passed=False, error=f"Training loss is not finite ({loss})")
+    else:
+        smoke.update(passed=True, loss=round(float(loss), 4))
+    if "validation_loss" in trainer.callback_metrics:
+        smoke["validation_loss"] = round(float(trainer.callback_metrics["validation_loss"]), 4)
+
+    update_run_meta(smoke=smoke)
+    memory = f"{smoke['peak_memory_mb']:.0f} MB device, " if "peak_memory_mb" in smoke else ""
+    logging.info(f"Smoke test {'passed' if smoke['passed'] else 'failed: ' + smoke['error']} | "
+                 f"{smoke['seconds']:.1f}s | Step: {smoke.get('step_ms', float('nan')):.1f} ms | "
+                 f"Peak memory: {memory}{smoke['peak_host_memory_mb']:.0f} MB host")
+    return smoke["passed"]
+
+# Dropped into the run directory by POST /runs/profile; polled between training steps
+PROFILE_REQUEST_FILE = 'profile_request.json'
+PROFILE_MAX_STEPS = 200
+
+class ProfilerCapture:
+    """Records a torch.profiler window of N training steps when profile_request.json appears in the
+    run directory, then writes the Chrome trace and top-operator tables to <log_dir>/profiles/<time>/."""
+    def __init__(self, log_dir, cuda):
+        self.log_dir = log_dir
+        self.cuda = cuda
+        self.profiler = None
+        self.output_dir = None
+        self.steps = 0
+        self.remaining = 0
+        self.started = None
+
+    def poll(self):
+        if self.profiler is not None or not os.path.exists(PROFILE_REQUEST_FILE):
+            return
+        request = {}
+        try:
+            with open(PROFILE_REQUEST_FILE, 'r') as f:
+                request = json.load(f)
+        except (OSError, ValueError):
+            pass
+        try:
+            os.remove(PROFILE_REQUEST_FILE)
+        except OSError:
+            pass
+
+        self.steps = self.remaining = max(1, min(int(request.get("steps", 20)), PROFILE_MAX_STEPS))
+        self.output_dir = os.path.join(self.log_dir, 'profiles', time.strftime('%Y%m%d-%H%M%S'))
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self.cuda:
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        kwargs = {}
+        if hasattr(torch._C._profiler, '_ExperimentalConfig'):
+            # Without verbose mode the Python stacks come back empty and cannot be grouped
+            kwargs["experimental_config"] = torch._C._profiler._ExperimentalConfig(verbose=True)
+        self.profiler = torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True,
+                                               with_stack=True, **kwargs)
+        self.profiler.start()
+        self.started = time.time()
+        logging.info(f"Profiling {self.steps} training steps into {self.output_dir}")
+        update_run_meta(profile={"status": "recording", "dir": self.output_dir, "steps": self.steps,
+                                 "requested": request.get("requested")})
+
+    def step(self):
+        if self.profiler is None:
+            return
+        self.profiler.step()
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.finish()
+
+    def finish(self):
+        if self.profiler is None:
+            return
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        steps = self.steps - self.remaining
+        os.makedirs(self.output_dir, exist_ok=True)
+        profiler.export_chrome_trace(os.path.join(self.output_dir, 'trace.json'))
+
+        sort_by = "self_cuda_time_total" if self.cuda else "self_cpu_time_total"
+        memory_sort_by = "self_cuda_memory_usage" if self.cuda else "self_cpu_memory_usage"
+        averages = profiler.key_averages()
+        with open(os.path.join(self.output_dir, 'summary.txt'), 'w') as f:
+            f.write(f"Top operators by {sort_by} over {steps} training step(s)\n")
+            f.write(averages.table(sort_by=sort_by, row_limit=30))
+            f.write(f"\n\nTop operators by {memory_sort_by}\n")
+            f.write(averages.table(sort_by=memory_sort_by, row_limit=15))
+            f.write(f"\n\nTop call stacks by {sort_by}\n")
+            f.write(profiler.key_averages(group_by_stack_n=5).table(sort_by=sort_by, row_limit=20))
+
+        ranked = sorted(averages, key=lambda event: event.self_device_time_total if self.cuda else event.self_cpu_time_total,
+                        reverse=True)
+        top_operators = [{
+            "name": event.key,
+            "calls": event.count,
+            "self_cpu_ms": round(event.self_cpu_time_total / 1000.0, 3),
+            "self_device_ms": round(event.self_device_time_total / 1000.0, 3),
+        } for event in ranked[:10]]
+        logging.info(f"Profile of {steps} step(s) written to {self.output_dir} "
+                     f"({time.time() - self.started:.1f}s including export)")
+        update_run_meta(profile={"status": "done", "dir": self.output_dir, "steps": steps,
+                                 "trace": os.path.join(self.output_dir, 'trace.json'),
+                                 "summary": os.path.join(self.output_dir, 'summary.txt'),
+                                 "top_operators": top_operators})
@@ -0,0 +1,163 @@
+"""
+Module: launcher.py
+Description:
+This module provides a pool of pre-warmed Python interpreters for launching runs. A fresh
+`python engine.py` spends 10-20 s importing torch, torchvision and pytorch_lightning before
+the first batch; a warm worker has already imported them and only waits for a run to execute.
+
+Features:
+- WarmPool: A thread-safe pool of idle worker processes, refilled as workers are used.
+- Worker mode (`python launcher.py --worker`): preloads the heavy libraries, then reads one
+  job from stdin, switches to the run directory and environment (including the allocated
+  CUDA_VISIBLE_DEVICES), redirects its output to the run log and executes engine.py as __main__.
+
+Importing torch does not initialize CUDA, so a worker can still be pinned to any GPU
+when it receives its run. Each worker executes exactly one run and exits, like a regular
+launch, so the process id recorded for a run can be stopped the same way.
+
+Configuration (environment variables of the server):
+- EVF_WARM_POOL_SIZE: Number of idle warm workers to keep (default 0, disabled).
+- EVF_WARM_PRELOAD: Comma-separated modules a worker imports up front.
+
+Dependencies:
+- Subprocess: For spawning worker interpreters.
+- runpy: For executing engine.py inside a worker.
+- Threading: To ensure thread-safe access to the pool.
+"""
+
+import os
+import sys
+import json
+import subprocess
+from threading import Lock
+
+# Modules imported by a warm worker before it receives a run
+DEFAULT_PRELOAD = 'torch,torchvision,pytorch_lightning,pytorch_lightning.loggers,pytorch_lightning.strategies,yaml'
+
+LAUNCHER_PATH = os.path.abspath(__file__)
+
+class WarmPool:
+    def __init__(self, size=None, preload=None):
+        self.lock = Lock()
+        self.size = int(os.environ.get('EVF_WARM_POOL_SIZE', 0)) if size is None else size
+        self.preload = preload or os.environ.get('EVF_WARM_PRELOAD', DEFAULT_PRELOAD)
+        self.workers = []
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def start(self):
+        """Spawns workers until the pool holds `size` live idle interpreters."""
+        with self.lock:
+            self._fill()
+
+    def idle_count(self):
+        with self.lock:
+            self.workers = [w for w in self.workers if w.poll() is None]
+            return len(self.workers)
+
+    def launch(self, cwd, env, log_file_path, script='engine.py'):
+        """
+        Hands a run to an idle warm worker.
+
+        Args:
+            cwd (str): Run directory containing the script.
+            env (dict): Full environment of the run, e.g. with CUDA_VISIBLE_DEVICES set.
+            log_file_path (str): File receiving the run's stdout and stderr.
+            script (str): Script to execute as __main__, relative to cwd.
+
+        Returns:
+            subprocess.Popen: The worker now executing the run, or None if no warm
+            worker is available (the caller should fall back to a regular launch).
+        """
+        if not self.enabled:
+            return None
+
+        job = {
+            "cwd": os.path.abspath(cwd),
+            "env": dict(env),
+            "log_file": os.path.abspath(log_file_path),
+            "script": script,
+        }
+        with self.lock:
+            while self.workers:
+                worker = self.workers.pop(0)
+                if worker.poll() is not None:
+                    continue
+                try:
+                    worker.stdin.write(json.dumps(job) + '\n')
+                    worker.stdin.close()
+                except (BrokenPipeError, OSError):
+                    continue
+                self._fill()
+                return worker
+            self._fill()
+        return None
+
+    def _fill(self):
+        # Called with self.lock held
+        self.workers = [w for w in self.workers if w.poll() is None]
+        while len(self.workers) < self.size:
+            env = os.environ.copy()
+            env['EVF_WARM_PRELOAD'] = self.preload
+            self.workers.append(subprocess.Popen(
+                ['python', LAUNCHER_PATH, '--worker'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=env,
+                universal_newlines=True
+            ))
+
+warm_pool = WarmPool()
+
+def worker_main():
+    """Entry point of a warm worker: preload, wait for one job, run it."""
+    import importlib
+    import runpy
+    import traceback
+
+    for module_name in os.environ.get('EVF_WARM_PRELOAD', DEFAULT_PRELOAD).split(','):
+        module_name = module_name.strip()
+        if module_name:
+            try:
+                importlib.import_module(module_name)
+            except Exception:
+                pass  # The run will report the import error itself
+
+    line = sys.stdin.readline()
+    if not line:
+        return 0
+    job = json.loads(line)
+
+    os.chdir(job["cwd"])
+    os.environ.clear()
+    os.environ.update(job["env"])
+    sys.path.insert(0, job["cwd"])
+
+    # Send everything the run prints to its log, like a regular launch does
+    log_fd = os.open(job["log_file"], os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+
+    sys.argv = [job["script"]]
+    try:
+        runpy.run_path(job["script"], run_name='__main__')
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    if '--worker' in sys.argv[1:]:
+        sys.exit(worker_main())
+    print("usage: python launcher.py --worker")
+    sys.exit(2)
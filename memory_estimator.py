@@ -0,0 +1,418 @@
+"""
+Module: memory_estimator.py
+Description:
+This module estimates how much GPU memory a run needs per device before it is launched, so the
+scheduler can place runs on GPUs where they fit instead of letting them fail minutes in.
+
+Features:
+- estimate_run_memory: Control-plane entry point. Runs the estimator in a child interpreter
+  (the server never imports torch), caches the result in the run directory keyed by the model
+  code and the memory-relevant config, and returns it.
+- estimate_in_background / cached_run_estimate / failed_run_estimate: Non-blocking variants for
+  request handlers. Background estimates share a small queue: at most ESTIMATE_WORKERS estimator
+  processes run at once, one per run directory, and cancel_estimate drops or kills the estimate
+  of a deleted run.
+- Estimator mode (`python memory_estimator.py --model <name> [--dataset <name>]`, cwd = run dir):
+  instantiates the run's Model on the meta device (building it on CPU first if its constructor
+  needs real tensors), traces one forward and backward pass at the configured micro-batch, and reports parameter, gradient, optimizer-state
+  and activation memory in MB.
+
+Activations are the tensors autograd saves for backward, counted at fp32 and halved for the
+mixed-precision modes. The memory_saving modes of config.yaml are honoured: submodules under
+activation checkpointing only keep their inputs (the recomputation of one block during backward
+is not counted), and an offloaded optimizer keeps its state off the device. A fixed CUDA context overhead and a fragmentation factor are added to the
+total. The estimate is approximate by design; it only has to be good enough for placement.
+
+Dependencies:
+- Subprocess, JSON: For running the estimator and exchanging its result.
+- threading, queue: For the background estimate workers.
+- YAML: For reading the run's config.yaml.
+- hashlib: For the cache key of an estimate.
+- torch: Only inside the estimator process.
+"""
+
+import os
+import sys
+import json
+import yaml
+import queue
+import hashlib
+import subprocess
+from threading import Event, Lock, Thread, get_ident
+
+# Bump when the estimate changes meaning, so cached estimates are recomputed
+ESTIMATOR_VERSION = 2
+
+# File in the run directory holding the last estimate
+MEMORY_ESTIMATE_FILE = 'memory_estimate.json'
+
+# Seconds the estimator may take (importing torch, building the model and one dataset sample)
+ESTIMATE_TIMEOUT = 180
+
+# Estimator processes run at once by background estimates (each imports torch)
+ESTIMATE_WORKERS = 2
+
+# Memory a CUDA context and the caching allocator take before the first tensor, in MB
+CUDA_CONTEXT_MB = 600
+
+# Headroom for allocator fragmentation and temporary buffers
+FRAGMENTATION_FACTOR = 1.15
+
+# Optimizer state per parameter, in parameter-sized copies
+OPTIMIZER_STATE_COPIES = {
+    "Adam": 2, "AdamW": 2, "Adamax": 2, "NAdam": 2, "RAdam": 2, "Adadelta": 2,
+    "SGD": 1, "RMSprop": 1, "Adagrad": 1, "ASGD": 2, "Rprop": 2, "LBFGS": 2,
+}
+
+ESTIMATOR_PATH = os.path.abspath(__file__)
+
+def load_run_config(runs_dir):
+    config_yaml_path = os.path.join(runs_dir, 'config.yaml')
+    if not os.path.exists(config_yaml_path):
+        return {}
+    with open(config_yaml_path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+def estimate_key(runs_dir, model_name, config):
+    """Hash of the model code and the config fields the estimate depends on."""
+    training = config.get('training') or {}
+    optimizer = (config.get('optimization') or {}).get('optimizer') or {}
+    memory_saving = config.get('memory_saving') or {}
+    relevant = {
+        "version": ESTIMATOR_VERSION,
+        "batch_size": training.get('batch_size'),
+        "precision": training.get('precision'),
+        "input_shape": training.get('input_shape'),
+        "optimizer": optimizer.get('name'),
+        "momentum": (optimizer.get('params') or {}).get('momentum'),
+        "activation_checkpointing": memory_saving.get('activation_checkpointing'),
+        "optimizer_offload": memory_saving.get('optimizer_offload'),
+    }
+    digest = hashlib.sha256(json.dumps(relevant, sort_keys=True).encode())
+    model_dir = os.path.join(runs_dir, 'model', model_name)
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.py'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(name.encode())
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+def read_cached_estimate(runs_dir, key):
+    estimate_path = os.path.join(runs_dir, MEMORY_ESTIMATE_FILE)
+    if not os.path.exists(estimate_path):
+        return None
+    try:
+        with open(estimate_path, 'r') as f:
+            estimate = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return estimate if estimate.get("key") == key else None
+
+def estimate_run_memory(runs_dir, model_name, dataset_name=None, timeout=ESTIMATE_TIMEOUT, on_start=None):
+    """
+    Returns the per-device memory estimate of a run, computing it if the cached one is stale.
+
+    Args:
+        runs_dir (str): Run directory containing engine.py, config.yaml and model/<model_name>.
+        model_name (str): Name of the run's model.
+        dataset_name (str, optional): Name of the run's dataset, used to find the input shape
+            when config.yaml has no training.input_shape.
+        timeout (int): Seconds after which the estimator is abandoned.
+        on_start (callable, optional): Called with the estimator's Popen once it is started.
+
+    Returns:
+        dict: The estimate ({"total_mb", "params_mb", ...}) or {"error": message}.
+    """
+    config = load_run_config(runs_dir)
+    key = estimate_key(runs_dir, model_name, config)
+    cached = read_cached_estimate(runs_dir, key)
+    if cached is not None:
+        return cached
+
+    command = [sys.executable, ESTIMATOR_PATH, '--model', model_name]
+    if dataset_name:
+        command += ['--dataset', dataset_name]
+    env = os.environ.copy()
+    env['CUDA_VISIBLE_DEVICES'] = ''  # Never touch the GPUs other runs are using
+    process = subprocess.Popen(command, cwd=runs_dir, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True)
+    if on_start is not None:
+        on_start(process)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return {"error": f"Memory estimate timed out after {timeout}s"}
+    if process.returncode < 0:
+        return {"error": "Memory estimate cancelled"}
+    lines = stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        message = (stderr.strip().splitlines() or ["Memory estimator failed"])[-1]
+        return {"error": message}
+
+    estimate = json.loads(lines[-1])
+    estimate["key"] = key
+    # Written under a temporary name: a background estimate may finish at the same time
+    estimate_path = os.path.join(runs_dir, MEMORY_ESTIMATE_FILE)
+    tmp_path = f"{estimate_path}.{os.getpid()}.{get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(estimate, f, indent=4)
+    os.replace(tmp_path, estimate_path)
+    return estimate
+
+def cached_run_estimate(runs_dir, model_name):
+    """The cached estimate of a run if it is still current, else None. Never runs the estimator."""
+    return read_cached_estimate(runs_dir, estimate_key(runs_dir, model_name, load_run_config(runs_dir)))
+
+class EstimateQueue:
+    """
+    A thread-safe queue of background memory estimates.
+
+    At most num_workers estimator processes run at a time, however many runs are created at
+    once. A run directory is queued at most once: a request for a run already queued or
+    being estimated shares that estimate. The last failure of each run is kept (with the
+    estimate key it was computed for) so callers do not retry a broken model in a loop.
+    """
+
+    def __init__(self, num_workers=ESTIMATE_WORKERS):
+        self.lock = Lock()
+        self.num_workers = num_workers
+        self.queue = queue.Queue()
+        self.pending = {}  # Run directory -> Event set once its estimate is done or dropped
+        self.processes = {}  # Run directory -> estimator process in flight
+        self.cancelled = set()
+        self.errors = {}  # Run directory -> (estimate key, error message)
+        self.workers = []
+
+    def submit(self, runs_dir, model_name, dataset_name=None):
+        """Queues an estimate of the run and returns an Event to wait on with a timeout."""
+        run_key = os.path.abspath(runs_dir)
+        with self.lock:
+            done = self.pending.get(run_key)
+            if done is not None:
+                return done
+            done = self.pending[run_key] = Event()
+            self.cancelled.discard(run_key)
+            self.errors.pop(run_key, None)
+            self._ensure_workers()
+        self.queue.put((run_key, runs_dir, model_name, dataset_name))
+        return done
+
+    def cancel(self, runs_dir):
+        """Drops a queued estimate of the run, or kills its estimator if it is running."""
+        run_key = os.path.abspath(runs_dir)
+        with self.lock:
+            self.errors.pop(run_key, None)
+            if run_key not in self.pending:
+                return
+            self.cancelled.add(run_key)
+            process = self.processes.get(run_key)
+        if process is not None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    def error(self, runs_dir, model_name):
+        """The error of the run's last background estimate, if its config has not changed since."""
+        with self.lock:
+            failure = self.errors.get(os.path.abspath(runs_dir))
+        if failure is None or failure[0] != estimate_key(runs_dir, model_name, load_run_config(runs_dir)):
+            return None
+        return failure[1]
+
+    def _ensure_workers(self):
+        # Called with self.lock held; workers start lazily on the first estimate
+        self.workers = [w for w in self.workers if w.is_alive()]
+        while len(self.workers) < self.num_workers:
+            worker = Thread(target=self._worker, name="memory-estimate", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _worker(self):
+        while True:
+            run_key, runs_dir, model_name, dataset_name = self.queue.get()
+            try:
+                self._estimate(run_key, runs_dir, model_name, dataset_name)
+            finally:
+                with self.lock:
+                    self.processes.pop(run_key, None)
+                    self.cancelled.discard(run_key)
+                    done = self.pending.pop(run_key, None)
+                if done is not None:
+                    done.set()
+                self.queue.task_done()
+
+    def _estimate(self, run_key, runs_dir, model_name, dataset_name):
+        def started(process):
+            with self.lock:
+                self.processes[run_key] = process
+                cancelled = run_key in self.cancelled
+            if cancelled:
+                process.kill()
+
+        with self.lock:
+            if run_key in self.cancelled or not os.path.isdir(runs_dir):
+                return
+        try:
+            key = estimate_key(runs_dir, model_name, load_run_config(runs_dir))
+            estimate = estimate_run_memory(runs_dir, model_name, dataset_name, on_start=started)
+        except Exception as e:
+            # The run directory may be deleted while its estimate runs
+            key, estimate = None, {"error": str(e)}
+        if "error" in estimate:
+            with self.lock:
+                if run_key not in self.cancelled:
+                    self.errors[run_key] = (key, estimate["error"])
+
+estimate_queue = EstimateQueue()
+
+def estimate_in_background(runs_dir, model_name, dataset_name=None):
+    """
+    Queues estimate_run_memory for a run unless it is already queued or running, and returns
+    an Event set when the estimate is done (wait on it with a timeout).
+    """
+    return estimate_queue.submit(runs_dir, model_name, dataset_name)
+
+def failed_run_estimate(runs_dir, model_name):
+    """The error of the run's last background estimate if its inputs are unchanged, else None."""
+    return estimate_queue.error(runs_dir, model_name)
+
+def cancel_estimate(runs_dir):
+    """Drops the queued or running background estimate of a run, e.g. when it is deleted."""
+    estimate_queue.cancel(runs_dir)
+
+# -------------------- ESTIMATOR PROCESS --------------------
+
+def input_shape_from_dataset(dataset_name):
+    import importlib
+
+    Dataset = importlib.import_module(f"dataset.{dataset_name}.datasets").Dataset
+    try:
+        dataset = Dataset(train=True)
+    except TypeError:
+        dataset = Dataset()
+    sample = dataset[0][0]
+    return list(sample.shape)
+
+def build_model(model_name):
+    """
+    Instantiates the run's Model on the meta device. A constructor that needs real tensors is
+    run on CPU and then moved to meta; the returned method names the path taken.
+    """
+    import importlib
+    import torch
+
+    Model = importlib.import_module(f"model.{model_name}.model").Model
+    try:
+        with torch.device('meta'):
+            return Model(), "meta"
+    except Exception:
+        return Model().to('meta'), "cpu-to-meta"
+
+def apply_activation_checkpointing(model, module_types):
+    """Wraps the listed submodule types the way the engine does, so their activations are not kept."""
+    import torch.utils.checkpoint
+
+    def checkpointed(forward):
+        # No RNG state to preserve on the meta device (and stashing it fails there)
+        return lambda *args, **kwargs: torch.utils.checkpoint.checkpoint(
+            forward, *args, use_reentrant=False, preserve_rng_state=False, **kwargs)
+
+    names = set(module_types or [])
+    wrapped = []
+    for name, module in model.named_modules():
+        if type(module).__name__ in names and not any(name.startswith(prefix + '.') for prefix in wrapped):
+            module.forward = checkpointed(module.forward)
+            wrapped.append(name)
+    return wrapped
+
+def estimator_main(model_name, dataset_name):
+    import torch
+
+    sys.path.insert(0, '.')
+    config = load_run_config('.')
+    training = config.get('training') or {}
+    optimizer = (config.get('optimization') or {}).get('optimizer') or {}
+    memory_saving = config.get('memory_saving') or {}
+
+    batch_size = training.get('batch_size', 32)
+    auto_batch = batch_size == "auto"
+    if auto_batch:
+        batch_size = 1  # The engine sizes the batch to the device; report the per-sample cost
+
+    input_shape = training.get('input_shape')
+    if not input_shape:
+        if not dataset_name:
+            raise ValueError("training.input_shape is not set and the run has no dataset")
+        input_shape = input_shape_from_dataset(dataset_name)
+
+    model, method = build_model(model_name)
+    checkpointed = apply_activation_checkpointing(model, memory_saving.get('activation_checkpointing'))
+    parameters = [p for p in model.parameters()]
+    parameter_ids = {id(p) for p in parameters}
+    param_bytes = sum(p.numel() * p.element_size() for p in parameters)
+    trainable_bytes = sum(p.numel() * p.element_size() for p in parameters if p.requires_grad)
+    buffer_bytes = sum(b.numel() * b.element_size() for b in model.buffers())
+
+    # Every tensor autograd keeps for backward, except the parameters themselves
+    saved = {}
+    def pack(tensor):
+        if id(tensor) not in parameter_ids:
+            saved[id(tensor)] = tensor.numel() * tensor.element_size()
+        return tensor
+
+    inputs = torch.empty([batch_size] + list(input_shape), device='meta')
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        outputs = model(inputs)
+    if isinstance(outputs, (list, tuple)):
+        outputs = outputs[0]
+    if not checkpointed:
+        # Recomputing checkpointed blocks in backward cannot run on the meta device; the saved
+        # activations are already known from the forward pass
+        outputs.float().sum().backward()
+
+    activation_bytes = sum(saved.values())
+    precision = str(training.get('precision', 'fp32')).lower()
+    if precision not in ("fp32", "32", "32-true"):
+        activation_bytes //= 2  # Autocast keeps most saved activations in 16 bits
+
+    optimizer_name = optimizer.get('name', 'Adam')
+    copies = OPTIMIZER_STATE_COPIES.get(optimizer_name, 2)
+    if optimizer_name == "SGD" and not (optimizer.get('params') or {}).get('momentum'):
+        copies = 0
+    if memory_saving.get('optimizer_offload'):
+        copies = 0  # State and master weights live in host memory
+
+    mb = 1024.0 * 1024.0
+    estimate = {
+        "params_mb": round((param_bytes + buffer_bytes) / mb, 1),
+        "grads_mb": round(trainable_bytes / mb, 1),
+        "optimizer_mb": round(trainable_bytes * copies / mb, 1),
+        "activations_mb": round(activation_bytes / mb, 1),
+        "activations_per_sample_mb": round(activation_bytes / batch_size / mb, 2),
+        "context_mb": CUDA_CONTEXT_MB,
+        "batch_size": "auto" if auto_batch else batch_size,
+        "input_shape": list(input_shape),
+        "precision": precision,
+        "optimizer": optimizer_name,
+        "method": method,
+        "checkpointed_modules": len(checkpointed),
+        "optimizer_offload": bool(memory_saving.get('optimizer_offload')),
+    }
+    model_bytes = param_bytes + buffer_bytes + trainable_bytes * (1 + copies)
+    estimate["total_mb"] = round((model_bytes + activation_bytes) * FRAGMENTATION_FACTOR / mb + CUDA_CONTEXT_MB, 1)
+    print(json.dumps(estimate))
+    return 0
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Estimate the per-device GPU memory of the run in the working directory.")
+    parser.add_argument('--model', required=True, help="Name of the run's model (model/<name>/model.py).")
+    parser.add_argument('--dataset', help="Name of the run's dataset, for the input shape.")
+    args = parser.parse_args()
+    sys.exit(estimator_main(args.model, args.dataset))
@@ -8,45 +8,143 @@ and optional optimization strategy.
 Features:
 - Create, edit, delete, and list runs.
 - Start and stop runs with GPU allocation management.
+- GPU release schedule from the runs' declared training.max_time budgets and their own ETAs.
+- Smoke-test runs (a few batches on small subsets) on CPU or a shared GPU slice before a full start.
 - Retrieve and manage run-specific files (e.g., `engine.py`, `config.yaml`).
+- Copy the template's engine_utils.py, the helper module every generated engine.py imports, into the run.
 - Log management for monitoring the status of runs.
+- On-demand torch.profiler captures of running jobs, written to the run's logs directory.
 
 Components:
 - GPUManager: A thread-safe utility for managing GPU allocation.
+- RunSupervisor: Waits on launched runs, records each attempt in the run history, releases
+  their GPUs and relaunches runs that died from CUDA OOM with a smaller micro-batch.
 - Flask Routes: APIs to handle CRUD operations for runs and execute tasks.
 
 Dependencies:
 - Flask: For HTTP request/response management.
-- Torch: For GPU detection and allocation.
+- NVML (pynvml) or GPUtil: For lazy, cached GPU discovery without importing torch.
 - YAML: For handling configuration files.
 - OS/Shutil: For file system operations.
 - Subprocess: For executing training scripts.
+- launcher: Optional pool of pre-warmed interpreters that execute engine.py.
+- memory_estimator: Pre-launch per-device memory estimate used for GPU placement.
 - JSON: For storing and updating project metadata.
 
 Author: Junyong Park
 """
 
 import os
+import glob
 import json
 import shutil
+import calendar
 import subprocess
 import time
 import yaml
-import torch
-from threading import Lock
+from threading import Lock, Thread
 from flask import Blueprint, jsonify, request, session, render_template, send_from_directory
 from auth import session_required
+from launcher import warm_pool
+from memory_estimator import (estimate_in_background, cached_run_estimate, failed_run_estimate, cancel_estimate,
+                              load_run_config)
 
 runs = Blueprint('runs', __name__, url_prefix='/runs')
 
+gpu_discovery_lock = Lock()
+discovered_gpus = None
+
+def discover_gpus():
+    """
+    Returns the GPUs of this node as a list of {"index", "name", "memory_total"}
+    (memory in MB), discovered on first use and cached.
+
+    NVML is queried directly when pynvml is installed, otherwise GPUtil reads
+    nvidia-smi. Neither initializes CUDA or imports torch, so the server starts
+    fast and stays small. If CUDA_VISIBLE_DEVICES is set for the server, only
+    those devices are managed; indices are physical ids, which is what the
+    launched runs receive in their own CUDA_VISIBLE_DEVICES.
+    """
+    global discovered_gpus
+    with gpu_discovery_lock:
+        if discovered_gpus is not None:
+            return discovered_gpus
+
+        gpus = []
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+            try:
+                for index in range(pynvml.nvmlDeviceGetCount()):
+                    handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+                    name = pynvml.nvmlDeviceGetName(handle)
+                    gpus.append({
+                        "index": index,
+                        "name": name.decode() if isinstance(name, bytes) else name,
+                        "memory_total": pynvml.nvmlDeviceGetMemoryInfo(handle).total // (1024 * 1024),
+                    })
+            finally:
+                pynvml.nvmlShutdown()
+        except Exception:
+            try:
+                import GPUtil
+                gpus = [{"index": gpu.id, "name": gpu.name, "memory_total": int(gpu.memoryTotal)}
+                        for gpu in GPUtil.getGPUs()]
+            except Exception:
+                gpus = []
+
+        visible = os.environ.get('CUDA_VISIBLE_DEVICES')
+        if visible is not None:
+            visible_ids = [int(i) for i in visible.split(',') if i.strip().isdigit()]
+            gpus = [gpu for gpu in gpus if gpu["index"] in visible_ids]
+
+        discovered_gpus = gpus
+        return discovered_gpus
+
+def gpu_free_memory():
+    """
+    Returns {gpu index: free memory in MB}, read from NVML at call time so memory held by
+    processes outside this server counts too. Falls back to the total memory found at discovery.
+    """
+    free = {}
+    try:
+        import pynvml
+        pynvml.nvmlInit()
+        try:
+            for gpu in discover_gpus():
+                handle = pynvml.nvmlDeviceGetHandleByIndex(gpu["index"])
+                free[gpu["index"]] = pynvml.nvmlDeviceGetMemoryInfo(handle).free // (1024 * 1024)
+        finally:
+            pynvml.nvmlShutdown()
+    except Exception:
+        free = {gpu["index"]: gpu["memory_total"] for gpu in discover_gpus()}
+    return free
+
 class GPUManager:
     def __init__(self):
         self.lock = Lock()
-        self.gpu_status = {i: False for i in range(torch.cuda.device_count())}
-
-    def allocate_gpus(self, num_gpus=1):
+        self.init_lock = Lock()
+        self._gpu_status = None
+
+    @property
+    def gpu_status(self):
+        # Populated on first use so importing this module never probes the GPUs
+        with self.init_lock:
+            if self._gpu_status is None:
+                self._gpu_status = {gpu["index"]: False for gpu in discover_gpus()}
+            return self._gpu_status
+
+    def allocate_gpus(self, num_gpus=1, required_mb=None):
+        """
+        Allocates num_gpus idle GPUs. With required_mb, only GPUs with at least that much
+        free memory qualify, tightest fit first so roomier GPUs stay free for bigger runs.
+        """
         with self.lock:
             available = [gpu_id for gpu_id, in_use in self.gpu_status.items() if not in_use]
+            if required_mb:
+                free = gpu_free_memory()
+                available = sorted((gpu_id for gpu_id in available if free.get(gpu_id, 0) >= required_mb),
+                                   key=lambda gpu_id: free[gpu_id])
             if len(available) >= num_gpus:
                 allocated = available[:num_gpus]
                 for gpu_id in allocated:
@@ -62,18 +160,365 @@ class GPUManager:
 
 gpu_manager = GPUManager()
 
+# Serializes every read-modify-write of a project.json (API requests and supervisor threads)
+project_json_lock = Lock()
+
+# Log lines that identify a run killed by running out of GPU memory
+OOM_LOG_SIGNATURES = [
+    'CUDA out of memory',
+    'OutOfMemoryError',
+    'CUBLAS_STATUS_ALLOC_FAILED',
+    'CUDNN_STATUS_NOT_ENOUGH_MEMORY',
+]
+
+# Bytes at the end of the log searched for an OOM signature
+OOM_LOG_TAIL_BYTES = 256 * 1024
+
+# OOM relaunches per start unless training.oom_max_retries says otherwise
+DEFAULT_OOM_MAX_RETRIES = 2
+
+# Seconds /runs/start waits for a background memory estimate before placing the run without it
+START_ESTIMATE_WAIT = 5
+
+# File a running engine polls between training steps to start a profiler capture
+PROFILE_REQUEST_FILE = 'profile_request.json'
+DEFAULT_PROFILE_STEPS = 20
+MAX_PROFILE_STEPS = 200
+
+# Written by an engine started in smoke mode instead of run_meta.json
+SMOKE_META_FILE = 'smoke_meta.json'
+SMOKE_DEVICES = ("cpu", "gpu")
+
+# Templates of the run files; the generated engine.py imports engine_utils.py from its run directory
+RUN_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'edgeai', 'template', 'project', 'runs')
+ENGINE_UTILS_FILE = 'engine_utils.py'
+
+def install_engine_utils(runs_dir):
+    """Copies the template's engine_utils.py next to a run's engine.py."""
+    shutil.copy(os.path.join(RUN_TEMPLATE_DIR, ENGINE_UTILS_FILE), os.path.join(runs_dir, ENGINE_UTILS_FILE))
+
+def launch_engine(runs_dir, env, log_file_path, launcher):
+    """
+    Starts engine.py of a run, in a pre-warmed interpreter if requested and available.
+
+    Returns:
+        tuple: (subprocess.Popen, launcher actually used)
+    """
+    process = warm_pool.launch(runs_dir, env, log_file_path) if launcher == "warm" else None
+    if process is None:
+        launcher = "subprocess"
+        with open(log_file_path, 'a') as log_file:
+            process = subprocess.Popen(
+                ['python', 'engine.py'],
+                cwd=runs_dir,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                env=env,
+                bufsize=1,
+                universal_newlines=True
+            )
+    return process, launcher
+
+def max_time_seconds(value):
+    """
+    Seconds of a training.max_time budget ("DD:HH:MM:SS", "HH:MM:SS" or a mapping of days,
+    hours, minutes and seconds), or None without one. Raises ValueError for other values.
+    """
+    if not value:
+        return None
+    units = {"days": 86400, "hours": 3600, "minutes": 60, "seconds": 1}
+    try:
+        if isinstance(value, dict):
+            seconds = sum(float(amount) * units[unit] for unit, amount in value.items())
+        else:
+            parts = [float(part) for part in str(value).split(':')]
+            if len(parts) not in (3, 4):
+                raise ValueError
+            seconds = sum(part * unit for part, unit in zip(reversed(parts), (1, 60, 3600, 86400)))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"training.max_time {value!r} must be \"DD:HH:MM:SS\", \"HH:MM:SS\" "
+                         f"or a mapping of days, hours, minutes and seconds")
+    return seconds if seconds > 0 else None
+
+def parse_utc(timestamp):
+    return calendar.timegm(time.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ"))
+
+def expected_end(runs_dir, run):
+    """
+    When a running run is expected to finish (epoch seconds), or None if unknown: the end of its
+    declared training.max_time budget, or the engine's own estimate from its epoch times when
+    that is earlier. Early stopping can only make a run end sooner.
+    """
+    ends = []
+    if run.get("started_at") and run.get("max_time_seconds"):
+        ends.append(parse_utc(run["started_at"]) + run["max_time_seconds"])
+    try:
+        with open(os.path.join(runs_dir, 'run_meta.json'), 'r') as f:
+            eta = json.load(f).get("eta") or {}
+        if eta.get("expected_end"):
+            end = parse_utc(eta["expected_end"])
+            # run_meta.json outlives a run; an estimate made before this start is stale
+            if not run.get("started_at") or end - eta.get("remaining_seconds", 0) >= parse_utc(run["started_at"]):
+                ends.append(end)
+    except (OSError, ValueError):
+        pass
+    return min(ends) if ends else None
+
+def gpu_release_schedule():
+    """
+    Expected release time of every allocated GPU, from the running runs of all workspaces.
+
+    Returns:
+        dict: {gpu index: {"user", "project_name", "run_name", "expected_end"}}, expected_end
+        in epoch seconds or None when the run declared no budget and has no estimate yet.
+    """
+    schedule = {}
+    for project_json_path in glob.glob(os.path.join('workspace', '*', '*', 'project.json')):
+        user, project_name = project_json_path.split(os.sep)[-3:-1]
+        try:
+            with open(project_json_path, 'r') as f:
+                project_runs = json.load(f).get("runs", [])
+        except (OSError, ValueError):
+            continue
+        for run in project_runs:
+            if run.get("status") != "Running" or not run.get("gpu_ids"):
+                continue
+            end = expected_end(os.path.join('workspace', user, project_name, 'runs', run["run_name"]), run)
+            for gpu_id in run["gpu_ids"]:
+                schedule[gpu_id] = {"user": user, "project_name": project_name,
+                                    "run_name": run["run_name"], "expected_end": end}
+    return schedule
+
+def next_gpu_release(num_gpus):
+    """Epoch seconds by which num_gpus GPUs are expected to be idle, or None if that is unknown."""
+    idle = sum(not in_use for in_use in gpu_manager.gpu_status.values())
+    if idle >= num_gpus:
+        return None
+    ends = sorted(entry["expected_end"] for entry in gpu_release_schedule().values())
+    needed = num_gpus - idle
+    if len(ends) < needed or any(end is None for end in ends[:needed]):
+        return None
+    return ends[needed - 1]
+
+def read_smoke_result(runs_dir):
+    """The "smoke" summary a smoke test wrote to smoke_meta.json, or {} if it wrote none."""
+    meta_path = os.path.join(runs_dir, SMOKE_META_FILE)
+    try:
+        with open(meta_path, 'r') as f:
+            return json.load(f).get("smoke") or {}
+    except (OSError, ValueError):
+        return {}
+
+def requested_launcher(data, run):
+    """
+    The launcher a start asks for: the request's, else the one the run was explicitly started
+    with before, else the warm pool when enabled. run["launcher"] only ever holds an explicit
+    request, so a launch that fell back to a subprocess (empty pool) does not stick to the run.
+    """
+    return data.get("launcher") or run.get("launcher") or ("warm" if warm_pool.enabled else "subprocess")
+
+def write_project_json(project_json_path, project_data):
+    """Replaces project.json atomically, so readers never see a partly written file."""
+    tmp_path = project_json_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(project_data, f, indent=4)
+    os.replace(tmp_path, project_json_path)
+
+def update_run_record(user, project_name, run_name, update):
+    """Applies update(run) to the run's entry in project.json; returns update's result."""
+    project_json_path = os.path.join('workspace', user, project_name, 'project.json')
+    with project_json_lock:
+        with open(project_json_path, 'r') as f:
+            project_data = json.load(f)
+        run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
+        if run is None:
+            return None
+        result = update(run)
+        write_project_json(project_json_path, project_data)
+        return result
+
+def log_shows_oom(log_file_path, offset):
+    """Checks the log written since `offset` (bounded to its tail) for an OOM signature."""
+    try:
+        with open(log_file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            f.seek(max(offset, end - OOM_LOG_TAIL_BYTES))
+            tail = f.read().decode('utf-8', errors='replace')
+    except OSError:
+        return False
+    return any(signature in tail for signature in OOM_LOG_SIGNATURES)
+
+def latest_checkpoint(runs_dir, since=None):
+    """
+    Checkpoint to resume the run from: last.ckpt in its misc.checkpoint_dir, else the newest
+    *.ckpt there. With `since` (a UTC timestamp as in run["started_at"]), only checkpoints
+    written from then on count, so the final or top-k checkpoints of an earlier start are never
+    taken for this one's progress. Returns None if there is no such checkpoint.
+    """
+    checkpoint_dir = (load_run_config(runs_dir).get('misc') or {}).get('checkpoint_dir') or './checkpoints'
+    checkpoint_dir = os.path.join(runs_dir, checkpoint_dir)
+    checkpoints = glob.glob(os.path.join(checkpoint_dir, '*.ckpt'))
+    if since:
+        threshold = parse_utc(since)
+        checkpoints = [path for path in checkpoints if os.path.getmtime(path) >= threshold]
+    last = os.path.join(checkpoint_dir, 'last.ckpt')
+    if last in checkpoints:
+        return last
+    return max(checkpoints, key=os.path.getmtime) if checkpoints else None
+
+def shrink_micro_batch(runs_dir, checkpoint):
+    """
+    Halves the run's micro-batch in config.yaml, keeping the global batch through gradient
+    accumulation, and points training.resume_from at the checkpoint.
+
+    Returns:
+        dict: The new batch settings, or None if the micro-batch cannot shrink further.
+    """
+    config_yaml_path = os.path.join(runs_dir, 'config.yaml')
+    with open(config_yaml_path, 'r') as f:
+        config = yaml.safe_load(f) or {}
+    training = config.setdefault('training', {})
+
+    # The engine records the micro-batch it actually used (also when batch_size is "auto")
+    meta = {}
+    meta_path = os.path.join(runs_dir, 'run_meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    micro_batch = meta.get("micro_batch_size") or training.get('batch_size')
+    if not isinstance(micro_batch, int) or micro_batch < 2:
+        return None
+
+    if not training.get('effective_batch_size'):
+        training['effective_batch_size'] = meta.get("effective_batch_size") or \
+            micro_batch * max(1, int(training.get('num_gpus', 1) or 1))
+    training['batch_size'] = micro_batch // 2
+    if checkpoint:
+        training['resume_from'] = os.path.abspath(checkpoint)
+
+    with open(config_yaml_path, 'w') as f:
+        yaml.dump(config, f, default_flow_style=False)
+    return {"batch_size": training['batch_size'], "effective_batch_size": training['effective_batch_size'],
+            "resume_from": training.get('resume_from')}
+
+def oom_max_retries(runs_dir):
+    config_yaml_path = os.path.join(runs_dir, 'config.yaml')
+    if not os.path.exists(config_yaml_path):
+        return DEFAULT_OOM_MAX_RETRIES
+    with open(config_yaml_path, 'r') as f:
+        config = yaml.safe_load(f) or {}
+    return int((config.get('training') or {}).get('oom_max_retries', DEFAULT_OOM_MAX_RETRIES))
+
+class RunSupervisor:
+    """
+    Watches launched runs from a daemon thread each. When a run exits, the attempt is
+    appended to the run's history. A CUDA OOM exit is relaunched on the same GPUs from the
+    last checkpoint with half the micro-batch (up to training.oom_max_retries times);
+    otherwise the run is marked Completed or Failed and its GPUs are released. Runs stopped
+    through the API are left alone: their record no longer carries the watched pid.
+    """
+    def watch(self, user, project_name, run_name, process, gpu_ids, env, launcher, attempt=1, log_offset=0,
+              smoke=False):
+        thread = Thread(
+            target=self._watch,
+            args=(user, project_name, run_name, process, gpu_ids, env, launcher, attempt, log_offset, smoke),
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _watch(self, user, project_name, run_name, process, gpu_ids, env, launcher, attempt, log_offset, smoke):
+        started = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        exit_code = process.wait()
+        runs_dir = os.path.join('workspace', user, project_name, 'runs', run_name)
+        log_file_path = os.path.join(runs_dir, 'logs', 'run.log')
+
+        oom = exit_code != 0 and log_shows_oom(log_file_path, log_offset)
+        entry = {
+            "attempt": attempt,
+            "pid": process.pid,
+            "started": started,
+            "ended": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "exit_code": exit_code,
+            "reason": "completed" if exit_code == 0 else ("oom" if oom else "failed"),
+        }
+        entry["launcher"] = launcher
+        if smoke:
+            entry["mode"] = "smoke"
+
+        retry = None
+        preferred_launcher = None
+
+        def finish(run):
+            nonlocal retry, preferred_launcher
+            run.setdefault("history", []).append(entry)
+            preferred_launcher = requested_launcher({}, run)
+            if run.get("pid") != process.pid or run.get("status") != "Running":
+                # Stopped, edited or restarted meanwhile; that path already released the GPUs
+                entry["reason"] = "stopped"
+                return False
+            if smoke:
+                # Smoke tests hold no GPU allocation and are never retried
+                result = read_smoke_result(runs_dir)
+                if exit_code != 0 and result.get("passed") is not False:
+                    result = {"passed": False, "error": f"Exited with code {exit_code}"}
+                run["smoke"] = dict(result, finished=entry["ended"])
+                run["status"] = "Smoke Passed" if exit_code == 0 and result.get("passed") else "Smoke Failed"
+                run["pid"] = None
+                run.pop("mode", None)
+                return False
+            if oom and attempt <= oom_max_retries(runs_dir):
+                # Without a checkpoint of this start, the retry keeps the start's own resume_from
+                retry = shrink_micro_batch(runs_dir, latest_checkpoint(runs_dir, since=run.get("started_at")))
+            if retry is None:
+                run["status"] = "Completed" if exit_code == 0 else "Failed"
+                run["pid"] = None
+                run["gpu_ids"] = []
+                gpu_manager.release_gpus(gpu_ids)
+                return False
+            entry["retry"] = retry
+            return True
+
+        if not update_run_record(user, project_name, run_name, finish):
+            return
+
+        with open(log_file_path, 'a') as log_file:
+            log_file.write(f"\nCUDA out of memory; relaunching (attempt {attempt + 1}) with batch_size "
+                           f"{retry['batch_size']} and effective_batch_size {retry['effective_batch_size']}"
+                           f"{' from ' + retry['resume_from'] if retry['resume_from'] else ''}\n")
+        log_offset = os.path.getsize(log_file_path)
+        try:
+            new_process, new_launcher = launch_engine(runs_dir, env, log_file_path, preferred_launcher)
+        except Exception as e:
+            def fail(run):
+                run["status"] = "Failed"
+                run["pid"] = None
+                run["gpu_ids"] = []
+                run["history"][-1]["relaunch_error"] = str(e)
+            update_run_record(user, project_name, run_name, fail)
+            gpu_manager.release_gpus(gpu_ids)
+            return
+
+        def relaunched(run):
+            run["pid"] = new_process.pid
+        update_run_record(user, project_name, run_name, relaunched)
+        self.watch(user, project_name, run_name, new_process, gpu_ids, env, new_launcher, attempt + 1, log_offset)
+
+run_supervisor = RunSupervisor()
+
 def update_project_json(user, project_name, run_metadata):
     workspace_dir = os.path.join('workspace', user, project_name)
     project_json_path = os.path.join(workspace_dir, 'project.json')
     
-    project_data = {"runs": []}
-    if os.path.exists(project_json_path):
-        with open(project_json_path, 'r') as f:
-            project_data = json.load(f)
+    with project_json_lock:
+        project_data = {"runs": []}
+        if os.path.exists(project_json_path):
+            with open(project_json_path, 'r') as f:
+                project_data = json.load(f)
 
-    project_data["runs"].append(run_metadata)
-    with open(project_json_path, 'w') as f:
-        json.dump(project_data, f, indent=4)
+        project_data["runs"].append(run_metadata)
+        write_project_json(project_json_path, project_data)
 
 @runs.route('/get_file', methods=['GET'])
 @session_required
@@ -103,10 +548,140 @@ def get_file():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@runs.route('/meta', methods=['GET'])
+@session_required
+def get_run_meta():
+    """
+    Returns the facts a run's engine recorded about itself in run_meta.json
+    (training precision, devices, ...).
+    """
+    try:
+        project_name = request.args.get("project_name")
+        run_name = request.args.get("run_name")
+        if not project_name or not run_name:
+            return jsonify({"error": "Missing parameters."}), 400
+
+        meta_path = os.path.join('workspace', session["user"], project_name, 'runs', run_name, 'run_meta.json')
+        if not os.path.exists(meta_path):
+            return jsonify({"meta": {}}), 200
+
+        with open(meta_path, 'r') as f:
+            return jsonify({"meta": json.load(f)}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@runs.route('/throughput', methods=['GET'])
+@session_required
+def get_runs_throughput():
+    """
+    Returns the throughput summary each run's engine recorded (samples/sec, mean step phase
+    times, data-wait fraction, input_bound, peak memory) and the memory-saving modes it ran
+    with, fastest run first. Runs that have not trained yet are listed last with a null summary.
+    """
+    try:
+        project_name = request.args.get("project_name")
+        if not project_name:
+            return jsonify({"error": "Missing parameters."}), 400
+
+        workspace_dir = os.path.join('workspace', session["user"], project_name)
+        project_json_path = os.path.join(workspace_dir, 'project.json')
+        if not os.path.exists(project_json_path):
+            return jsonify({"error": f"Project '{project_name}' not found."}), 404
+        with open(project_json_path, 'r') as f:
+            project_data = json.load(f)
+
+        results = []
+        for run in project_data.get("runs", []):
+            throughput = memory_saving = None
+            meta_path = os.path.join(workspace_dir, 'runs', run["run_name"], 'run_meta.json')
+            if os.path.exists(meta_path):
+                try:
+                    with open(meta_path, 'r') as f:
+                        meta = json.load(f)
+                    throughput, memory_saving = meta.get("throughput"), meta.get("memory_saving")
+                except ValueError:
+                    pass
+            results.append({"run_name": run["run_name"], "status": run.get("status"),
+                            "throughput": throughput, "memory_saving": memory_saving})
+
+        results.sort(key=lambda r: -(r["throughput"] or {}).get("samples_per_sec", -1.0))
+        return jsonify({"runs": results}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@runs.route('/schedule', methods=['GET'])
+@session_required
+def get_schedule():
+    """
+    Returns every GPU of the node with its state and, for allocated GPUs, when they are expected
+    to be released (the end of the holding run's training.max_time budget, or the engine's own
+    estimate when earlier). Runs of other users are not named.
+    """
+    try:
+        schedule = gpu_release_schedule()
+        gpus = []
+        for gpu in discover_gpus():
+            entry = {"index": gpu["index"], "name": gpu["name"],
+                     "in_use": gpu_manager.gpu_status.get(gpu["index"], False), "expected_free": None, "run": None}
+            holder = schedule.get(gpu["index"])
+            if entry["in_use"] and holder:
+                if holder["expected_end"] is not None:
+                    entry["expected_free"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(holder["expected_end"]))
+                if holder["user"] == session["user"]:
+                    entry["run"] = {"project_name": holder["project_name"], "run_name": holder["run_name"]}
+            gpus.append(entry)
+        return jsonify({"gpus": gpus}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@runs.route('/memory_estimate', methods=['GET'])
+@session_required
+def get_memory_estimate():
+    """
+    Returns the per-GPU memory estimate of a run (params, grads, optimizer state,
+    activations and total in MB). A stale or missing estimate is queued in the background
+    and {"status": "pending"} is returned (202) until it is ready. A failed estimate is
+    reported until the run's model or config changes, or retry=1 is passed.
+    """
+    try:
+        project_name = request.args.get("project_name")
+        run_name = request.args.get("run_name")
+        if not project_name or not run_name:
+            return jsonify({"error": "Missing parameters."}), 400
+
+        workspace_dir = os.path.join('workspace', session["user"], project_name)
+        with open(os.path.join(workspace_dir, 'project.json'), 'r') as f:
+            project_data = json.load(f)
+        run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
+        if not run:
+            return jsonify({"error": f"Run '{run_name}' not found."}), 404
+
+        runs_dir = os.path.join(workspace_dir, 'runs', run_name)
+        estimate = cached_run_estimate(runs_dir, run.get("model_name"))
+        if estimate is not None:
+            return jsonify({"memory_estimate": estimate}), 200
+        error = failed_run_estimate(runs_dir, run.get("model_name"))
+        if error is not None and request.args.get("retry") != "1":
+            return jsonify({"error": error}), 500
+        estimate_in_background(runs_dir, run.get("model_name"), run.get("dataset_name"))
+        return jsonify({"status": "pending"}), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@runs.record_once
+def start_warm_pool(state):
+    # Fill the pool when the app starts, so the first run already finds warm workers
+    if warm_pool.enabled:
+        warm_pool.start()
+
 @runs.route('/')
 @session_required
 def root():
-    gpu_count = torch.cuda.device_count()
+    gpu_count = len(discover_gpus())
     return render_template('runs.html', gpu_count=gpu_count)
 
 @runs.route('/get_template', methods=['GET'])
@@ -117,13 +692,12 @@ def get_template():
         if file not in ['import.txt', 'engine.txt']:
             return jsonify({"error": "Invalid template file requested."}), 400
 
-        template_dir = os.path.join('edgeai', 'template', 'project', 'runs')
-        file_path = os.path.join(template_dir, file)
+        file_path = os.path.join(RUN_TEMPLATE_DIR, file)
 
         if not os.path.exists(file_path):
             return jsonify({"error": f"Template file '{file}' not found."}), 404
 
-        return send_from_directory(template_dir, file)
+        return send_from_directory(RUN_TEMPLATE_DIR, file)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -164,6 +738,7 @@ def create_run():
 
         with open(os.path.join(runs_dir, 'engine.py'), 'w') as f:
             f.write(engine_py_content)
+        install_engine_utils(runs_dir)
 
         if config_yaml_content.strip():
             with open(os.path.join(runs_dir, 'config.yaml'), 'w') as f:
@@ -183,6 +758,9 @@ def create_run():
 
         update_project_json(user, project_name, run_metadata)
 
+        # Estimate the run's GPU memory in the background so /start finds it cached
+        estimate_in_background(runs_dir, model_name, dataset_name)
+
         return jsonify({"message": "Run created successfully."}), 201
 
     except Exception as e:
@@ -245,8 +823,9 @@ def start_run():
         if not os.path.exists(project_json_path):
             return jsonify({"error": "Project not found."}), 404
 
-        with open(project_json_path, 'r') as f:
-            project_data = json.load(f)
+        with project_json_lock:
+            with open(project_json_path, 'r') as f:
+                project_data = json.load(f)
 
         run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
         if not run:
@@ -255,16 +834,60 @@ def start_run():
         if run["status"] == "Running":
             return jsonify({"error": f"Run '{run_name}' is already running."}), 400
 
+        if data.get("mode") == "smoke":
+            return start_smoke_test(user, project_name, run, runs_dir, log_file_path, data)
+
         # Check GPU availability first
-        if not torch.cuda.is_available():
+        gpus = {gpu["index"]: gpu for gpu in discover_gpus()}
+        if not gpus:
             return jsonify({"error": "No CUDA-capable GPUs available on this system"}), 503
 
+        # Place the run only on GPUs with enough free memory for its estimated footprint
+        required_mb = None
+        estimate = None
+        if not data.get("ignore_memory_estimate"):
+            # The estimator imports torch (and may build the dataset), so it never runs inside the
+            # request: wait briefly for the background estimate, else place the run without one
+            estimate = cached_run_estimate(runs_dir, run.get("model_name"))
+            if estimate is None:
+                estimate_in_background(runs_dir, run.get("model_name"), run.get("dataset_name")).wait(START_ESTIMATE_WAIT)
+                estimate = cached_run_estimate(runs_dir, run.get("model_name"))
+            if estimate is not None and estimate.get("batch_size") != "auto":
+                required_mb = estimate["total_mb"]
+                if required_mb > max(gpu["memory_total"] for gpu in gpus.values()):
+                    return jsonify({"error": f"Run needs about {required_mb:.0f} MB per GPU, more than any GPU "
+                                             f"on this node has. Reduce training.batch_size or set it to auto.",
+                                    "memory_estimate": estimate}), 400
+
+        resume_from = None
+        if data.get("resume"):
+            # Progress of the last start only, not whatever an even earlier start left behind;
+            # if it saved nothing, the checkpoint it resumed from itself (if any) is still valid
+            checkpoint = latest_checkpoint(runs_dir, since=run.get("started_at")) or \
+                (load_run_config(runs_dir).get('training') or {}).get('resume_from')
+            if checkpoint is None or not os.path.exists(checkpoint):
+                return jsonify({"error": f"Run '{run_name}' has no checkpoint to resume from."}), 400
+            resume_from = os.path.abspath(checkpoint)
+
+        # The declared time budget bounds when the run's GPUs are released again
+        try:
+            time_budget = max_time_seconds((load_run_config(runs_dir).get('training') or {}).get('max_time'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         # Allocate GPUs based on run's num_gpus
         num_gpus = run.get('num_gpus', 1)
-        gpu_ids = gpu_manager.allocate_gpus(num_gpus)
+        gpu_ids = gpu_manager.allocate_gpus(num_gpus, required_mb)
         if gpu_ids is None:
             available_gpus = sum(not in_use for in_use in gpu_manager.gpu_status.values())
-            return jsonify({"error": f"Requested {num_gpus} GPUs, but only {available_gpus} available."}), 503
+            release = next_gpu_release(num_gpus)
+            expected = (f" Enough GPUs are expected to be released by "
+                        f"{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(release))}." if release else "")
+            if required_mb:
+                return jsonify({"error": f"Requested {num_gpus} GPUs with about {required_mb:.0f} MB free each, "
+                                         f"but no such GPUs are available ({available_gpus} idle).{expected}",
+                                "memory_estimate": estimate}), 503
+            return jsonify({"error": f"Requested {num_gpus} GPUs, but only {available_gpus} available.{expected}"}), 503
 
         # Set up environment variables for GPU
         env = os.environ.copy()
@@ -275,11 +898,19 @@ def start_run():
         # Log GPU allocation
         with open(log_file_path, 'a') as log_file:
             log_file.write(f"\nStarting run with GPUs: {gpu_list}\n")
-            log_file.write(f"CUDA available: {torch.cuda.is_available()}\n")
+            log_file.write(f"CUDA available: {bool(gpus)}\n")
             log_file.write(f"Number of GPUs allocated: {len(gpu_ids)}\n")
             for gpu_id in gpu_ids:
-                if gpu_id < torch.cuda.device_count():
-                    log_file.write(f"GPU {gpu_id}: {torch.cuda.get_device_name(gpu_id)}\n")
+                if gpu_id in gpus:
+                    log_file.write(f"GPU {gpu_id}: {gpus[gpu_id]['name']}\n")
+            if resume_from:
+                log_file.write(f"Resuming from checkpoint: {resume_from}\n")
+            if estimate is not None:
+                log_file.write(f"Estimated memory per GPU: {estimate['total_mb']:.0f} MB (params "
+                               f"{estimate['params_mb']:.0f}, grads {estimate['grads_mb']:.0f}, optimizer "
+                               f"{estimate['optimizer_mb']:.0f}, activations {estimate['activations_mb']:.0f})\n")
+            elif not data.get("ignore_memory_estimate"):
+                log_file.write("Memory estimate not ready; placing the run without it\n")
 
         # Update config.yaml with GPU settings if it exists
         if os.path.exists(config_yaml_path):
@@ -290,34 +921,45 @@ def start_run():
             if 'training' not in config:
                 config['training'] = {}
             config['training']['num_gpus'] = len(gpu_ids)
+            # A manual start begins fresh unless it asks to resume from the newest checkpoint
+            config['training'].pop('resume_from', None)
+            if resume_from:
+                config['training']['resume_from'] = resume_from
             
             with open(config_yaml_path, 'w') as f:
                 yaml.dump(config, f, default_flow_style=False)
 
-        # Start the training process
-        with open(log_file_path, 'a') as log_file:
-            process = subprocess.Popen(
-                ['python', 'engine.py'],
-                cwd=runs_dir,
-                stdout=log_file,
-                stderr=subprocess.STDOUT,
-                env=env,
-                bufsize=1,
-                universal_newlines=True
-            )
+        # A profile requested while an earlier attempt was ending must not fire in this one
+        stale_profile_request = os.path.join(runs_dir, PROFILE_REQUEST_FILE)
+        if os.path.exists(stale_profile_request):
+            os.remove(stale_profile_request)
 
-        # Update the run's metadata
-        run["pid"] = process.pid
-        run["status"] = "Running"
-        run["gpu_ids"] = gpu_ids
+        # Start the training process, in a pre-warmed interpreter if requested and available
+        launcher = requested_launcher(data, run)
+        log_offset = os.path.getsize(log_file_path)
+        process, launcher = launch_engine(runs_dir, env, log_file_path, launcher)
 
-        with open(project_json_path, 'w') as f:
-            json.dump(project_data, f, indent=4)
+        # Update the run's metadata
+        def started(run):
+            run["pid"] = process.pid
+            run["status"] = "Running"
+            run["gpu_ids"] = gpu_ids
+            if data.get("launcher"):
+                run["launcher"] = data["launcher"]
+            run["memory_estimate_mb"] = required_mb
+            run["started_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            run["max_time_seconds"] = time_budget
+        update_run_record(user, project_name, run_name, started)
+
+        # The supervisor records the outcome, releases the GPUs and retries OOM failures
+        run_supervisor.watch(user, project_name, run_name, process, gpu_ids, env, launcher,
+                             log_offset=log_offset)
 
         return jsonify({
             "message": f"Run '{run_name}' started successfully.", 
             "pid": process.pid, 
-            "gpu_ids": gpu_ids
+            "gpu_ids": gpu_ids,
+            "launcher": launcher
         }), 200
 
     except Exception as e:
@@ -326,6 +968,117 @@ def start_run():
             gpu_manager.release_gpus(gpu_ids)
         return jsonify({"error": str(e)}), 500
 
+def start_smoke_test(user, project_name, run, runs_dir, log_file_path, data):
+    """
+    Launches the run's engine.py as a smoke test (EVF_SMOKE=1): one epoch of a few batches on
+    small subsets, without checkpoints, reporting pass/fail, step time and peak memory under
+    "smoke" in the run record. No GPU is allocated; the test runs on CPU or, with smoke.device
+    "gpu" (or "smoke_device" in the request), on a capped slice of the GPU with the most free
+    memory, shared with the runs allocated to it.
+    """
+    run_name = run["run_name"]
+    config = load_run_config(runs_dir)
+    device = str(data.get("smoke_device") or (config.get('smoke') or {}).get('device', 'cpu')).lower()
+    if device not in SMOKE_DEVICES:
+        return jsonify({"error": f"Unknown smoke device '{device}'. Use one of: {', '.join(SMOKE_DEVICES)}"}), 400
+
+    env = os.environ.copy()
+    env['EVF_SMOKE'] = '1'
+    gpu_list = ''
+    if device == "gpu":
+        if not discover_gpus():
+            return jsonify({"error": "No CUDA-capable GPUs available on this system"}), 503
+        free = gpu_free_memory()
+        gpu_list = str(max(free, key=free.get))
+        env['NVIDIA_VISIBLE_DEVICES'] = gpu_list  # For container compatibility
+    env['CUDA_VISIBLE_DEVICES'] = gpu_list
+
+    with open(log_file_path, 'a') as log_file:
+        log_file.write(f"\nStarting smoke test on {'GPU ' + gpu_list + ' (shared)' if gpu_list else 'CPU'}\n")
+
+    # Results and requests of an earlier launch must not be taken for this one's
+    for stale_file in (SMOKE_META_FILE, PROFILE_REQUEST_FILE):
+        stale_path = os.path.join(runs_dir, stale_file)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    launcher = requested_launcher(data, run)
+    log_offset = os.path.getsize(log_file_path)
+    process, launcher = launch_engine(runs_dir, env, log_file_path, launcher)
+
+    def started(run):
+        run["pid"] = process.pid
+        run["status"] = "Running"
+        run["mode"] = "smoke"
+        run["gpu_ids"] = []
+        if data.get("launcher"):
+            run["launcher"] = data["launcher"]
+    update_run_record(user, project_name, run_name, started)
+
+    run_supervisor.watch(user, project_name, run_name, process, [], env, launcher,
+                         log_offset=log_offset, smoke=True)
+
+    return jsonify({
+        "message": f"Smoke test of run '{run_name}' started on {device.upper()}.",
+        "pid": process.pid,
+        "gpu_ids": [],
+        "device": device,
+        "launcher": launcher
+    }), 200
+
+@runs.route('/profile', methods=['POST'])
+@session_required
+def profile_run():
+    """
+    Asks a running engine to record a torch.profiler window of `steps` training steps
+    (default 20). Training continues; the engine writes trace.json and summary.txt to
+    logs/profiles/<time>/ in the run directory and reports progress under "profile" in
+    run_meta.json (GET /runs/meta).
+    """
+    try:
+        data = request.get_json()
+        project_name = data.get("project_name")
+        run_name = data.get("run_name")
+        if not project_name or not run_name:
+            return jsonify({"error": "Project name or run name is missing."}), 400
+
+        try:
+            steps = int(data.get("steps", DEFAULT_PROFILE_STEPS))
+        except (TypeError, ValueError):
+            return jsonify({"error": "steps must be an integer."}), 400
+        if not 1 <= steps <= MAX_PROFILE_STEPS:
+            return jsonify({"error": f"steps must be between 1 and {MAX_PROFILE_STEPS}."}), 400
+
+        workspace_dir = os.path.join('workspace', session["user"], project_name)
+        project_json_path = os.path.join(workspace_dir, 'project.json')
+        if not os.path.exists(project_json_path):
+            return jsonify({"error": "Project not found."}), 404
+        with open(project_json_path, 'r') as f:
+            project_data = json.load(f)
+
+        run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
+        if not run:
+            return jsonify({"error": f"Run '{run_name}' not found."}), 404
+        if run.get("status") != "Running":
+            return jsonify({"error": f"Run '{run_name}' is not running."}), 409
+
+        runs_dir = os.path.join(workspace_dir, 'runs', run_name)
+        request_path = os.path.join(runs_dir, PROFILE_REQUEST_FILE)
+        if os.path.exists(request_path):
+            return jsonify({"error": "A profile request is already pending for this run."}), 409
+
+        # Written under a temporary name so the engine never reads a partial request
+        tmp_path = request_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({"steps": steps, "requested": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}, f)
+        os.replace(tmp_path, request_path)
+
+        return jsonify({"message": f"Profiling the next {steps} training steps of '{run_name}'.",
+                        "steps": steps}), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @runs.route('/stop', methods=['POST'])
 @session_required
 def stop_run():
@@ -344,42 +1097,43 @@ def stop_run():
         if not os.path.exists(project_json_path):
             return jsonify({"error": "Project not found."}), 404
 
-        with open(project_json_path, 'r') as f:
-            project_data = json.load(f)
+        with project_json_lock:
+            with open(project_json_path, 'r') as f:
+                project_data = json.load(f)
 
-        run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
-        if not run:
-            return jsonify({"error": f"Run '{run_name}' not found."}), 404
+            run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
+            if not run:
+                return jsonify({"error": f"Run '{run_name}' not found."}), 404
 
-        pid = run.get("pid")
-        gpu_ids = run.get("gpu_ids", [])
+            pid = run.get("pid")
+            gpu_ids = run.get("gpu_ids", [])
 
-        # If no PID or run isn't in "Running" state, just return a message instead of an error
-        if not pid or run["status"] != "Running":
-            return jsonify({"message": f"Run '{run_name}' is not currently running."}), 200
+            # If no PID or run isn't in "Running" state, just return a message instead of an error
+            if not pid or run["status"] != "Running":
+                return jsonify({"message": f"Run '{run_name}' is not currently running."}), 200
 
-        # If we do have a PID and it's running, attempt to kill the process
-        try:
-            if os.name == 'nt':
-                subprocess.call(['taskkill', '/F', '/PID', str(pid)])
-            else:
-                # On Unix-like systems, ProcessLookupError is raised if the process does not exist
-                os.kill(pid, 9)
-        except ProcessLookupError:
-            # The process is already gone, so just proceed as if it's stopped
-            pass
-        except Exception as e:
-            # If it's another type of error, you can log it or handle it as you see fit
-            print(f"Warning: Could not kill process {pid}: {e}")
+            # If we do have a PID and it's running, attempt to kill the process
+            try:
+                if os.name == 'nt':
+                    subprocess.call(['taskkill', '/F', '/PID', str(pid)])
+                else:
+                    # On Unix-like systems, ProcessLookupError is raised if the process does not exist
+                    os.kill(pid, 9)
+            except ProcessLookupError:
+                # The process is already gone, so just proceed as if it's stopped
+                pass
+            except Exception as e:
+                # If it's another type of error, you can log it or handle it as you see fit
+                print(f"Warning: Could not kill process {pid}: {e}")
 
-        # Release the GPUs and update run status as before
-        gpu_manager.release_gpus(gpu_ids)
-        run["pid"] = None
-        run["status"] = "Stopped"
-        run["gpu_ids"] = []
+            # Release the GPUs and update run status as before
+            gpu_manager.release_gpus(gpu_ids)
+            run["pid"] = None
+            run["status"] = "Stopped"
+            run["gpu_ids"] = []
+            run.pop("mode", None)
 
-        with open(project_json_path, 'w') as f:
-            json.dump(project_data, f, indent=4)
+            write_project_json(project_json_path, project_data)
 
         return jsonify({"message": f"Run '{run_name}' stopped successfully."}), 200
 
@@ -441,38 +1195,39 @@ def delete_run():
         if not os.path.exists(project_json_path):
             return jsonify({"error": "Project not found."}), 404
 
-        with open(project_json_path, 'r') as f:
-            project_data = json.load(f)
+        with project_json_lock:
+            with open(project_json_path, 'r') as f:
+                project_data = json.load(f)
 
-        run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
-        if not run:
-            return jsonify({"error": f"Run '{run_name}' not found."}), 404
+            run = next((r for r in project_data.get("runs", []) if r["run_name"] == run_name), None)
+            if not run:
+                return jsonify({"error": f"Run '{run_name}' not found."}), 404
 
-        # If the run is running, stop it first
-        pid = run.get("pid")
-        gpu_ids = run.get("gpu_ids", [])
-        if pid:
-            try:
-                if os.name == 'nt':
-                    subprocess.call(['taskkill', '/F', '/PID', str(pid)])
-                else:
-                    os.kill(pid, 9)
-                run["pid"] = None
-                run["status"] = "Stopped"
-                gpu_manager.release_gpus(gpu_ids)
-                run["gpu_ids"] = []
-            except Exception as e:
-                return jsonify({"error": f"Failed to terminate process with PID {pid}: {str(e)}"}), 500
+            # If the run is running, stop it first
+            pid = run.get("pid")
+            gpu_ids = run.get("gpu_ids", [])
+            if pid:
+                try:
+                    if os.name == 'nt':
+                        subprocess.call(['taskkill', '/F', '/PID', str(pid)])
+                    else:
+                        os.kill(pid, 9)
+                    run["pid"] = None
+                    run["status"] = "Stopped"
+                    gpu_manager.release_gpus(gpu_ids)
+                    run["gpu_ids"] = []
+                except Exception as e:
+                    return jsonify({"error": f"Failed to terminate process with PID {pid}: {str(e)}"}), 500
 
-        # Remove the run directory
-        if os.path.exists(runs_dir):
-            shutil.rmtree(runs_dir)
+            # Remove the run directory, dropping its memory estimate if one is queued or running
+            cancel_estimate(runs_dir)
+            if os.path.exists(runs_dir):
+                shutil.rmtree(runs_dir)
 
-        # Remove run from project.json
-        project_data["runs"] = [r for r in project_data.get("runs", []) if r["run_name"] != run_name]
+            # Remove run from project.json
+            project_data["runs"] = [r for r in project_data.get("runs", []) if r["run_name"] != run_name]
 
-        with open(project_json_path, 'w') as f:
-            json.dump(project_data, f, indent=4)
+            write_project_json(project_json_path, project_data)
 
         return jsonify({"message": f"Run '{run_name}' deleted successfully"}), 200
 
@@ -504,74 +1259,75 @@ def edit_run():
             return jsonify({"error": "Project not found."}), 404
 
         # Load project.json
-        with open(project_json_path, 'r') as f:
-            project_data = json.load(f)
-
-        # Find the run in project.json by original_run_name
-        run = next((r for r in project_data.get("runs", []) if r["run_name"] == original_run_name), None)
-        if not run:
-            return jsonify({"error": f"Run '{original_run_name}' not found in project.json."}), 404
-
-        old_runs_dir = os.path.join(workspace_dir, 'runs', original_run_name)
-        if not os.path.exists(old_runs_dir):
-            return jsonify({"error": f"Run directory for '{original_run_name}' does not exist."}), 404
-
-        # If run name changed, rename the folder + update the run_name in project.json
-        if original_run_name != run_name:
-            new_runs_dir = os.path.join(workspace_dir, 'runs', run_name)
-            if os.path.exists(new_runs_dir):
-                return jsonify({"error": f"Run '{run_name}' already exists."}), 400
-
-            os.rename(old_runs_dir, new_runs_dir)
-            run["run_name"] = run_name
-            old_runs_dir = new_runs_dir  # from now on we use the new name
-
-        runs_dir = os.path.join(workspace_dir, 'runs', run_name)
-        if not os.path.exists(runs_dir):
-            return jsonify({"error": f"Run directory for '{run_name}' does not exist."}), 404
-
-        # Update metadata in run
-        if model_name is not None:
-            run["model_name"] = model_name
-        if dataset_name is not None:
-            run["dataset_name"] = dataset_name
-        if optimization_name is not None:
-            run["optimization_name"] = optimization_name
-        if num_gpus is not None:
-            run["num_gpus"] = num_gpus
-
-        # Overwrite engine.py if provided
-        if engine_py_content is not None:
-            engine_py_path = os.path.join(runs_dir, 'engine.py')
-            with open(engine_py_path, 'w') as f:
-                f.write(engine_py_content)
-
-        # Overwrite config.yaml if provided
-        if config_yaml_content is not None:
-            config_yaml_path = os.path.join(runs_dir, 'config.yaml')
-            with open(config_yaml_path, 'w') as f:
-                f.write(config_yaml_content)
-
-        # If the run is currently running, optionally stop it so changes take effect
-        if run.get("status") == "Running":
-            pid = run.get("pid")
-            gpu_ids = run.get("gpu_ids", [])
-            if pid:
-                try:
-                    if os.name == 'nt':
-                        subprocess.call(['taskkill', '/F', '/PID', str(pid)])
-                    else:
-                        os.kill(pid, 9)
-                    run["pid"] = None
-                    run["status"] = "Stopped"
-                    gpu_manager.release_gpus(gpu_ids)
-                    run["gpu_ids"] = []
-                except Exception as e:
-                    return jsonify({"error": f"Failed to terminate process with PID {pid}: {str(e)}"}), 500
-
-        # Save updated project.json
-        with open(project_json_path, 'w') as f:
-            json.dump(project_data, f, indent=4)
+        with project_json_lock:
+            with open(project_json_path, 'r') as f:
+                project_data = json.load(f)
+
+            # Find the run in project.json by original_run_name
+            run = next((r for r in project_data.get("runs", []) if r["run_name"] == original_run_name), None)
+            if not run:
+                return jsonify({"error": f"Run '{original_run_name}' not found in project.json."}), 404
+
+            old_runs_dir = os.path.join(workspace_dir, 'runs', original_run_name)
+            if not os.path.exists(old_runs_dir):
+                return jsonify({"error": f"Run directory for '{original_run_name}' does not exist."}), 404
+
+            # If run name changed, rename the folder + update the run_name in project.json
+            if original_run_name != run_name:
+                new_runs_dir = os.path.join(workspace_dir, 'runs', run_name)
+                if os.path.exists(new_runs_dir):
+                    return jsonify({"error": f"Run '{run_name}' already exists."}), 400
+
+                os.rename(old_runs_dir, new_runs_dir)
+                run["run_name"] = run_name
+                old_runs_dir = new_runs_dir  # from now on we use the new name
+
+            runs_dir = os.path.join(workspace_dir, 'runs', run_name)
+            if not os.path.exists(runs_dir):
+                return jsonify({"error": f"Run directory for '{run_name}' does not exist."}), 404
+
+            # Update metadata in run
+            if model_name is not None:
+                run["model_name"] = model_name
+            if dataset_name is not None:
+                run["dataset_name"] = dataset_name
+            if optimization_name is not None:
+                run["optimization_name"] = optimization_name
+            if num_gpus is not None:
+                run["num_gpus"] = num_gpus
+
+            # Overwrite engine.py if provided, with the engine_utils.py of the current template
+            if engine_py_content is not None:
+                engine_py_path = os.path.join(runs_dir, 'engine.py')
+                with open(engine_py_path, 'w') as f:
+                    f.write(engine_py_content)
+                install_engine_utils(runs_dir)
+
+            # Overwrite config.yaml if provided
+            if config_yaml_content is not None:
+                config_yaml_path = os.path.join(runs_dir, 'config.yaml')
+                with open(config_yaml_path, 'w') as f:
+                    f.write(config_yaml_content)
+
+            # If the run is currently running, optionally stop it so changes take effect
+            if run.get("status") == "Running":
+                pid = run.get("pid")
+                gpu_ids = run.get("gpu_ids", [])
+                if pid:
+                    try:
+                        if os.name == 'nt':
+                            subprocess.call(['taskkill', '/F', '/PID', str(pid)])
+                        else:
+                            os.kill(pid, 9)
+                        run["pid"] = None
+                        run["status"] = "Stopped"
+                        gpu_manager.release_gpus(gpu_ids)
+                        run["gpu_ids"] = []
+                    except Exception as e:
+                        return jsonify({"error": f"Failed to terminate process with PID {pid}: {str(e)}"}), 500
+
+            # Save updated project.json
+            write_project_json(project_json_path, project_data)
 
         return jsonify({"message": f"Run '{run_name}' updated successfully."}), 200
 
@@ -3,7 +3,10 @@ $(document).ready(function() {
     // GLOBAL STATE
     // =================================================
     let selectedFilePath = null;    // The path of the file the user selected in the tree
+    let selectedDirPath = null;     // The path of the directory the user selected in the tree
     let chosenDeployMethod = null;  // Deployment method: 'scp' or 'ftp'
+    let chosenDeployPath = null;    // File or directory being deployed
+    let jobsPollTimer = null;       // Timer polling deploy job progress
 
     // =================================================
     // LOAD RUNS
@@ -142,6 +145,8 @@ $(document).ready(function() {
             // Toggle expand/collapse on click
             $label.on('click', function(e) {
                 e.stopPropagation();
+                selectedDirPath = node.path;
+                $('#id_selected_dir').text(selectedDirPath);
                 $ul.toggle();
                 const $icon = $(this).find('.folder-toggle');
                 if ($ul.is(':visible')) {
@@ -151,6 +156,14 @@ $(document).ready(function() {
                 }
             });
 
+        // Empty directory
+        } else if (isDir) {
+            $label.on('click', function(e) {
+                e.stopPropagation();
+                selectedDirPath = node.path;
+                $('#id_selected_dir').text(selectedDirPath);
+            });
+
         // File item (no children)
         } else if (!isDir) {
             $label.on('click', function(e) {
@@ -167,16 +180,20 @@ $(document).ready(function() {
     // =================================================
     // DEPLOY: DOWNLOAD / SCP / FTP
     // =================================================
-    window.deploySelectedFile = function(method) {
-        if (!selectedFilePath) {
-            toastr.warning("No file selected. Please click on a file in the tree.");
+    window.deploySelectedFile = function(method, useDirectory) {
+        const deployPath = useDirectory ? selectedDirPath : selectedFilePath;
+        if (!deployPath) {
+            toastr.warning(useDirectory
+                ? "No directory selected. Please click on a folder in the tree."
+                : "No file selected. Please click on a file in the tree.");
             return;
         }
+        chosenDeployPath = deployPath;
 
         // Direct Download
         if (method === 'download') {
             // GET request triggers file download
-            const url = `/deploy/transfer?method=download&file=${encodeURIComponent(selectedFilePath)}`;
+            const url = `/deploy/transfer?method=download&file=${encodeURIComponent(deployPath)}`;
             window.location.href = url;
         }
         // SCP or FTP
@@ -195,9 +212,14 @@ $(document).ready(function() {
             $('#id_input_host').val('');
             $('#id_input_username').val('');
             $('#id_input_password').val('');
-            $('#id_input_remote_path').val(
-                method === 'scp' ? '/tmp/deployed_model.pth' : 'model.pth'
-            );
+            if (useDirectory) {
+                const dirName = deployPath.split('/').filter(Boolean).pop();
+                $('#id_input_remote_path').val(method === 'scp' ? `/tmp/${dirName}` : dirName);
+            } else {
+                $('#id_input_remote_path').val(
+                    method === 'scp' ? '/tmp/deployed_model.pth' : 'model.pth'
+                );
+            }
 
             // Show credentials modal
             const modalEl = document.getElementById('id_modal_credentials');
@@ -206,6 +228,19 @@ $(document).ready(function() {
         }
     };
 
+    // Download the selected directory as an archive streamed by the server
+    window.downloadSelectedDirectory = function() {
+        if (!selectedDirPath) {
+            toastr.warning("No directory selected. Please click on a folder in the tree.");
+            return;
+        }
+        const queryParams = new URLSearchParams({
+            path: selectedDirPath,
+            format: $('#id_select_archive_format').val() || 'zip'
+        });
+        window.location.href = `/deploy/archive?${queryParams.toString()}`;
+    };
+
     // Click handler for "Deploy" in credentials modal
     $('#id_modal_credentials_ok').click(async function() {
         const method      = chosenDeployMethod; // 'scp' or 'ftp'
@@ -214,6 +249,7 @@ $(document).ready(function() {
         const username    = $('#id_input_username').val().trim();
         const password    = $('#id_input_password').val(); // can contain spaces
         const remote_path = $('#id_input_remote_path').val().trim();
+        const delta       = $('#id_input_delta').is(':checked');
 
         // Simple validation
         if (!host || !port || !username) {
@@ -230,12 +266,13 @@ $(document).ready(function() {
         try {
             const payload = {
                 method: method,
-                file: selectedFilePath,
+                file: chosenDeployPath,
                 host: host,
                 port: port,
                 username: username,
                 password: password,
-                remote_path: remote_path
+                remote_path: remote_path,
+                delta: delta
             };
 
             const resp = await fetch('/deploy/transfer', {
@@ -254,7 +291,8 @@ $(document).ready(function() {
             if (data.error) {
                 toastr.error(data.error);
             } else {
-                toastr.success(data.message || "Deployment successful!");
+                toastr.info(data.message || "Deploy job queued.");
+                pollDeployJobs();
             }
         } catch (err) {
             console.error("Error deploying file:", err);
@@ -262,14 +300,212 @@ $(document).ready(function() {
         }
     });
 
+    // =================================================
+    // DEPLOY JOBS: PROGRESS POLLING
+    // =================================================
+    async function pollDeployJobs() {
+        clearTimeout(jobsPollTimer);
+        try {
+            const resp = await fetch('/deploy/jobs');
+            const data = await resp.json();
+            const jobs = data.jobs || [];
+            updateJobsTable(jobs);
+
+            const active = jobs.some(job => job.status === 'Queued' || job.status === 'Running');
+            if (active) {
+                jobsPollTimer = setTimeout(pollDeployJobs, 1000);
+            }
+        } catch (err) {
+            console.error("Error fetching deploy jobs:", err);
+        }
+    }
+
+    function updateJobsTable(jobs) {
+        const $tableBody = $('#id_table_body_deploy_jobs');
+        $tableBody.empty();
+
+        if (jobs.length === 0) {
+            $tableBody.append('<tr><td colspan="6" class="text-center">No deploy jobs</td></tr>');
+            return;
+        }
+
+        jobs.slice().reverse().forEach(job => {
+            const actions = (job.status === 'Queued' || job.status === 'Running')
+                ? `<button class="btn btn-sm btn-danger cancel-job-btn" data-job-id="${job.job_id}">Cancel</button>`
+                : '';
+            const row = $('<tr>');
+            row.append($('<td>').text(job.job_id));
+            row.append($('<td>').text(job.target || `${job.method.toUpperCase()} ${job.host}`));
+            row.append($('<td>').text(`${job.files_done}/${job.files_total}`));
+            row.append($('<td>').text(`${job.progress.toFixed(1)}%`));
+            row.append($('<td>').text(job.error ? `${job.status}: ${job.error}` : job.status));
+            row.append($('<td>').html(actions));
+            $tableBody.append(row);
+        });
+    }
+
+    $('#id_table_body_deploy_jobs').on('click', '.cancel-job-btn', async function() {
+        const jobId = $(this).data('job-id');
+        await fetch(`/deploy/jobs/${jobId}/cancel`, { method: 'POST' });
+        pollDeployJobs();
+    });
+
     // Event: Clicking "Explore" in the runs table
     $('#id_table_body_deploy_runs').on('click', '.explore-run-btn', function() {
         const runName = $(this).data('run-name');
         exploreRun(runName);
     });
 
+    // =================================================
+    // DEPLOY TARGETS: REGISTRY, HEALTH, FAN-OUT
+    // =================================================
+    async function loadTargets() {
+        const projectName = sessionStorage.getItem('project_name');
+        if (!projectName) return;
+
+        try {
+            const resp = await fetch(`/deploy/targets?project_name=${encodeURIComponent(projectName)}`);
+            const data = await resp.json();
+            if (data.error) {
+                console.error("Error fetching deploy targets:", data.error);
+                return;
+            }
+            updateTargetsTable(data.targets || []);
+        } catch (err) {
+            console.error("Error fetching deploy targets:", err);
+        }
+    }
+
+    function updateTargetsTable(targets) {
+        const $tableBody = $('#id_table_body_deploy_targets');
+        $tableBody.empty();
+
+        if (targets.length === 0) {
+            $tableBody.append('<tr><td colspan="7" class="text-center">No deploy targets</td></tr>');
+            return;
+        }
+
+        targets.forEach(target => {
+            let health = 'unknown';
+            if (target.health) {
+                if (target.health.status === 'checking') {
+                    health = 'checking...';
+                } else {
+                    health = target.health.status === 'online'
+                        ? `online (${target.health.latency_ms} ms)`
+                        : `offline: ${target.health.error || ''}`;
+                }
+            }
+            const row = $('<tr>');
+            row.append($('<td>').html(`<input type="checkbox" class="form-check-input target-check" value="${target.name}">`));
+            row.append($('<td>').text(target.name));
+            row.append($('<td>').text(target.method.toUpperCase()));
+            row.append($('<td>').text(`${target.host}:${target.port}`));
+            row.append($('<td>').text(target.remote_path || ''));
+            row.append($('<td>').text(health));
+            row.append($('<td>').html(`<button class="btn btn-sm btn-danger delete-target-btn" data-target-name="${target.name}">Delete</button>`));
+            $tableBody.append(row);
+        });
+    }
+
+    function checkedTargets() {
+        return $('.target-check:checked').map(function() { return $(this).val(); }).get();
+    }
+
+    async function postJson(url, payload) {
+        const resp = await fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(payload)
+        });
+        return resp.json();
+    }
+
+    $('#id_btn_save_target').click(async function() {
+        const payload = {
+            project_name: sessionStorage.getItem('project_name'),
+            name: $('#id_target_name').val().trim(),
+            method: $('#id_target_method').val(),
+            host: $('#id_target_host').val().trim(),
+            port: parseInt($('#id_target_port').val(), 10) || null,
+            username: $('#id_target_username').val().trim(),
+            password: $('#id_target_password').val(),
+            remote_path: $('#id_target_remote_path').val().trim()
+        };
+        const data = await postJson('/deploy/targets/save', payload);
+        if (data.error) {
+            toastr.error(data.error);
+            return;
+        }
+        toastr.success(data.message);
+        $('#id_form_target')[0].reset();
+        loadTargets();
+        reloadTargetsWhileProbing();
+    });
+
+    $('#id_btn_probe_targets').click(async function() {
+        const data = await postJson('/deploy/targets/probe', {
+            project_name: sessionStorage.getItem('project_name')
+        });
+        if (data.error) {
+            toastr.error(data.error);
+            return;
+        }
+        loadTargets();
+        reloadTargetsWhileProbing();
+    });
+
+    // Probes run in the background; refresh the table until they have reported
+    function reloadTargetsWhileProbing(attempt = 0) {
+        if (attempt >= 5) return;
+        setTimeout(async () => {
+            await loadTargets();
+            reloadTargetsWhileProbing(attempt + 1);
+        }, 2000);
+    }
+
+    $('#id_table_body_deploy_targets').on('click', '.delete-target-btn', async function() {
+        const data = await postJson('/deploy/targets/delete', {
+            project_name: sessionStorage.getItem('project_name'),
+            name: $(this).data('target-name')
+        });
+        if (data.error) {
+            toastr.error(data.error);
+            return;
+        }
+        loadTargets();
+    });
+
+    window.deployToTargets = async function(useDirectory) {
+        const deployPath = useDirectory ? selectedDirPath : selectedFilePath;
+        const targets = checkedTargets();
+        if (!deployPath) {
+            toastr.warning(useDirectory ? "No directory selected." : "No file selected.");
+            return;
+        }
+        if (targets.length === 0) {
+            toastr.warning("Check at least one deploy target.");
+            return;
+        }
+
+        const data = await postJson('/deploy/fanout', {
+            project_name: sessionStorage.getItem('project_name'),
+            file: deployPath,
+            targets: targets,
+            delta: $('#id_input_delta').is(':checked')
+        });
+        if (data.error) {
+            toastr.error(data.error);
+            return;
+        }
+        toastr.info(data.message);
+        pollDeployJobs();
+    };
+
     // =================================================
     // INITIALIZE
     // =================================================
     loadRuns();
+    loadTargets();
+    pollDeployJobs();
 });
@@ -418,8 +418,8 @@ ${importText}
 
 ${dynamicImports}
 
-// Set CUDA devices
-os.environ["CUDA_VISIBLE_DEVICES"] = "${cudaDevices}"
+# Set CUDA devices unless the scheduler already assigned them
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "${cudaDevices}")
 ${engineText}`.trim();
 
             editorEnginePy.setValue(finalCode, -1);
@@ -438,6 +438,18 @@ training:
   num_gpus: ${numGpus}
   batch_size: 32
   loss_function: CrossEntropyLoss
+  precision: fp32
+
+dataloader:
+  num_workers: 4
+  pin_memory: auto
+  persistent_workers: true
+  prefetch_factor: 2
+
+validation:
+  holdout_fraction: 0.0
+  check_val_every_n_epoch: 1
+  limit_val_batches: 1.0
 
 optimization:
   optimizer:
@@ -593,13 +605,19 @@ model:
             if(status === 'Running'){
                 actions = `
                     <button class="btn btn-sm btn-danger me-1" onclick="stopRun('${run.run_name}')">Stop</button>
+                    <button class="btn btn-sm btn-outline-primary me-1" onclick="profileRun('${run.run_name}')">Profile</button>
                     <button class="btn btn-sm btn-secondary me-1" onclick="editRun('${run.run_name}')">Edit</button>
                     <button class="btn btn-sm btn-info me-1" onclick="viewLogs('${run.run_name}')">Logs</button>
                     <button class="btn btn-sm btn-warning" onclick="deleteRun('${run.run_name}')">Delete</button>
                 `;
             } else {
+                const resumeButton = status === 'Failed'
+                    ? `<button class="btn btn-sm btn-outline-success me-1" onclick="startRun('${run.run_name}', true)">Resume</button>`
+                    : '';
                 actions = `
                     <button class="btn btn-sm btn-success me-1" onclick="startRun('${run.run_name}')">Start</button>
+                    ${resumeButton}
+                    <button class="btn btn-sm btn-outline-secondary me-1" onclick="smokeRun('${run.run_name}')">Smoke test</button>
                     <button class="btn btn-sm btn-secondary me-1" onclick="editRun('${run.run_name}')">Edit</button>
                     <button class="btn btn-sm btn-info me-1" onclick="viewLogs('${run.run_name}')">Logs</button>
                     <button class="btn btn-sm btn-warning" onclick="deleteRun('${run.run_name}')">Delete</button>
@@ -613,7 +631,7 @@ model:
                     <td>${run.model_name || 'N/A'}</td>
                     <td>${run.dataset_name || 'N/A'}</td>
                     <td>${run.optimization_name || 'N/A'}</td>
-                    <td>${status}</td>
+                    <td title="${smokeSummary(run.smoke)}">${run.mode === 'smoke' ? 'Smoke Testing' : status}</td>
                     <td>${gpuList}</td>
                     <td>${actions}</td>
                 </tr>
@@ -622,6 +640,16 @@ model:
         });
     }
 
+    // Last smoke test result of a run, shown as the tooltip of its status
+    function smokeSummary(smoke){
+        if(!smoke) return '';
+        if(!smoke.passed) return `Smoke test failed: ${smoke.error || 'unknown error'}`;
+        const memory = smoke.peak_memory_mb != null
+            ? `${smoke.peak_memory_mb} MB device`
+            : `${smoke.peak_host_memory_mb} MB host`;
+        return `Smoke test passed on ${smoke.device} in ${smoke.seconds}s | step ${smoke.step_ms} ms | peak ${memory}`;
+    }
+
     // =================================================
     // DELETE RUN
     // =================================================
@@ -657,10 +685,12 @@ model:
     // =================================================
     // START RUN
     // =================================================
-    window.startRun = async function(runName){
+    // resume: continue from the run's newest checkpoint instead of starting fresh
+    window.startRun = async function(runName, resume = false){
         const payload = {
             project_name: sessionStorage.getItem('project_name'),
-            run_name: runName
+            run_name: runName,
+            resume: resume
         };
 
         try {
@@ -687,6 +717,70 @@ model:
         }
     };
 
+    // =================================================
+    // SMOKE TEST RUN
+    // =================================================
+    // A few batches of one epoch on CPU (or a shared GPU slice, smoke.device in config.yaml)
+    window.smokeRun = async function(runName){
+        const payload = {
+            project_name: sessionStorage.getItem('project_name'),
+            run_name: runName,
+            mode: 'smoke'
+        };
+
+        try {
+            $(`button[onclick="smokeRun('${runName}')"]`).prop('disabled',true);
+            const response = await fetch('/runs/start', {
+                method:  'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body:    JSON.stringify(payload)
+            });
+            const data = await response.json();
+            if(!data.error){
+                toastr.success(data.message);
+                loadRunList();
+            } else {
+                toastr.error(data.error);
+            }
+        } catch(err){
+            toastr.error("Failed to start smoke test.");
+            console.error(err);
+        } finally {
+            $(`button[onclick="smokeRun('${runName}')"]`).prop('disabled',false);
+        }
+    };
+
+    // =================================================
+    // PROFILE RUN
+    // =================================================
+    window.profileRun = async function(runName){
+        const steps = prompt("Number of training steps to profile:", "20");
+        if(steps === null) return;
+
+        const payload = {
+            project_name: sessionStorage.getItem('project_name'),
+            run_name: runName,
+            steps: parseInt(steps, 10)
+        };
+
+        try {
+            const response = await fetch('/runs/profile', {
+                method:  'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body:    JSON.stringify(payload)
+            });
+            const data = await response.json();
+            if(!data.error){
+                toastr.success(`${data.message} The trace appears under logs/profiles in the run files.`);
+            } else {
+                toastr.error(data.error);
+            }
+        } catch(err){
+            toastr.error("Failed to request a profile.");
+            console.error(err);
+        }
+    };
+
     // =================================================
     // STOP RUN
     // =================================================
@@ -0,0 +1,151 @@
+"""
+Module: tools/pack_dataset.py
+Description:
+Dataset import tool that packs a project dataset into the sharded streaming
+format read by the engine (`dataset_shards` in a run's config.yaml). Training
+on datasets larger than RAM then reads a few large files sequentially instead
+of many small random ones.
+
+Layout written under --output, one directory per split:
+    <output>/<split>/index.json         Format, sample counts and shard list
+    <output>/<split>/shard-00000.bin    Pickled (sample, target) records, back to back
+    <output>/<split>/shard-00000.idx    Record byte offsets (numpy int64, records + 1)
+
+Samples come from the dataset's `load_raw` (the deterministic uint8 part of its
+pipeline; the engine then augments and normalizes batches on the device) or
+from `__getitem__` for datasets without it.
+
+Usage:
+    python tools/pack_dataset.py --dataset-dir workspace/<user>/<project>/datasets/<name> \
+        --output /data/shards/<name> [--shard-size-mb 256] [--splits train eval]
+
+Dependencies:
+- torch: For loading samples with DataLoader workers.
+- numpy: For the record offset files.
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import importlib.util
+
+import numpy as np
+
+# Bump when the shard layout changes; the engine refuses unknown versions
+SHARD_FORMAT_VERSION = 1
+
+def load_dataset_class(dataset_dir):
+    """Imports the Dataset class from the datasets.py in dataset_dir."""
+    path = os.path.join(os.path.abspath(dataset_dir), 'datasets.py')
+    spec = importlib.util.spec_from_file_location('evf_packed_dataset', path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so DataLoader workers can unpickle samples of this module
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module.Dataset
+
+class RecordSource:
+    """Serializes one dataset sample per index, from load_raw when the dataset has it."""
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.raw = hasattr(dataset, 'load_raw') and getattr(dataset, 'cacheable', True)
+
+    def __getitem__(self, index):
+        if self.raw:
+            sample, target = self.dataset.load_raw(index)
+        else:
+            sample, target = self.dataset[index]
+        if hasattr(sample, 'numpy'):
+            sample = sample.numpy()
+        if hasattr(target, 'item'):
+            target = target.item()
+        return pickle.dumps((sample, target), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __len__(self):
+        return len(self.dataset)
+
+def collate_records(batch):
+    return batch
+
+def pack_split(dataset, output_dir, shard_size, workers):
+    """Writes the shards and index.json of one split; returns the index."""
+    from torch.utils.data import DataLoader
+
+    os.makedirs(output_dir, exist_ok=True)
+    source = RecordSource(dataset)
+    loader = DataLoader(source, batch_size=64, num_workers=workers, collate_fn=collate_records)
+
+    shards = []
+    shard_file = None
+    offsets = []
+
+    def close_shard():
+        shard_file.close()
+        with open(os.path.join(output_dir, f"shard-{len(shards):05d}.idx"), 'wb') as f:
+            np.save(f, np.asarray(offsets, dtype=np.int64), allow_pickle=False)
+        shards.append({"file": f"shard-{len(shards):05d}.bin", "index": f"shard-{len(shards):05d}.idx",
+                       "samples": len(offsets) - 1, "bytes": offsets[-1]})
+
+    total = 0
+    for batch in loader:
+        for record in batch:
+            if shard_file is None:
+                shard_file = open(os.path.join(output_dir, f"shard-{len(shards):05d}.bin"), 'wb')
+                offsets = [0]
+            shard_file.write(record)
+            offsets.append(offsets[-1] + len(record))
+            total += 1
+            if offsets[-1] >= shard_size:
+                close_shard()
+                shard_file = None
+    if shard_file is not None:
+        close_shard()
+
+    index = {
+        "version": SHARD_FORMAT_VERSION,
+        "encoding": "raw" if source.raw else "sample",
+        "samples": total,
+        "shards": shards,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(output_dir, 'index.json.tmp'), 'w') as f:
+        json.dump(index, f, indent=4)
+    os.replace(os.path.join(output_dir, 'index.json.tmp'), os.path.join(output_dir, 'index.json'))
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a project dataset into streaming shards.")
+    parser.add_argument('--dataset-dir', required=True, help="Directory containing the dataset's datasets.py.")
+    parser.add_argument('--output', required=True, help="Directory receiving one subdirectory per split.")
+    parser.add_argument('--shard-size-mb', type=int, default=256, help="Target size of one shard file.")
+    parser.add_argument('--splits', nargs='+', default=['train', 'eval'], choices=['train', 'eval'],
+                        help="Splits to pack: train (train=True) and eval (train=False).")
+    parser.add_argument('--workers', type=int, default=8, help="DataLoader workers used to read samples.")
+    args = parser.parse_args()
+
+    # The dataset may read its config.yaml or data relative to its own directory
+    dataset_dir = os.path.abspath(args.dataset_dir)
+    Dataset = load_dataset_class(dataset_dir)
+
+    for split in args.splits:
+        start = time.perf_counter()
+        try:
+            dataset = Dataset(train=(split == 'train'))
+        except TypeError:
+            if split != 'train':
+                print(f"Dataset has no train flag; skipping the {split} split")
+                continue
+            dataset = Dataset()
+        index = pack_split(dataset, os.path.join(os.path.abspath(args.output), split),
+                           args.shard_size_mb * 1024 * 1024, args.workers)
+        total_bytes = sum(shard["bytes"] for shard in index["shards"])
+        print(f"{split}: {index['samples']} samples in {len(index['shards'])} shards "
+              f"({total_bytes / (1024.0 * 1024.0):.1f} MB, {index['encoding']} records) "
+              f"in {time.perf_counter() - start:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())